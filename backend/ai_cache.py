@@ -0,0 +1,85 @@
+"""Content-addressed cache for AI comparison analyses.
+
+Analyses are keyed by a hash of the endpoint, the comparison payload the prompt
+is built from and the caller's preferences/context, so the same quotes analysed
+again skip the LLM call. Lookups check an in-process LRU first, then the
+`ai_analyses` collection (records carry their `cache_key`).
+"""
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+
+def analysis_cache_key(endpoint: str, payload: Dict[str, Any], preferences: Optional[Dict[str, Any]]) -> str:
+    canonical = json.dumps([endpoint, payload, preferences], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class AnalysisCache:
+    def __init__(self, db, ttl_seconds: float = 3600, max_entries: int = 2000):
+        self.db = db
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached analysis record for `key`, or None"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return entry[1]
+            del self._entries[key]
+
+        record = await self.db.ai_analyses.find_one(
+            {"cache_key": key, "timestamp": {"$gte": datetime.utcnow() - timedelta(seconds=self.ttl_seconds)}},
+            {"_id": 0},
+            sort=[("timestamp", -1)]
+        )
+        if record is None:
+            self.misses += 1
+            return None
+        self.db_hits += 1
+        age = (datetime.utcnow() - record["timestamp"]).total_seconds()
+        self._remember(key, record, self.ttl_seconds - age)
+        return record
+
+    def put(self, key: str, record: Dict[str, Any]):
+        self._remember(key, record, self.ttl_seconds)
+
+    def _remember(self, key: str, record: Dict[str, Any], ttl: float):
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, record)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "ttl_seconds": self.ttl_seconds,
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round((self.memory_hits + self.db_hits) / lookups, 4) if lookups else 0.0
+        }
+
+
+def analysis_cache_from_env(db) -> AnalysisCache:
+    return AnalysisCache(
+        db,
+        ttl_seconds=float(os.environ.get('AI_CACHE_TTL_SECONDS', '3600')),
+        max_entries=int(os.environ.get('AI_CACHE_MAX_ENTRIES', '2000'))
+    )
@@ -0,0 +1,218 @@
+"""Price-alert evaluation against fresh compare quotes.
+
+Active alerts are held in memory, grouped by (comparison_type, product key/route_key)
+and sorted by target_price. An alert fires when a quote's price is at or below
+its target, so for an incoming price every triggered alert sits in one suffix of
+the sorted list: evaluation is a bisect plus the alerts actually crossed, no
+matter how many alerts are registered.
+
+Fired alerts are deactivated in one update_many so they don't fire again; if
+that write fails they go back into the index. Each worker process keeps its own
+index, so `sync` also drops alerts that other workers triggered (triggered_at)
+or deleted (tombstones in price_alert_deletions, kept DELETION_RETENTION).
+"""
+import asyncio
+import bisect
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from catalog import document_product_key
+from routes import alert_route_key
+
+
+logger = logging.getLogger(__name__)
+
+AlertKey = Tuple[str, str]
+
+# Re-read this much before the last sync, so writes stamped by another host's
+# slightly different clock aren't missed; loading and pruning are idempotent
+SYNC_OVERLAP = timedelta(seconds=5)
+DELETION_RETENTION = timedelta(days=1)
+
+
+def alert_key(alert: Dict[str, Any]) -> Optional[AlertKey]:
+    comparison_type = getattr(alert["comparison_type"], "value", alert["comparison_type"])
+    if comparison_type == "ride":
+        route_key = alert.get("route_key") or (alert.get("route") and alert_route_key(alert))
+        return (comparison_type, route_key) if route_key else None
+    if alert.get("product_name"):
+        return comparison_type, document_product_key(alert)
+    return None
+
+
+class AlertIndex:
+    """Active alerts per key, sorted by (target_price, alert_id)"""
+
+    def __init__(self):
+        self._alerts: Dict[AlertKey, List[Tuple[float, str]]] = {}
+        self._by_id: Dict[str, Tuple[AlertKey, float]] = {}
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __contains__(self, alert_id: str) -> bool:
+        return alert_id in self._by_id
+
+    def add(self, alert: Dict[str, Any]):
+        key = alert_key(alert)
+        if key is None or alert["id"] in self._by_id:
+            return
+        entry = (alert["target_price"], alert["id"])
+        bisect.insort(self._alerts.setdefault(key, []), entry)
+        self._by_id[alert["id"]] = (key, alert["target_price"])
+
+    def bulk_load(self, alerts: List[Dict[str, Any]]):
+        """Append then sort once per key; much cheaper than insort for large loads"""
+        touched: Set[AlertKey] = set()
+        for alert in alerts:
+            key = alert_key(alert)
+            if key is None or alert["id"] in self._by_id:
+                continue
+            self._alerts.setdefault(key, []).append((alert["target_price"], alert["id"]))
+            self._by_id[alert["id"]] = (key, alert["target_price"])
+            touched.add(key)
+        for key in touched:
+            self._alerts[key].sort()
+
+    def remove(self, alert_id: str):
+        found = self._by_id.pop(alert_id, None)
+        if found is None:
+            return
+        key, target_price = found
+        entries = self._alerts[key]
+        position = bisect.bisect_left(entries, (target_price, alert_id))
+        if position < len(entries) and entries[position] == (target_price, alert_id):
+            del entries[position]
+        if not entries:
+            del self._alerts[key]
+
+    def restore(self, comparison_type: str, key: str, entries: List[Tuple[float, str]]):
+        """Put back (target_price, alert_id) entries returned by pop_triggered"""
+        index_key = (comparison_type, key)
+        for target_price, alert_id in entries:
+            if alert_id in self._by_id:
+                continue
+            bisect.insort(self._alerts.setdefault(index_key, []), (target_price, alert_id))
+            self._by_id[alert_id] = (index_key, target_price)
+
+    def pop_triggered(self, comparison_type: str, key: str, price: float) -> List[Tuple[float, str]]:
+        """Remove and return the (target_price, alert_id) entries of alerts whose target_price >= price"""
+        index_key = (comparison_type, key)
+        entries = self._alerts.get(index_key)
+        if not entries:
+            return []
+        position = bisect.bisect_left(entries, (price, ""))
+        triggered = entries[position:]
+        del entries[position:]
+        if not entries:
+            del self._alerts[index_key]
+        for _, alert_id in triggered:
+            del self._by_id[alert_id]
+        return triggered
+
+
+class AlertEvaluator:
+    """Keeps an AlertIndex in sync with price_alerts and applies fired alerts in bulk"""
+
+    def __init__(self, db, sync_interval: float = float(os.environ.get('ALERT_SYNC_SECONDS', '30'))):
+        self.db = db
+        self.index = AlertIndex()
+        self.sync_interval = sync_interval
+        self.triggered = 0
+        self.restored = 0
+        self.pruned = 0
+        self._synced_until: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Set[asyncio.Task] = set()
+
+    async def sync(self):
+        """Load active alerts created since the last sync (all of them the first time), then drop
+        alerts other workers have triggered or deleted since"""
+        query: Dict[str, Any] = {"is_active": True}
+        since = self._synced_until - SYNC_OVERLAP if self._synced_until is not None else None
+        if since is not None:
+            query["created_at"] = {"$gte": since}
+        started = datetime.utcnow()
+        projection = {"_id": 0, "id": 1, "comparison_type": 1, "product_name": 1, "product_id": 1, "route": 1,
+                      "pickup_coordinates": 1, "drop_coordinates": 1, "route_key": 1, "target_price": 1}
+        batch: List[Dict[str, Any]] = []
+        async for alert in self.db.price_alerts.find(query, projection).batch_size(10000):
+            batch.append(alert)
+            if len(batch) >= 10000:
+                self.index.bulk_load(batch)
+                batch = []
+        self.index.bulk_load(batch)
+        if since is not None:
+            await self._prune(since)
+        self._synced_until = started
+
+    async def _prune(self, since: datetime):
+        gone = self.db.price_alerts.find({"is_active": False, "triggered_at": {"$gte": since}}, {"_id": 0, "id": 1})
+        deleted = self.db.price_alert_deletions.find({"deleted_at": {"$gte": since}}, {"_id": 0, "id": 1})
+        for cursor in (gone, deleted):
+            async for alert in cursor:
+                if alert["id"] in self.index:
+                    self.index.remove(alert["id"])
+                    self.pruned += 1
+
+    async def delete(self, alert_id: str) -> bool:
+        """Delete an alert and leave a tombstone so other workers drop it from their index"""
+        result = await self.db.price_alerts.delete_one({"id": alert_id})
+        self.index.remove(alert_id)
+        if result.deleted_count == 0:
+            return False
+        await self.db.price_alert_deletions.insert_one({"id": alert_id, "deleted_at": datetime.utcnow()})
+        return True
+
+    def start(self):
+        """Pick up alerts created by other worker processes"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Alert sync failed: {str(e)}")
+            await asyncio.sleep(self.sync_interval)
+
+    def check(self, comparison_type: str, key: str, price: float):
+        """Evaluate a fresh price without blocking the compare response"""
+        triggered = self.index.pop_triggered(comparison_type, key, price)
+        if not triggered:
+            return
+        task = asyncio.create_task(self._mark_triggered(comparison_type, key, triggered, price))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _mark_triggered(self, comparison_type: str, key: str, entries: List[Tuple[float, str]], price: float):
+        now = datetime.utcnow()
+        try:
+            result = await self.db.price_alerts.update_many(
+                {"id": {"$in": [alert_id for _, alert_id in entries]}, "is_active": True},
+                {"$set": {"current_price": price, "last_checked": now, "triggered_at": now, "is_active": False}}
+            )
+            self.triggered += result.modified_count
+        except Exception as e:
+            # Still active in Mongo: keep evaluating them, the next crossing retries the write
+            logger.error(f"Failed to mark {len(entries)} alerts triggered: {str(e)}")
+            self.index.restore(comparison_type, key, entries)
+            self.restored += len(entries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"indexed_alerts": len(self.index), "triggered": self.triggered, "restored": self.restored,
+                "pruned": self.pruned}
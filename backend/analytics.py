@@ -0,0 +1,284 @@
+"""Precomputed popular-routes / popular-products analytics.
+
+A background task folds comparisons newer than a per-view watermark into hourly
+buckets (plus one all-time bucket per key, stored with hour=None), then
+materializes the top results for each window into `analytics_popular`. The
+analytics endpoints only read those materialized documents.
+
+Collections:
+    analytics_buckets  {view, hour, key, label, count, value_sum, providers: {name: count}}
+    analytics_popular  {view, window, results: [...], refreshed_at}
+    analytics_state    {_id: view, key_version, watermark_ts, watermark_id, lease_owner, lease_expires}
+
+Bumping a view's `key_version` discards its buckets and refolds from scratch.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from catalog import document_product_key
+from mongo_config import QUERY_MAX_TIME_MS
+from routes import document_route_key
+
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL_SECONDS = float(os.environ.get('ANALYTICS_REFRESH_SECONDS', '60'))
+# Comparisons younger than this are left for the next pass so late writes aren't skipped
+FOLD_LAG_SECONDS = float(os.environ.get('ANALYTICS_FOLD_LAG_SECONDS', '30'))
+FOLD_BATCH_SIZE = 5000
+TOP_N = 100
+
+WINDOWS: Dict[str, Optional[timedelta]] = {
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7),
+    "all": None,
+}
+BUCKET_RETENTION = timedelta(days=8)
+
+
+class AnalyticsView:
+    """How one analytics endpoint groups and summarizes a comparison collection"""
+    name: str = ""
+    source_collection: str = ""
+    projection: Dict[str, int] = {}
+    key_version: int = 1
+
+    def key(self, document: Dict[str, Any]) -> Any:
+        raise NotImplementedError
+
+    def label(self, document: Dict[str, Any]) -> Any:
+        """Display form of the key, kept from the latest document folded into a bucket"""
+        return None
+
+    def value(self, document: Dict[str, Any]) -> float:
+        raise NotImplementedError
+
+    def result_row(self, key: Any, count: int, value_sum: float, providers: Dict[str, int],
+                   label: Any = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class PopularRoutesView(AnalyticsView):
+    name = "routes"
+    source_collection = "ride_comparisons"
+    projection = {"_id": 0, "id": 1, "timestamp": 1, "pickup_location": 1, "drop_location": 1,
+                  "pickup_coordinates": 1, "drop_coordinates": 1, "route_key": 1,
+                  "distance_km": 1, "best_price_provider": 1}
+    key_version = 2  # grouped on route_key instead of the raw pickup/drop strings
+
+    def key(self, document):
+        return document_route_key(document)
+
+    def label(self, document):
+        return {"pickup": document["pickup_location"], "drop": document["drop_location"]}
+
+    def value(self, document):
+        return document.get("distance_km", 0)
+
+    def result_row(self, key, count, value_sum, providers, label=None):
+        return {
+            "_id": label or key,
+            "route_key": key,
+            "count": count,
+            "avg_distance": value_sum / count if count else 0,
+            "most_chosen_provider": _top_provider(providers)
+        }
+
+
+class PopularProductsView(AnalyticsView):
+    name = "products"
+    source_collection = "grocery_comparisons"
+    projection = {"_id": 0, "id": 1, "timestamp": 1, "product_name": 1, "brand": 1, "product_id": 1,
+                  "providers.price": 1, "best_price_provider": 1}
+    key_version = 2  # grouped on the catalog product instead of the raw product name
+
+    def key(self, document):
+        return document_product_key(document)
+
+    def label(self, document):
+        return document["product_name"]
+
+    def value(self, document):
+        # Same definition as the original pipeline: first listed price minus the cheapest
+        prices = [provider["price"] for provider in document.get("providers", []) if "price" in provider]
+        return prices[0] - min(prices) if prices else 0
+
+    def result_row(self, key, count, value_sum, providers, label=None):
+        return {
+            "_id": label or key,
+            "product_key": key,
+            "count": count,
+            "avg_savings": value_sum / count if count else 0,
+            "most_chosen_provider": _top_provider(providers)
+        }
+
+
+VIEWS: Dict[str, AnalyticsView] = {view.name: view for view in (PopularRoutesView(), PopularProductsView())}
+
+
+def _top_provider(providers: Dict[str, int]) -> Optional[str]:
+    return max(providers, key=providers.get) if providers else None
+
+
+def _hour(timestamp: datetime) -> datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def _key_id(key: Any) -> Tuple:
+    return tuple(sorted(key.items())) if isinstance(key, dict) else (key,)
+
+
+async def read_popular(db, view_name: str, window: str, limit: int) -> List[Dict[str, Any]]:
+    """Materialized top results for an analytics endpoint"""
+    document = await db.analytics_popular.find_one({"view": view_name, "window": window}, {"results": 1},
+                                                   max_time_ms=QUERY_MAX_TIME_MS)
+    return document["results"][:limit] if document else []
+
+
+class AnalyticsRefresher:
+    """Background task that incrementally refreshes the materialized analytics"""
+
+    def __init__(self, db, interval: float = REFRESH_INTERVAL_SECONDS):
+        self.db = db
+        self.interval = interval
+        self.owner = str(uuid.uuid4())
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh_all()
+            except Exception as e:
+                logger.error(f"Analytics refresh failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def refresh_all(self):
+        for view in VIEWS.values():
+            if not await self._acquire_lease(view):
+                continue
+            folded = batch = await self.fold_new_documents(view)
+            # Catch up in batches after a backfill or long downtime
+            while batch == FOLD_BATCH_SIZE:
+                batch = await self.fold_new_documents(view)
+                folded += batch
+            await self.materialize(view)
+            logger.info(f"Analytics {view.name}: folded {folded} new comparisons")
+
+    async def _acquire_lease(self, view: AnalyticsView) -> bool:
+        """Only one worker process refreshes a view at a time"""
+        now = datetime.utcnow()
+        await self.db.analytics_state.update_one({"_id": view.name}, {"$setOnInsert": {"lease_expires": now}}, upsert=True)
+        result = await self.db.analytics_state.update_one(
+            {"_id": view.name, "$or": [{"lease_expires": {"$lt": now}}, {"lease_owner": self.owner}]},
+            {"$set": {"lease_owner": self.owner, "lease_expires": now + timedelta(seconds=self.interval * 2)}}
+        )
+        return result.matched_count == 1
+
+    async def fold_new_documents(self, view: AnalyticsView) -> int:
+        """Fold comparisons after the watermark into the hourly and all-time buckets"""
+        state = await self.db.analytics_state.find_one({"_id": view.name}) or {}
+        if state.get("key_version", 1) != view.key_version:
+            await self.db.analytics_buckets.delete_many({"view": view.name})
+            await self.db.analytics_state.update_one(
+                {"_id": view.name},
+                {"$set": {"key_version": view.key_version}, "$unset": {"watermark_ts": "", "watermark_id": ""}}
+            )
+            state = {}
+        watermark_ts, watermark_id = state.get("watermark_ts"), state.get("watermark_id", "")
+        upper = datetime.utcnow() - timedelta(seconds=FOLD_LAG_SECONDS)
+
+        query: Dict[str, Any] = {"timestamp": {"$lte": upper}}
+        if watermark_ts is not None:
+            query["$or"] = [
+                {"timestamp": {"$gt": watermark_ts}},
+                {"timestamp": watermark_ts, "id": {"$gt": watermark_id}}
+            ]
+        cursor = self.db[view.source_collection].find(query, view.projection).sort(
+            [("timestamp", 1), ("id", 1)]
+        ).limit(FOLD_BATCH_SIZE)
+
+        buckets: Dict[Tuple, Dict[str, Any]] = {}
+        folded = 0
+        last = None
+        async for document in cursor:
+            key = view.key(document)
+            for hour in (_hour(document["timestamp"]), None):
+                bucket = buckets.setdefault((hour, _key_id(key)), {
+                    "hour": hour, "key": key, "count": 0, "value_sum": 0.0, "providers": {}
+                })
+                bucket["label"] = view.label(document)
+                bucket["count"] += 1
+                bucket["value_sum"] += view.value(document)
+                provider = document.get("best_price_provider")
+                if provider:
+                    bucket["providers"][provider] = bucket["providers"].get(provider, 0) + 1
+            folded += 1
+            last = document
+
+        if not buckets:
+            return 0
+
+        operations = []
+        for bucket in buckets.values():
+            increments = {"count": bucket["count"], "value_sum": bucket["value_sum"]}
+            for provider, count in bucket["providers"].items():
+                increments[f"providers.{provider.replace('.', '_')}"] = count
+            update: Dict[str, Any] = {"$inc": increments}
+            if bucket["label"] is not None:
+                update["$set"] = {"label": bucket["label"]}
+            operations.append(UpdateOne(
+                {"view": view.name, "hour": bucket["hour"], "key": bucket["key"]},
+                update,
+                upsert=True
+            ))
+        await self.db.analytics_buckets.bulk_write(operations, ordered=False)
+        await self.db.analytics_state.update_one(
+            {"_id": view.name},
+            {"$set": {"watermark_ts": last["timestamp"], "watermark_id": last["id"]}}
+        )
+        return folded
+
+    async def materialize(self, view: AnalyticsView):
+        """Rebuild the top-N results of every window from the buckets"""
+        now = datetime.utcnow()
+        for window, span in WINDOWS.items():
+            if span is None:
+                cursor = self.db.analytics_buckets.find({"view": view.name, "hour": None}).sort("count", -1).limit(TOP_N)
+                rows = [(bucket["key"], bucket["count"], bucket["value_sum"], bucket.get("providers", {}),
+                         bucket.get("label")) async for bucket in cursor]
+            else:
+                merged: Dict[Tuple, List[Any]] = {}
+                cursor = self.db.analytics_buckets.find({"view": view.name, "hour": {"$gte": _hour(now - span)}})
+                async for bucket in cursor:
+                    entry = merged.setdefault(_key_id(bucket["key"]), [bucket["key"], 0, 0.0, {}, None])
+                    entry[4] = bucket.get("label") or entry[4]
+                    entry[1] += bucket["count"]
+                    entry[2] += bucket["value_sum"]
+                    for provider, count in bucket.get("providers", {}).items():
+                        entry[3][provider] = entry[3].get(provider, 0) + count
+                rows = sorted(merged.values(), key=lambda entry: entry[1], reverse=True)[:TOP_N]
+
+            await self.db.analytics_popular.update_one(
+                {"view": view.name, "window": window},
+                {"$set": {"results": [view.result_row(*row) for row in rows], "refreshed_at": now}},
+                upsert=True
+            )
@@ -0,0 +1,66 @@
+"""Benchmark: alert evaluation cost as the number of active alerts grows.
+
+Compares AlertIndex.pop_triggered with a linear scan over every alert for the
+same incoming prices. Run from the backend directory:
+
+    python benchmarks/bench_alert_index.py --alerts 1000000 --products 1000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from alerts_engine import AlertIndex  # noqa: E402
+
+
+def synthetic_alerts(count: int, products: int):
+    return [
+        {
+            "id": f"alert-{i}",
+            "comparison_type": "grocery",
+            "product_name": f"product {i % products}",
+            "target_price": round(random.uniform(100, 1000), 2),
+        }
+        for i in range(count)
+    ]
+
+
+def main(args):
+    random.seed(7)
+    sizes = [size for size in (10_000, 100_000, 1_000_000) if size <= args.alerts]
+    for size in sizes:
+        alerts = synthetic_alerts(size, args.products)
+        index = AlertIndex()
+        start = time.perf_counter()
+        index.bulk_load(alerts)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        # Prices just above the bulk of targets, so each evaluation fires only a few alerts
+        prices = [(f"product {random.randrange(args.products)}", random.uniform(990, 1000))
+                  for _ in range(args.evaluations)]
+
+        start = time.perf_counter()
+        fired = 0
+        for product, price in prices:
+            fired += len(index.pop_triggered("grocery", product, price))
+        indexed_us = (time.perf_counter() - start) / len(prices) * 1e6
+
+        scan_prices = prices[:max(1, args.evaluations // 100)]
+        start = time.perf_counter()
+        for product, price in scan_prices:
+            [a["id"] for a in alerts if a["product_name"] == product and a["target_price"] >= price]
+        scan_us = (time.perf_counter() - start) / len(scan_prices) * 1e6
+
+        print(f"alerts={size:>9,d} load={load_ms:8.1f}ms indexed={indexed_us:8.2f}us/price "
+              f"linear={scan_us:11.1f}us/price fired={fired}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--alerts", type=int, default=1_000_000)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--evaluations", type=int, default=10_000)
+    main(parser.parse_args())
@@ -0,0 +1,98 @@
+"""Benchmark: product catalog typeahead and resolution over a synthetic catalog.
+
+Generates `--skus` products (default 1M) from a Zipf-distributed vocabulary of
+brands and product words, builds catalog.ProductCatalog once, then times
+autocomplete for the prefixes a user produces while typing real queries (one
+character at a time, so the short, broad prefixes are included) and
+resolve() for free-text compare requests.
+
+Run from the backend directory:
+
+    python benchmarks/bench_catalog.py --skus 1000000
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from catalog import ProductCatalog  # noqa: E402
+
+SIZES = ["100 g", "200 g", "500 g", "1 kg", "5 kg", "200 ml", "500 ml", "1 l", "5 l", "6 pcs", "1 dozen"]
+SYLLABLES = ["ba", "sa", "ma", "ri", "ko", "ta", "na", "la", "pe", "du", "chi", "ra", "ka", "go", "mi", "ve", "sh", "an"]
+
+
+def word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def generate(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    vocabulary = sorted({word(rng) for _ in range(40_000)})
+    brands = sorted({word(rng).title() for _ in range(3_000)})
+    # Zipf-like draws: a few words and brands are everywhere, most are rare
+    draws = np.random.default_rng(seed)
+    word_weights = 1 / np.arange(1, len(vocabulary) + 1)
+    brand_weights = 1 / np.arange(1, len(brands) + 1)
+    name_words = draws.choice(len(vocabulary), size=(count, 4), p=word_weights / word_weights.sum()).tolist()
+    name_lengths = draws.integers(2, 5, size=count).tolist()
+    brand_numbers = draws.choice(len(brands), size=count, p=brand_weights / brand_weights.sum()).tolist()
+    popularity = draws.pareto(1.2, size=count).tolist()
+    return [
+        {
+            "id": f"sku-{number}", "name": " ".join(vocabulary[i] for i in name_words[number][:name_lengths[number]]).title(),
+            "brand": brands[brand_numbers[number]], "size": SIZES[number % len(SIZES)], "category": "synthetic",
+            "popularity": popularity[number]
+        }
+        for number in range(count)
+    ]
+
+
+def percentile(values, fraction):
+    return sorted(values)[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main(args):
+    products = generate(args.skus)
+    start = time.perf_counter()
+    catalog = ProductCatalog(products)
+    print(f"skus={len(catalog):,d} tokens={len(catalog.tokens):,d} build={time.perf_counter() - start:.1f}s")
+
+    rng = random.Random(11)
+    queries = []
+    for product in rng.sample(products, args.queries):
+        typed = f"{product['brand']} {product['name']}".lower()
+        queries.extend(typed[:end] for end in range(1, len(typed) + 1))
+
+    catalog.autocomplete(queries[0], 10)  # first numpy calls pay one-off setup costs
+    timings = []
+    empty = 0
+    for query in queries:
+        start = time.perf_counter()
+        results = catalog.autocomplete(query, 10)
+        timings.append((time.perf_counter() - start) * 1000)
+        empty += not results
+    print(f"autocomplete: {len(queries):,d} keystrokes p50={statistics.median(timings):.3f}ms "
+          f"p99={percentile(timings, 0.99):.3f}ms max={max(timings):.3f}ms ({empty} with no suggestions)")
+    over = sum(timing > 5 for timing in timings)
+    print(f"autocomplete over the 5ms budget: {over} ({over / len(timings):.2%})")
+
+    requests = rng.sample(products, args.queries)
+    start = time.perf_counter()
+    resolved = sum(catalog.resolve(p["name"], p["brand"], p["size"]) is not None for p in requests)
+    elapsed = (time.perf_counter() - start) / len(requests) * 1000
+    exact = sum((catalog.resolve(p["name"], p["brand"], p["size"]) or {}).get("id") == p["id"] for p in requests)
+    print(f"resolve: {elapsed:.3f}ms/request, {resolved / len(requests):.1%} resolved, "
+          f"{exact / len(requests):.1%} to the exact SKU")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--skus", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=500)
+    main(parser.parse_args())
@@ -0,0 +1,53 @@
+"""Offline benchmark: serial vs concurrent provider fan-out over stub adapters.
+
+Run from the backend directory: python benchmarks/bench_fanout.py --providers 8 --latency-ms 50
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from providers import StubProviderAdapter, fan_out, _call_adapter  # noqa: E402
+
+
+def build_adapters(count: int, latency_ms: float, jitter_ms: float, timeout: float):
+    adapters = []
+    for i in range(count):
+        name = ["Uber", "Ola", "Rapido", "Namma Yatri"][i % 4]
+        latency = latency_ms + random.uniform(0, jitter_ms)
+        adapters.append(StubProviderAdapter(name, "ride", latency, timeout=timeout))
+    return adapters
+
+
+async def serial(adapters, query):
+    for adapter in adapters:
+        await _call_adapter(adapter, query)
+
+
+async def run(args):
+    query = {"pickup_location": "A", "drop_location": "B", "distance_km": 5.0}
+    for label, strategy in (("serial", serial), ("fan_out", fan_out)):
+        timings = []
+        for _ in range(args.iterations):
+            adapters = build_adapters(args.providers, args.latency_ms, args.jitter_ms, args.timeout)
+            start = time.perf_counter()
+            await strategy(adapters, query)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        print(f"{label:8s} providers={args.providers} p50={statistics.median(timings):8.1f}ms p99={p99:8.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--providers", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--timeout", type=float, default=2.0)
+    parser.add_argument("--iterations", type=int, default=20)
+    asyncio.run(run(parser.parse_args()))
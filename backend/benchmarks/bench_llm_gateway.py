@@ -0,0 +1,61 @@
+"""Burst test for the LLM gateway against FakeLlmClient.
+
+Fires a burst of AI requests (some duplicated, spread over a few users) and
+reports how many were served, deduplicated, rate limited or shed, plus the
+latency distribution. Run from the backend directory:
+
+    python benchmarks/bench_llm_gateway.py --requests 500 --latency-ms 200
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from llm_gateway import FakeLlmClient, LlmGateway, LlmGatewayError  # noqa: E402
+
+
+async def run(args):
+    client = FakeLlmClient(args.latency_ms)
+    gateway = LlmGateway(client, max_concurrency=args.concurrency, max_queue_depth=args.queue_depth,
+                         user_rate_per_minute=args.user_rate, user_burst=args.user_burst)
+    latencies = []
+    refused = 0
+
+    async def one(i: int):
+        nonlocal refused
+        user_id = f"user-{i % args.users}"
+        session_id = f"smart_alerts_{user_id}" if i % 3 == 0 else f"analysis_{i}"
+        start = time.perf_counter()
+        try:
+            await gateway.complete(session_id, "system", f"prompt for {session_id}", user_id=user_id)
+            latencies.append((time.perf_counter() - start) * 1000)
+        except LlmGatewayError:
+            refused += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"requests={args.requests} served={len(latencies)} refused={refused} upstream_calls={client.calls} "
+          f"wall={elapsed:.2f}s")
+    if latencies:
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"latency p50={statistics.median(latencies):.0f}ms p99={p99:.0f}ms")
+    print(gateway.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--queue-depth", type=int, default=32)
+    parser.add_argument("--user-rate", type=float, default=10)
+    parser.add_argument("--user-burst", type=float, default=5)
+    asyncio.run(run(parser.parse_args()))
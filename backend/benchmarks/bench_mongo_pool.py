@@ -0,0 +1,119 @@
+"""Load test: how the Mongo connection pool size changes tail latency.
+
+Seeds a scratch database with `--documents` comparison-like documents (indexed
+like ride_comparisons), then, for each size in `--pool-sizes`, opens a client
+with that maxPoolSize and runs `--concurrency` coroutines issuing the
+history endpoint's keyset query (pagination.fetch_page) for `--seconds`.
+Reports throughput, latency percentiles, the mean wait for a pooled
+connection (metrics.MongoPoolListener) and wait-queue timeouts. Needs a
+mongod; the scratch database is dropped afterwards.
+
+Run from the backend directory:
+
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_mongo_pool.py --pool-sizes 2,5,10,25,100
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DESCENDING
+from pymongo.errors import ConnectionFailure
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from metrics import MetricsRegistry, MongoPoolListener  # noqa: E402
+from pagination import fetch_page  # noqa: E402
+
+USERS = 1000
+
+
+def percentile(values, fraction):
+    return sorted(values)[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def seed(db, count: int):
+    await db.comparisons.drop()
+    await db.comparisons.create_index([("user_id", 1), ("timestamp", DESCENDING), ("id", DESCENDING)])
+    rng = random.Random(3)
+    start = datetime(2024, 1, 1)
+    batch = []
+    for number in range(count):
+        batch.append({"id": str(uuid.uuid4()), "user_id": f"user-{rng.randrange(USERS)}",
+                      "timestamp": start + timedelta(seconds=number * 30), "pickup_location": "Koramangala",
+                      "drop_location": "Indiranagar", "distance_km": 6.5,
+                      "providers": [{"provider": name, "estimated_fare": rng.uniform(100, 300)}
+                                    for name in ("uber", "ola", "rapido")]})
+        if len(batch) == 5000:
+            await db.comparisons.insert_many(batch)
+            batch = []
+    if batch:
+        await db.comparisons.insert_many(batch)
+
+
+async def run_pool_size(pool_size: int, args):
+    listener = MongoPoolListener(MetricsRegistry(), pool_size)
+    client = AsyncIOMotorClient(args.mongo_url, maxPoolSize=pool_size, waitQueueTimeoutMS=args.wait_queue_timeout_ms,
+                                event_listeners=[listener])
+    collection = client[args.db].comparisons
+    latencies, timeouts = [], 0
+    deadline = time.perf_counter() + args.seconds
+    rng = random.Random(pool_size)
+
+    async def user_session():
+        nonlocal timeouts
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                await fetch_page(collection, {"user_id": f"user-{rng.randrange(USERS)}"}, None, 20)
+                latencies.append(time.perf_counter() - start)
+            except ConnectionFailure:
+                timeouts += 1
+
+    try:
+        await collection.find_one({})  # connect before timing
+        await asyncio.gather(*[user_session() for _ in range(args.concurrency)])
+        stats = listener.stats()
+    finally:
+        client.close()
+
+    if not latencies:
+        print(f"pool={pool_size:<4d} every request timed out waiting for a connection ({timeouts})")
+        return
+    print(f"pool={pool_size:<4d} {len(latencies) / args.seconds:8.0f} req/s  "
+          f"p50={statistics.median(latencies) * 1000:7.2f}ms  p99={percentile(latencies, 0.99) * 1000:7.2f}ms  "
+          f"p99.9={percentile(latencies, 0.999) * 1000:7.2f}ms  "
+          f"checkout wait={stats['checkout_wait_avg_ms']:6.2f}ms  "
+          f"wait-queue timeouts={timeouts}  open connections={stats['open']}")
+
+
+async def main(args):
+    client = AsyncIOMotorClient(args.mongo_url)
+    try:
+        await seed(client[args.db], args.documents)
+        print(f"{args.documents:,d} documents, {args.concurrency} concurrent requests, "
+              f"waitQueueTimeoutMS={args.wait_queue_timeout_ms}")
+        for pool_size in [int(size) for size in args.pool_sizes.split(",")]:
+            await run_pool_size(pool_size, args)
+    finally:
+        await client.drop_database(args.db)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo-url", default=os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    parser.add_argument("--db", default="comparify_pool_bench")
+    parser.add_argument("--documents", type=int, default=200_000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--pool-sizes", default="2,5,10,25,50,100")
+    parser.add_argument("--wait-queue-timeout-ms", type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,119 @@
+"""Benchmark: Mongo round trips and latency per preferences call, before and after.
+
+Runs against an in-memory stand-in for the `user_preferences` collection that
+sleeps `--rtt-ms` per operation and counts round trips (no Mongo needed):
+
+- update, before: find_one + update_one + find_one (insert_one for new users)
+- update, after:  PreferencesStore.upsert, one find_one_and_update
+- read, before:   find_one on every compare / GET / personalization call
+- read, after:    PreferencesStore.get (cache hit unless expired or evicted)
+
+Run from the backend directory:
+
+    python benchmarks/bench_preferences.py --users 200 --reads 5000 --rtt-ms 1
+"""
+import argparse
+import asyncio
+import copy
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from preferences import PreferencesStore  # noqa: E402
+
+
+class SimulatedCollection:
+    def __init__(self, rtt_ms: float):
+        self.rtt = rtt_ms / 1000
+        self.documents = {}
+        self.round_trips = 0
+
+    async def _round_trip(self):
+        self.round_trips += 1
+        await asyncio.sleep(self.rtt)
+
+    async def find_one(self, query, projection=None):
+        await self._round_trip()
+        document = self.documents.get(query["user_id"])
+        return copy.deepcopy(document) if document is not None else None
+
+    async def update_one(self, query, update):
+        await self._round_trip()
+        self.documents[query["user_id"]].update(copy.deepcopy(update["$set"]))
+
+    async def insert_one(self, document):
+        await self._round_trip()
+        self.documents[document["user_id"]] = copy.deepcopy(document)
+
+    async def find_one_and_update(self, query, update, projection=None, upsert=False, return_document=None):
+        await self._round_trip()
+        document = self.documents.get(query["user_id"])
+        if document is None:
+            document = self.documents[query["user_id"]] = copy.deepcopy(update["$setOnInsert"])
+        document.update(copy.deepcopy(update["$set"]))
+        return copy.deepcopy(document)
+
+
+class SimulatedDb:
+    def __init__(self, rtt_ms: float):
+        self.user_preferences = SimulatedCollection(rtt_ms)
+
+
+def preferences_for(user_id: str):
+    return {"user_id": user_id, "preferred_providers": {"ride": ["uber", "rapido"]}, "budget_limits": {"ride": 250},
+            "notification_settings": {"price_drop": True}, "location_preferences": {"home": "Koramangala"}}
+
+
+async def update_before(db: SimulatedDb, user_id: str):
+    """The original create_user_preferences flow"""
+    fields = preferences_for(user_id)
+    existing = await db.user_preferences.find_one({"user_id": user_id})
+    if existing:
+        await db.user_preferences.update_one({"user_id": user_id}, {"$set": {**fields, "updated_at": datetime.utcnow()}})
+        return await db.user_preferences.find_one({"user_id": user_id})
+    await db.user_preferences.insert_one({**fields, "created_at": datetime.utcnow()})
+    return fields
+
+
+async def measure(label: str, db: SimulatedDb, calls):
+    db.user_preferences.round_trips = 0
+    start = time.perf_counter()
+    for call in calls:
+        await call()
+    elapsed = time.perf_counter() - start
+    trips = db.user_preferences.round_trips
+    print(f"{label:<16} {len(calls):>6,d} calls  {trips / len(calls):5.2f} round trips/call  "
+          f"{elapsed / len(calls) * 1000:7.3f}ms/call")
+
+
+async def main(args):
+    rng = random.Random(3)
+    users = [f"user-{number}" for number in range(args.users)]
+    # Each user saves preferences twice: a create, then an update
+    writes = users + users
+    reads = [rng.choice(users) for _ in range(args.reads)]
+
+    before = SimulatedDb(args.rtt_ms)
+    await measure("update, before", before, [lambda user=user: update_before(before, user) for user in writes])
+    await measure("read, before", before,
+                  [lambda user=user: before.user_preferences.find_one({"user_id": user}) for user in reads])
+
+    after = SimulatedDb(args.rtt_ms)
+    store = PreferencesStore(after, ttl_seconds=args.ttl)
+    await measure("update, after", after, [lambda user=user: store.upsert(user, preferences_for(user)) for user in writes])
+    store._entries.clear()  # reads start cold, as after a restart
+    await measure("read, after", after, [lambda user=user: store.get(user) for user in reads])
+    print(f"cache: {store.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--reads", type=int, default=5000)
+    parser.add_argument("--rtt-ms", type=float, default=1.0)
+    parser.add_argument("--ttl", type=float, default=60)
+    asyncio.run(main(parser.parse_args()))
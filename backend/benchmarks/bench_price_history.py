@@ -0,0 +1,88 @@
+"""Benchmark: rows a 90-day price-trend query touches, before and after rollups.
+
+Simulates `--comparisons-per-day` compares of one popular route (each with
+`--providers` quotes, `--cache-hit-rate` of them served from the quote cache),
+then counts what a 90-day trend query for that route reads:
+
+- before: every comparison of the route (via the route_key index), unwound
+- raw points: the time-series points for the route
+- after: price_rollups rows at hourly and daily resolution
+
+and times summarizing each row set into per-provider min/avg/max in Python,
+as a stand-in for the server-side work that scales with rows read.
+
+Run from the backend directory:
+
+    python benchmarks/bench_price_history.py --comparisons-per-day 20000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from price_history import AUTO_HOURLY_RANGE, MAX_HOURLY_RANGE  # noqa: E402
+
+DAYS = 90
+
+
+def summarize(providers, buckets, prices, counts):
+    """Per (provider, bucket) min/avg/max, the same reduction the rollups store"""
+    order = np.lexsort((buckets, providers))
+    providers, buckets, prices, counts = providers[order], buckets[order], prices[order], counts[order]
+    starts = np.flatnonzero(np.r_[True, (np.diff(providers) != 0) | (np.diff(buckets) != 0)])
+    sums = np.add.reduceat(prices * counts, starts)
+    return {
+        "min": np.minimum.reduceat(prices, starts),
+        "max": np.maximum.reduceat(prices, starts),
+        "avg": sums / np.add.reduceat(counts, starts),
+    }
+
+
+def timed(label, rows, providers, buckets, prices, counts=None):
+    counts = np.ones(len(prices)) if counts is None else counts
+    start = time.perf_counter()
+    result = summarize(providers, buckets, prices, counts)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{label:<34} {rows:>12,d} rows read  {len(result['avg']):>7,d} points out  {elapsed:8.2f}ms")
+
+
+def main(args):
+    rng = np.random.default_rng(5)
+    comparisons = args.comparisons_per_day * DAYS
+    seconds = np.sort(rng.integers(0, DAYS * 86400, size=comparisons))
+    fresh = rng.random(comparisons) >= args.cache_hit_rate
+
+    quote_seconds = np.repeat(seconds, args.providers)
+    quote_providers = np.tile(np.arange(args.providers), comparisons)
+    quote_prices = rng.normal(250, 40, size=len(quote_seconds))
+    recorded = np.repeat(fresh, args.providers)
+
+    print(f"route: {comparisons:,d} comparisons over {DAYS} days, {args.providers} providers, "
+          f"{args.cache_hit_rate:.0%} cache hits")
+    print(f"auto resolution: hourly up to {AUTO_HOURLY_RANGE.days} days, daily beyond "
+          f"(hourly capped at {MAX_HOURLY_RANGE.days} days)")
+
+    # Before: the route's comparisons come off the route_key index, then each is unwound
+    timed("before: unwind comparisons", comparisons + len(quote_seconds),
+          quote_providers, quote_seconds // 86400, quote_prices)
+    timed("raw time-series points", int(recorded.sum()),
+          quote_providers[recorded], quote_seconds[recorded] // 86400, quote_prices[recorded])
+
+    for label, width in (("after: hourly rollups", 3600), ("after: daily rollups", 86400)):
+        buckets = quote_seconds[recorded] // width
+        rolled = summarize(quote_providers[recorded], buckets, quote_prices[recorded], np.ones(int(recorded.sum())))
+        rows = len(rolled["avg"])
+        keys = np.unique(np.stack([quote_providers[recorded], buckets]), axis=1)
+        timed(label, rows, keys[0], keys[1] * width // 86400, rolled["avg"], np.ones(rows))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--comparisons-per-day", type=int, default=20000)
+    parser.add_argument("--providers", type=int, default=4)
+    parser.add_argument("--cache-hit-rate", type=float, default=0.6)
+    main(parser.parse_args())
@@ -0,0 +1,96 @@
+"""Prompt size before/after compaction for the personalization and smart-alert prompts.
+
+Builds synthetic history documents shaped like stored comparisons and compares
+interpolating the raw documents with the projected summaries. Run from the
+backend directory: python benchmarks/bench_prompt_size.py
+"""
+import sys
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from prompts import (  # noqa: E402
+    GROCERY_HISTORY_PROJECTION, PROMPT_TOKEN_BUDGET, RIDE_HISTORY_PROJECTION, SAVINGS_PROJECTION,
+    estimate_tokens, render_within_budget, summarize_grocery_history, summarize_ride_history, summarize_savings
+)
+from providers import generate_mock_grocery_providers, generate_mock_ride_providers  # noqa: E402
+
+
+def ride_document(i: int):
+    return {
+        "_id": uuid.uuid4().hex[:24], "id": str(uuid.uuid4()), "user_id": "bench-user",
+        "pickup_location": f"Koramangala {i % 3} Block", "drop_location": "Indiranagar Metro",
+        "distance_km": 6.5, "estimated_duration_mins": 25,
+        "providers": generate_mock_ride_providers("", "", 6.5), "provider_status": [],
+        "timestamp": datetime.utcnow(), "best_price_provider": "Rapido", "best_time_provider": "Uber"
+    }
+
+
+def grocery_document(i: int):
+    return {
+        "_id": uuid.uuid4().hex[:24], "id": str(uuid.uuid4()), "user_id": "bench-user",
+        "product_name": f"Basmati Rice {i % 2}", "brand": "India Gate", "category": "staples",
+        "search_query": "basmati rice 5kg", "providers": generate_mock_grocery_providers("Basmati Rice"),
+        "provider_status": [], "timestamp": datetime.utcnow(),
+        "best_price_provider": "BigBasket", "best_delivery_provider": "Zepto"
+    }
+
+
+def savings_document(i: int):
+    return {
+        "_id": uuid.uuid4().hex[:24], "id": str(uuid.uuid4()), "user_id": "bench-user",
+        "comparison_type": "ride", "comparison_id": str(uuid.uuid4()), "original_price": 120,
+        "chosen_price": 35, "savings_amount": 85, "provider_chosen": "Rapido", "timestamp": datetime.utcnow()
+    }
+
+
+def project(document, projection):
+    """Apply a Mongo-style inclusion projection (one level of dotted paths)"""
+    result = {}
+    for field, include in projection.items():
+        if not include:
+            continue
+        top, _, sub = field.partition(".")
+        if top not in document:
+            continue
+        if sub:
+            result[top] = [
+                {**(result[top][n] if top in result else {}), sub: item[sub]}
+                for n, item in enumerate(document[top]) if sub in item
+            ]
+        else:
+            result[top] = document[top]
+    return result
+
+
+def report(label, before, after):
+    print(f"{label:26s} before={len(before.encode()):6d}B ~{estimate_tokens(before):5d} tok   "
+          f"after={len(after.encode()):5d}B ~{estimate_tokens(after):4d} tok   "
+          f"({100 * (1 - len(after) / len(before)):.0f}% smaller)")
+
+
+def main():
+    rides = [ride_document(i) for i in range(10)]
+    groceries = [grocery_document(i) for i in range(10)]
+    savings = [savings_document(i) for i in range(10)]
+
+    report("personalized (ride)", str(rides),
+           render_within_budget(summarize_ride_history([project(r, RIDE_HISTORY_PROJECTION) for r in rides]),
+                                PROMPT_TOKEN_BUDGET * 3 // 4))
+    report("personalized (grocery)", str(groceries),
+           render_within_budget(summarize_grocery_history([project(g, GROCERY_HISTORY_PROJECTION) for g in groceries]),
+                                PROMPT_TOKEN_BUDGET * 3 // 4))
+    before = f"{rides[:5]}{groceries[:5]}{savings}"
+    after = (render_within_budget(summarize_ride_history([project(r, RIDE_HISTORY_PROJECTION) for r in rides[:5]]),
+                                  PROMPT_TOKEN_BUDGET // 3)
+             + render_within_budget(summarize_grocery_history(
+                 [project(g, GROCERY_HISTORY_PROJECTION) for g in groceries[:5]]), PROMPT_TOKEN_BUDGET // 3)
+             + render_within_budget(summarize_savings([project(s, SAVINGS_PROJECTION) for s in savings]),
+                                    PROMPT_TOKEN_BUDGET // 3))
+    report("smart alerts", before, after)
+
+
+if __name__ == "__main__":
+    main()
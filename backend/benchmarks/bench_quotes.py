@@ -0,0 +1,81 @@
+"""Benchmark: memory and latency of slotted quotes vs free-form provider dicts.
+
+For comparisons of `--quotes` grocery options each, measures:
+- memory held per comparison (what the quote cache keeps) as dicts vs GroceryQuoteData
+- picking the fastest option: re-splitting "10-15 mins" per request vs the parsed bounds
+- the one-off costs: parsing adapter dicts and to_dict() at the edge
+
+Run from the backend directory:
+
+    python benchmarks/bench_quotes.py --comparisons 10000 --quotes 4 50
+"""
+import argparse
+import copy
+import random
+import sys
+import time
+import tracemalloc
+from operator import attrgetter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from providers import generate_mock_grocery_providers  # noqa: E402
+from quotes import parse_quotes  # noqa: E402
+
+
+def synthetic_comparison(quotes_per_comparison: int):
+    templates = generate_mock_grocery_providers("basmati rice")
+    quotes = []
+    for _ in range(quotes_per_comparison):
+        quote = copy.deepcopy(random.choice(templates))
+        low = random.randint(8, 40)
+        quote["price"] = random.randint(400, 700)
+        quote["delivery_time"] = f"{low}-{low + random.randint(2, 10)} mins"
+        quotes.append(quote)
+    return quotes
+
+
+def retained_bytes(build):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return size, kept
+
+
+def per_call_us(fn, items):
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+
+def main(args):
+    random.seed(7)
+    for quotes_per_comparison in args.quotes:
+        raw = [synthetic_comparison(quotes_per_comparison) for _ in range(args.comparisons)]
+
+        dict_bytes, dicts = retained_bytes(lambda: copy.deepcopy(raw))
+        slotted_bytes, slotted = retained_bytes(lambda: [parse_quotes("grocery", quotes) for quotes in raw])
+
+        fastest_dict_us = per_call_us(lambda quotes: min(quotes, key=lambda x: int(x["delivery_time"].split("-")[0])),
+                                      dicts)
+        by_eta = attrgetter("eta_min_mins")
+        fastest_slotted_us = per_call_us(lambda quotes: min(quotes, key=by_eta), slotted)
+        parse_us = per_call_us(lambda quotes: parse_quotes("grocery", quotes), raw)
+        to_dict_us = per_call_us(lambda quotes: [quote.to_dict() for quote in quotes], slotted)
+
+        print(f"quotes/comparison={quotes_per_comparison:>4d} "
+              f"memory dict={dict_bytes / args.comparisons:9.0f}B slotted={slotted_bytes / args.comparisons:9.0f}B "
+              f"({1 - slotted_bytes / dict_bytes:5.1%} less) | fastest-option dict={fastest_dict_us:7.2f}us "
+              f"slotted={fastest_slotted_us:7.2f}us | parse once={parse_us:7.2f}us to_dict at edge={to_dict_us:7.2f}us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--comparisons", type=int, default=10_000)
+    parser.add_argument("--quotes", type=int, nargs="+", default=[4, 50])
+    main(parser.parse_args())
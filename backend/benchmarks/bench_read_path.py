@@ -0,0 +1,109 @@
+"""Benchmark: list-endpoint response path, model-per-document vs FastJSONResponse.
+
+Serves the same in-memory ride comparison documents (no Mongo involved) through
+two FastAPI routes and drives the ASGI app directly:
+
+- models: `[RideComparison(**doc)]` + response_model validation + FastAPI's encoder
+- fast:   ReadSerializer.prepare + FastJSONResponse (orjson when installed)
+
+Run from the backend directory:
+
+    python benchmarks/bench_read_path.py --rows 20 200 2000
+"""
+import argparse
+import asyncio
+import copy
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')  # the client is never used
+os.environ.setdefault('DB_NAME', 'benchmark')
+
+from fastapi import FastAPI  # noqa: E402
+
+from fast_json import FastJSONResponse, ReadSerializer, orjson  # noqa: E402
+from providers import generate_mock_ride_providers  # noqa: E402
+from quotes import parse_quotes  # noqa: E402
+from server import RideComparison, RideComparisonPage  # noqa: E402
+
+
+def stored_documents(count: int):
+    quotes = [quote.to_dict() for quote in parse_quotes("ride", generate_mock_ride_providers("a", "b", 5))]
+    now = datetime.utcnow()
+    return [
+        {
+            "id": str(uuid.uuid4()), "user_id": "user-1", "pickup_location": "Koramangala",
+            "drop_location": "Indiranagar", "distance_km": 5.2, "estimated_duration_mins": 18,
+            "providers": copy.deepcopy(quotes), "provider_status": [], "ranked_options": [2, 1, 0, 3],
+            "timestamp": now - timedelta(minutes=i), "best_price_provider": "Rapido", "best_time_provider": "Uber"
+        }
+        for i in range(count)
+    ]
+
+
+def build_app(documents):
+    app = FastAPI()
+    reader = ReadSerializer(RideComparison)
+
+    # Each route copies the page, as a fresh Motor query would return new dicts
+    @app.get("/models", response_model=RideComparisonPage)
+    async def models():
+        page = copy.copy(documents)
+        return RideComparisonPage(items=[RideComparison(**doc) for doc in page], next_cursor=None)
+
+    @app.get("/fast", response_model=RideComparisonPage)
+    async def fast():
+        page = copy.copy(documents)
+        return FastJSONResponse({"items": reader.prepare(page), "next_cursor": None})
+
+    return app
+
+
+async def call(app, path: str) -> int:
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+             "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "", "headers": [],
+             "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80)}
+    size = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal size
+        if message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return size
+
+
+async def measure(app, path: str, requests: int):
+    await call(app, path)
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _ in range(requests):
+        size = await call(app, path)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    return requests / wall, cpu / requests * 1000, size
+
+
+async def main(args):
+    print(f"encoder: {'orjson' if orjson is not None else 'json (orjson not installed)'}")
+    for rows in args.rows:
+        app = build_app(stored_documents(rows))
+        requests = max(5, 4000 // rows)
+        models_rps, models_cpu, models_size = await measure(app, "/models", requests)
+        fast_rps, fast_cpu, fast_size = await measure(app, "/fast", requests)
+        print(f"rows={rows:>5d} models={models_rps:8.1f} req/s {models_cpu:8.2f}ms CPU/req ({models_size:,d}B) | "
+              f"fast={fast_rps:8.1f} req/s {fast_cpu:8.2f}ms CPU/req ({fast_size:,d}B) | "
+              f"{models_cpu / fast_cpu:4.1f}x less CPU")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[20, 200, 2000])
+    asyncio.run(main(parser.parse_args()))
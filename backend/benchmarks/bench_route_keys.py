@@ -0,0 +1,77 @@
+"""Benchmark: how much route normalization shrinks grouping cardinality.
+
+Generates ride requests between gazetteer places, written the way users type
+them (aliases, abbreviations, punctuation, city suffixes, pincodes, casing), and
+counts the distinct groups the quote cache / analytics / alerts would see:
+
+- raw:      the exact (pickup, drop) strings (old popular-routes grouping)
+- lowered:  lowercased, whitespace-collapsed strings (old cache and alert key)
+- route_key from routes.RouteNormalizer
+
+Uses GAZETTEER_PATH, or the offline fixture when it isn't set. Spellings are
+drawn from the gazetteer's own aliases, so the resolution rate is an upper
+bound for real traffic; unknown addresses fall back to canonical text.
+
+Run from the backend directory:
+
+    python benchmarks/bench_route_keys.py --requests 100000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from quote_cache import normalize_text  # noqa: E402
+from routes import FIXTURE_GAZETTEER_PATH, GAZETTEER_PATH, Gazetteer, RouteNormalizer  # noqa: E402
+
+SUFFIXES = ["", "", ", Bangalore", ", Bengaluru", " Bengaluru 560034", ", Karnataka, India"]
+PREFIXES = ["", "", "near ", "Opp. "]
+
+
+def spellings(place):
+    names = [place["name"], *place.get("aliases", [])]
+    name = random.choice(names)
+    name = name.replace("road", random.choice(["road", "Rd", "rd."])).replace("Road", random.choice(["Road", "Rd"]))
+    name = random.choice([name, name.lower(), name.upper(), name.title(), "  ".join(name.split())])
+    return f"{random.choice(PREFIXES)}{name}{random.choice(SUFFIXES)}"
+
+
+def main(args):
+    random.seed(7)
+    gazetteer = Gazetteer.load(GAZETTEER_PATH or FIXTURE_GAZETTEER_PATH)
+    places = list(gazetteer.places.values())
+    requests = []
+    for _ in range(args.requests):
+        pickup, drop = random.sample(places, 2)
+        requests.append((spellings(pickup), spellings(drop), pickup["id"], drop["id"]))
+
+    raw = {(pickup, drop) for pickup, drop, _, _ in requests}
+    lowered = {(normalize_text(pickup), normalize_text(drop)) for pickup, drop, _, _ in requests}
+    truth = {(pickup_id, drop_id) for _, _, pickup_id, drop_id in requests}
+
+    normalizer = RouteNormalizer(gazetteer, geohash_precision=0)
+    start = time.perf_counter()
+    keys = [normalizer.route_key(pickup, drop) for pickup, drop, _, _ in requests]
+    elapsed = time.perf_counter() - start
+    cold_us = elapsed / len(requests) * 1e6
+    start = time.perf_counter()
+    for pickup, drop, _, _ in requests:
+        normalizer.route_key(pickup, drop)
+    warm_us = (time.perf_counter() - start) / len(requests) * 1e6
+
+    matched = sum(key == f"place:{pickup_id}|place:{drop_id}" for key, (_, _, pickup_id, drop_id) in zip(keys, requests))
+    print(f"requests={args.requests:,d} true routes={len(truth):,d}")
+    print(f"raw strings      {len(raw):>8,d} groups")
+    print(f"lowercased       {len(lowered):>8,d} groups")
+    print(f"route_key        {len(set(keys)):>8,d} groups ({1 - len(set(keys)) / len(raw):.1%} fewer than raw, "
+          f"{matched / len(requests):.1%} of requests resolved to the right places)")
+    print(f"route_key cost   {cold_us:.1f}us/request first pass, {warm_us:.2f}us/request repeat pass")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=100_000)
+    main(parser.parse_args())
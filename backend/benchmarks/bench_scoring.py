@@ -0,0 +1,101 @@
+"""Benchmark: picking and ranking grocery options, per-dict Python vs columnar NumPy.
+
+The per-dict path is what the compare endpoints used to do (min() lambdas that
+re-split "10-15 mins") plus an equivalent weighted ranking in pure Python. The
+columnar path works on quotes already parsed by quotes.parse_quotes (the quote
+cache holds them in that form, so parsing is paid once per fan-out, reported
+separately), lays them out as a QuoteTable and selects and ranks on the arrays. Run from the backend directory:
+
+    python benchmarks/bench_scoring.py --sizes 10 1000 100000
+"""
+import argparse
+import heapq
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from quotes import parse_quotes  # noqa: E402
+from scoring import DEFAULT_WEIGHTS, PREFERRED_PROVIDER_BONUS, grocery_table, rank_providers  # noqa: E402
+
+PROVIDERS = ["Blinkit", "Instamart", "Zepto", "BigBasket", "JioMart", "DMart"]
+PREFERENCES = {"preferred_providers": {"grocery": ["zepto"]}, "budget_limits": {"grocery": 600}}
+
+
+def synthetic_quotes(count: int):
+    quotes = []
+    for _ in range(count):
+        low = random.randint(8, 40)
+        quotes.append({
+            "provider": random.choice(PROVIDERS),
+            "price": round(random.uniform(100, 900), 2),
+            "price_per_unit": round(random.uniform(20, 180), 2),
+            "delivery_fee": random.choice([0, 0, 15, 25, 40]),
+            "delivery_time": f"{low}-{low + random.randint(2, 10)} mins",
+            "rating": round(random.uniform(3.5, 4.9), 1),
+        })
+    return quotes
+
+
+def per_dict(quotes, k):
+    best_price = min(quotes, key=lambda x: x["price"] + x["delivery_fee"])
+    best_delivery = min(quotes, key=lambda x: int(x["delivery_time"].split("-")[0]))
+
+    weights = DEFAULT_WEIGHTS["grocery"]
+    rows = [(q["price"] + q["delivery_fee"], int(q["delivery_time"].split("-")[0]), q["price_per_unit"], q["rating"])
+            for q in quotes]
+    bounds = [(min(column), max(column)) for column in zip(*rows)]
+
+    def normalized(value, column):
+        low, high = bounds[column]
+        return (value - low) / (high - low) if high != low else 0.0
+
+    budget = PREFERENCES["budget_limits"]["grocery"]
+    preferred = set(PREFERENCES["preferred_providers"]["grocery"])
+    scores = []
+    for position, (quote, row) in enumerate(zip(quotes, rows)):
+        score = (weights["price"] * normalized(row[0], 0) + weights["eta_min"] * normalized(row[1], 1)
+                 + weights["per_unit_price"] * normalized(row[2], 2) + weights["rating"] * (1 - normalized(row[3], 3)))
+        if quote["provider"].lower() in preferred:
+            score -= PREFERRED_PROVIDER_BONUS
+        if row[0] > budget:
+            score += sum(weights.values()) + 1.0
+        scores.append((score, position))
+    ranked = [position for _, position in heapq.nsmallest(k, scores)]
+    return best_price, best_delivery, ranked
+
+
+def columnar(quotes, parsed, k):
+    table = grocery_table(parsed)
+    return quotes[table.best("price")], quotes[table.best("eta_min")], rank_providers(table, "grocery", PREFERENCES, k)
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main(args):
+    random.seed(7)
+    for size in args.sizes:
+        quotes = synthetic_quotes(size)
+        repeat = max(1, 20_000 // size)
+        dict_ms, expected = timed(lambda: per_dict(quotes, args.top_k), repeat)
+        parse_ms, parsed = timed(lambda: parse_quotes("grocery", quotes), repeat)
+        columnar_ms, actual = timed(lambda: columnar(quotes, parsed, args.top_k), repeat)
+        table = grocery_table(parsed)
+        rank_ms, _ = timed(lambda: rank_providers(table, "grocery", PREFERENCES, args.top_k), repeat)
+        assert expected[0] is actual[0] and expected[1] is actual[1] and expected[2] == actual[2]
+        print(f"options={size:>7,d} per-dict={dict_ms:9.3f}ms columnar={columnar_ms:9.3f}ms "
+              f"(rank only={rank_ms:8.3f}ms, one-off parse={parse_ms:8.3f}ms) speedup={dict_ms / columnar_ms:5.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100_000])
+    parser.add_argument("--top-k", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,131 @@
+"""Load test: API throughput with 1..N uvicorn worker processes on one box.
+
+For each worker count, starts `serve.py` with WEB_CONCURRENCY set, waits for
+it to answer and warms it up for `--warmup` seconds (so every worker has
+finished starting), then drives `--connections` keep-alive connections (spread over
+`--clients` load-generator processes) at `--path` for `--seconds` and reports
+requests/s and latency percentiles. The server uses MONGO_URL/DB_NAME and the
+rest of the environment as usual; pass STATE_BACKEND=redis to measure the
+shared-state mode. The default path (catalog typeahead) is CPU-bound and
+doesn't read Mongo. Paths must answer with a Content-Length (not streamed).
+
+Run from the backend directory:
+
+    python benchmarks/bench_workers.py --max-workers 4 --seconds 10
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+async def _request(reader, writer, raw: bytes) -> int:
+    writer.write(raw)
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    await reader.readexactly(length)
+    return int(head.split(b" ", 2)[1])
+
+
+async def _connection(port: int, raw: bytes, deadline: float, latencies, errors):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status = await _request(reader, writer, raw)
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+def _client(job):
+    """One load-generator process: `connections` concurrent keep-alive connections until the deadline"""
+    port, path, connections, seconds = job
+    raw = f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: keep-alive\r\n\r\n".encode()
+    latencies, errors = [], []
+
+    async def run():
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(*[_connection(port, raw, deadline, latencies, errors) for _ in range(connections)])
+
+    asyncio.run(run())
+    return latencies, len(errors)
+
+
+async def _ready(port: int, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    raw = b"GET /api/ HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n"
+    while time.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            status = await _request(reader, writer, raw)
+            writer.close()
+            if status == 200:
+                return True
+        except OSError:
+            pass
+        await asyncio.sleep(0.5)
+    return False
+
+
+def percentile(values, fraction):
+    return sorted(values)[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_with_workers(workers: int, args) -> float:
+    env = {**os.environ, "WEB_CONCURRENCY": str(workers), "PORT": str(args.port)}
+    server = subprocess.Popen([sys.executable, "serve.py"], cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not asyncio.run(_ready(args.port, args.startup_timeout)):
+            raise RuntimeError(f"server with {workers} workers didn't answer within {args.startup_timeout}s")
+        per_client = max(1, args.connections // args.clients)
+        with multiprocessing.Pool(args.clients) as pool:
+            pool.map(_client, [(args.port, args.path, per_client, args.warmup)] * args.clients)
+            results = pool.map(_client, [(args.port, args.path, per_client, args.seconds)] * args.clients)
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = [latency for client_latencies, _ in results for latency in client_latencies]
+    errors = sum(client_errors for _, client_errors in results)
+    throughput = len(latencies) / args.seconds
+    print(f"workers={workers:<3d} {throughput:9.1f} req/s  p50={statistics.median(latencies) * 1000:7.2f}ms  "
+          f"p99={percentile(latencies, 0.99) * 1000:7.2f}ms  errors={errors}")
+    return throughput
+
+
+def main(args):
+    print(f"{os.cpu_count()} CPUs; {args.connections} connections from {args.clients} client processes; "
+          f"GET {args.path}")
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        throughput = run_with_workers(workers, args)
+        baseline = baseline or throughput
+        print(f"            scaling vs 1 worker: {throughput / baseline:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--path", default="/api/products/autocomplete?q=ma&limit=10")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    main(parser.parse_args())
@@ -0,0 +1,268 @@
+"""In-process product catalog: canonical product IDs, size parsing and typeahead.
+
+Products are numbered in descending popularity, so every posting list (sorted
+product numbers per token) is also a ranking. The index holds:
+
+- postings:  token -> sorted int32 array of product numbers (inverted index),
+  stored back to back in token order so a token range is one contiguous slice
+- a prefix trie flattened into the sorted token array: a prefix is the token
+  range [bisect(prefix), bisect(prefix + "\\uffff")), and `_heads` keeps the
+  first MAX_SUGGESTIONS postings of every token, so the top products under any
+  prefix come from one slice + partition, never a walk over the range
+- `_token_matrix`: each product's token numbers (padded). Multi-word queries
+  walk the shortest posting list (or the products under a rare prefix) in
+  growing chunks and test the other words and the prefix range on whole
+  chunks at once, stopping as soon as enough suggestions are found
+
+Grocery compare requests resolve `product_name`/`brand` to a catalog product id
+(`product_key` is then "sku:<id>"), which the quote cache, popular-products
+analytics and price alerts group on. A product with a pack size only resolves
+from a request that names the same size ("Amul Butter 500 g"); without one,
+"Amul Butter" stays keyed on its name rather than on one arbitrary pack.
+
+Catalog source: CATALOG_PATH. There is no default: without it grocery products
+are keyed on their names. fixtures/catalog.json is a small offline fixture for
+tests, not a deployment catalog.
+"""
+import bisect
+import json
+import logging
+import os
+import re
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from quote_cache import normalize_text
+
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PATH = os.environ.get('CATALOG_PATH', '')
+# Offline test data; only tests load it
+FIXTURE_CATALOG_PATH = str(Path(__file__).parent / 'fixtures' / 'catalog.json')
+MAX_SUGGESTIONS = 20
+MAX_PRODUCT_TOKENS = 12
+MIN_RESOLVE_SCORE = 0.5
+PREFIX_DRIVER_MAX = 16384
+RESOLVE_CANDIDATES = 200
+
+# unit -> (base unit, factor to base)
+UNITS = {
+    "mg": ("g", 0.001), "g": ("g", 1), "gm": ("g", 1), "gms": ("g", 1), "gram": ("g", 1), "grams": ("g", 1),
+    "kg": ("g", 1000), "kgs": ("g", 1000), "kilo": ("g", 1000),
+    "ml": ("ml", 1), "l": ("ml", 1000), "ltr": ("ml", 1000), "ltrs": ("ml", 1000), "litre": ("ml", 1000),
+    "litres": ("ml", 1000), "liter": ("ml", 1000), "liters": ("ml", 1000),
+    "pc": ("piece", 1), "pcs": ("piece", 1), "piece": ("piece", 1), "pieces": ("piece", 1), "dozen": ("piece", 12),
+}
+# price_per_unit is quoted per kg, per litre or per piece
+PRICE_UNITS = {"g": ("kg", 1000), "ml": ("l", 1000), "piece": ("piece", 1)}
+STOPWORDS = {"of", "and", "the", "with", "for", "a", "an"}
+
+_SIZE = re.compile(r"(?:(\d+)\s*[x×*]\s*)?(\d+(?:\.\d+)?)\s*(" + "|".join(sorted(UNITS, key=len, reverse=True)) + r")\b",
+                   re.IGNORECASE)
+_PUNCTUATION = re.compile(r"[^\w\s]|_")
+
+
+def parse_size(text: Optional[str]) -> Optional[Tuple[float, str]]:
+    """"5 kg" -> (5000.0, "g"); "2 x 500 ml" -> (1000.0, "ml"); "1 dozen" -> (12.0, "piece")"""
+    match = _SIZE.search(text or "")
+    if match is None:
+        return None
+    count = int(match.group(1)) if match.group(1) else 1
+    base, factor = UNITS[match.group(3).lower()]
+    return count * float(match.group(2)) * factor, base
+
+
+def unit_price(price: float, size: Optional[str]) -> Optional[Tuple[float, str]]:
+    """Price per kg / l / piece for a pack of `size`, or None when the size can't be parsed"""
+    parsed = parse_size(size)
+    if parsed is None or parsed[0] <= 0:
+        return None
+    quantity, base = parsed
+    unit, per = PRICE_UNITS[base]
+    return round(price / quantity * per, 2), unit
+
+
+def words(text: Optional[str]) -> List[str]:
+    """Lowercase ASCII words without sizes or punctuation ("Haldiram's" -> "haldirams")"""
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode()
+    return _PUNCTUATION.sub(" ", _SIZE.sub(" ", text.lower().replace("'", ""))).split()
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return [word for word in words(text) if word not in STOPWORDS]
+
+
+class ProductCatalog:
+    def __init__(self, products: Sequence[Dict[str, Any]]):
+        """`products`: {id, name, brand?, size?, category?, popularity?} records"""
+        ordered = sorted(products, key=lambda product: -product.get("popularity", 0))
+        self.products = [
+            {key: product.get(key) for key in ("id", "name", "brand", "size", "category")} for product in ordered
+        ]
+        self._number = {product["id"]: number for number, product in enumerate(self.products)}
+
+        product_tokens = [self._product_tokens(product) for product in self.products]
+        vocabulary = sorted({token for tokens in product_tokens for token in tokens})
+        self.tokens = vocabulary
+        token_number = {token: number for number, token in enumerate(vocabulary)}
+
+        postings: List[List[int]] = [[] for _ in vocabulary]
+        self._token_matrix = np.full((len(self.products), MAX_PRODUCT_TOKENS), -1, dtype=np.int32)
+        for number, tokens in enumerate(product_tokens):
+            numbers = sorted({token_number[token] for token in tokens})[:MAX_PRODUCT_TOKENS]
+            self._token_matrix[number, :len(numbers)] = numbers
+            for token in numbers:
+                postings[token].append(number)
+        self._offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum([len(posting) for posting in postings], out=self._offsets[1:])
+        self._flat_postings = np.fromiter((number for posting in postings for number in posting), dtype=np.int32,
+                                          count=int(self._offsets[-1]))
+        self._postings = [self._flat_postings[self._offsets[token]:self._offsets[token + 1]]
+                          for token in range(len(vocabulary))]
+
+        # Missing heads are padded past the last product number so they sort last
+        self._pad = len(self.products)
+        self._heads = np.full((len(vocabulary), MAX_SUGGESTIONS), self._pad, dtype=np.int32)
+        for token, posting in enumerate(self._postings):
+            head = posting[:MAX_SUGGESTIONS]
+            self._heads[token, :len(head)] = head
+
+    def __len__(self):
+        return len(self.products)
+
+    @classmethod
+    def load(cls, path: str) -> "ProductCatalog":
+        with open(path, encoding="utf-8") as handle:
+            return cls(json.load(handle)["products"])
+
+    @staticmethod
+    def _product_tokens(product: Dict[str, Any]) -> List[str]:
+        return tokenize(product.get("name")) + tokenize(product.get("brand"))
+
+    def _token_range(self, prefix: str) -> Tuple[int, int]:
+        return bisect.bisect_left(self.tokens, prefix), bisect.bisect_left(self.tokens, prefix + "\uffff")
+
+    def _token_number(self, token: str) -> Optional[int]:
+        position = bisect.bisect_left(self.tokens, token)
+        return position if position < len(self.tokens) and self.tokens[position] == token else None
+
+    def autocomplete(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Most popular products matching every complete word and the word being typed"""
+        limit = max(1, min(limit, MAX_SUGGESTIONS))
+        tokens = words(query)
+        # The word being typed may be a stopword prefix ("a" of "amul"), so it is kept
+        prefix = tokens.pop() if tokens and not query[-1:].isspace() else None
+        required = [self._token_number(token) for token in set(tokens) if token not in STOPWORDS]
+        if None in required:
+            return []
+
+        low, high = self._token_range(prefix) if prefix is not None else (0, 0)
+        if low == high:
+            if prefix is not None and prefix not in STOPWORDS:
+                return []
+            low = high = None
+
+        if not required and low is None:
+            numbers = np.arange(min(limit, len(self)))
+        elif not required:
+            heads = self._heads[low:high].ravel()
+            keep = min(len(heads), limit * MAX_PRODUCT_TOKENS)
+            smallest = np.unique(np.partition(heads, keep - 1)[:keep])
+            numbers = smallest[smallest < self._pad][:limit]
+        else:
+            required.sort(key=lambda token: len(self._postings[token]))
+            driver = self._postings[required[0]]
+            under_prefix = int(self._offsets[high] - self._offsets[low]) if low is not None else len(self) + 1
+            if under_prefix <= min(len(driver), PREFIX_DRIVER_MAX):
+                # A rare prefix narrows the search more than any complete word
+                driver = np.unique(self._flat_postings[self._offsets[low]:self._offsets[high]])
+                numbers = self._scan(driver, required, None, None, limit)
+            else:
+                numbers = self._scan(driver, required[1:], low, high, limit)
+        return [self.products[number] for number in numbers.tolist()]
+
+    def _scan(self, driver: np.ndarray, required: Sequence[int], low: Optional[int], high: Optional[int],
+              limit: int) -> np.ndarray:
+        """First `limit` products of `driver` (popularity order) that have every `required` token and, if `low`
+        is set, a token in [low, high). Checked in growing chunks, so common queries stop after a few rows."""
+        found, start, chunk = [], 0, 1024
+        while start < len(driver) and sum(map(len, found)) < limit:
+            block = driver[start:start + chunk]
+            matrix = self._token_matrix[block]
+            keep = np.ones(len(block), dtype=bool)
+            for token in required:
+                keep &= (matrix == token).any(axis=1)
+            if low is not None:
+                keep &= ((matrix >= low) & (matrix < high)).any(axis=1)
+            found.append(block[keep])
+            start, chunk = start + chunk, chunk * 4
+        return np.concatenate(found)[:limit] if found else driver[:0]
+
+    def resolve(self, name: str, brand: Optional[str] = None, size: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Best catalog product for a free-text compare request, or None if nothing is close enough
+
+        Products with a pack size only match a request for that size.
+        """
+        query = set(tokenize(name)) | set(tokenize(brand))
+        known = [number for number in map(self._token_number, query) if number is not None]
+        if not known:
+            return None
+        known.sort(key=lambda token: len(self._postings[token]))
+        candidates = self._scan(self._postings[known[0]], known[1:], None, None, RESOLVE_CANDIDATES)
+        wanted_size = parse_size(size) or parse_size(name)
+        best, best_score = None, MIN_RESOLVE_SCORE
+        for number in candidates.tolist():
+            product = self.products[number]
+            product_size = parse_size(product.get("size"))
+            if product_size and product_size != wanted_size:
+                continue
+            tokens = set(self._product_tokens(product))
+            score = len(query & tokens) / len(query | tokens)
+            if brand and normalize_text(brand) == normalize_text(product.get("brand")):
+                score += 0.25
+            if wanted_size and product_size == wanted_size:
+                score += 0.25
+            if score > best_score:
+                best, best_score = product, score
+        return best
+
+    def get(self, product_id: str) -> Optional[Dict[str, Any]]:
+        number = self._number.get(product_id)
+        return self.products[number] if number is not None else None
+
+
+def product_catalog_from_env() -> ProductCatalog:
+    if not CATALOG_PATH:
+        logger.info("CATALOG_PATH not set, grocery products are keyed on their names")
+        return ProductCatalog([])
+    # A configured but missing catalog is an error: falling back would silently change every product key
+    return ProductCatalog.load(CATALOG_PATH)
+
+
+product_catalog = product_catalog_from_env()
+
+
+def resolve_product_id(product_name: Optional[str], brand: Optional[str] = None,
+                       product_id: Optional[str] = None) -> Optional[str]:
+    """Catalog id for a request: the id it names (if known), else the best match for its name and brand"""
+    if product_id and product_catalog.get(product_id):
+        return product_id
+    product = product_catalog.resolve(product_name or "", brand)
+    return product["id"] if product else None
+
+
+def product_key(product_id: Optional[str], product_name: Optional[str]) -> str:
+    """Grouping key for a grocery product: its catalog id, or its normalized name if unresolved"""
+    return f"sku:{product_id}" if product_id else normalize_text(product_name)
+
+
+def document_product_key(document: Dict[str, Any]) -> str:
+    """Key of a stored comparison or alert, resolving ones stored before product_id existed"""
+    product_id = document.get("product_id")
+    if "product_id" not in document:
+        product_id = resolve_product_id(document.get("product_name"), document.get("brand"))
+    return product_key(product_id, document.get("product_name"))
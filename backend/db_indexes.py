@@ -0,0 +1,275 @@
+"""Index bootstrap and query-plan checks for the collections the API reads.
+
+The app builds indexes with an IndexBuilder started from its startup hook: the
+work runs in the background, so the API (and its liveness probe) serves while
+indexes are created, and an unreachable Mongo costs one failed ping per retry
+rather than a server-selection timeout per index. Running this module directly
+creates the indexes against MONGO_URL/DB_NAME, explains every endpoint query
+and exits non-zero if any winning plan is a COLLSCAN:
+
+    python db_indexes.py --check-plans
+"""
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+
+from alerts_engine import DELETION_RETENTION
+from analytics import BUCKET_RETENTION
+from price_history import ensure_price_points
+
+
+logger = logging.getLogger(__name__)
+
+# collection -> [(keys, options)]
+INDEX_SPECS: Dict[str, List[Tuple[List[Tuple[str, int]], Dict[str, Any]]]] = {
+    "ride_comparisons": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("user_id", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)], {}),
+        ([("timestamp", DESCENDING), ("id", DESCENDING)], {}),
+        ([("route_key", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)], {}),
+    ],
+    "grocery_comparisons": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("user_id", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)], {}),
+        ([("timestamp", DESCENDING), ("id", DESCENDING)], {}),
+        ([("product_id", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)], {"sparse": True}),
+    ],
+    "savings_records": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("user_id", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)], {}),
+    ],
+    "savings_rollups": [
+        ([("user_id", ASCENDING), ("period", ASCENDING)], {"unique": True}),
+    ],
+    "price_alerts": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("user_id", ASCENDING), ("is_active", ASCENDING), ("created_at", DESCENDING)], {}),
+        ([("is_active", ASCENDING), ("created_at", ASCENDING)], {}),
+        ([("route_key", ASCENDING), ("is_active", ASCENDING)], {"sparse": True}),
+        ([("is_active", ASCENDING), ("triggered_at", ASCENDING)], {}),
+    ],
+    # Tombstones read by every worker's alert sync (alerts_engine.py)
+    "price_alert_deletions": [
+        ([("deleted_at", ASCENDING)], {"expireAfterSeconds": int(DELETION_RETENTION.total_seconds())}),
+    ],
+    "analytics_buckets": [
+        ([("view", ASCENDING), ("hour", ASCENDING), ("key", ASCENDING)], {"unique": True}),
+        ([("view", ASCENDING), ("hour", ASCENDING), ("count", DESCENDING)], {}),
+        # Hourly buckets age out once no window needs them; all-time buckets have hour=None
+        ([("hour", ASCENDING)], {"expireAfterSeconds": int(BUCKET_RETENTION.total_seconds())}),
+    ],
+    "analytics_popular": [
+        ([("view", ASCENDING), ("window", ASCENDING)], {"unique": True}),
+    ],
+    # Time-series collection, created by ensure_price_points; rollups scan it by time range
+    "price_points": [
+        ([("ts", ASCENDING)], {}),
+    ],
+    # Unique key is also the $merge target of the rollup job
+    "price_rollups": [
+        ([("resolution", ASCENDING), ("type", ASCENDING), ("key", ASCENDING), ("provider", ASCENDING),
+          ("bucket", ASCENDING)], {"unique": True}),
+    ],
+    "user_preferences": [
+        ([("user_id", ASCENDING)], {"unique": True}),
+    ],
+    "ai_analyses": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("comparison_id", ASCENDING), ("timestamp", DESCENDING)], {}),
+        ([("cache_key", ASCENDING), ("timestamp", DESCENDING)], {}),
+    ],
+    "personalized_insights": [
+        ([("user_id", ASCENDING), ("comparison_type", ASCENDING), ("timestamp", DESCENDING)], {}),
+    ],
+    "smart_alerts": [
+        ([("user_id", ASCENDING)], {"unique": True}),
+    ],
+    "jobs": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("active_key", ASCENDING)], {"unique": True, "sparse": True}),
+        ([("status", ASCENDING), ("run_at", ASCENDING)], {}),
+        ([("status", ASCENDING), ("locked_until", ASCENDING)], {}),
+        ([("updated_at", ASCENDING)], {"expireAfterSeconds": 7 * 24 * 3600,
+                                       "partialFilterExpression": {"status": "done"}}),
+    ],
+    # Per-day scheduler markers only matter on their day
+    "job_schedule": [
+        ([("created_at", ASCENDING)], {"expireAfterSeconds": 7 * 24 * 3600}),
+    ],
+}
+
+_KEYSET_SORT = [("timestamp", DESCENDING), ("id", DESCENDING)]
+_AFTER_CURSOR = {"$or": [{"timestamp": {"$lt": datetime(2024, 1, 1)}},
+                         {"timestamp": datetime(2024, 1, 1), "id": {"$lt": "c"}}]}
+
+# (endpoint, collection, filter, sort) for every query the API issues
+ENDPOINT_QUERIES: List[Tuple[str, str, Dict[str, Any], List[Tuple[str, int]]]] = [
+    ("get_ride_history", "ride_comparisons", {"user_id": "u"}, _KEYSET_SORT),
+    ("get_ride_history (next page)", "ride_comparisons", {"user_id": "u", **_AFTER_CURSOR}, _KEYSET_SORT),
+    ("get_ride_history (all users)", "ride_comparisons", {}, _KEYSET_SORT),
+    ("get_ride_history (route)", "ride_comparisons", {"route_key": "place:a|place:b"}, _KEYSET_SORT),
+    ("get_grocery_history", "grocery_comparisons", {"user_id": "u"}, _KEYSET_SORT),
+    ("get_grocery_history (all users)", "grocery_comparisons", {}, _KEYSET_SORT),
+    ("get_grocery_history (product)", "grocery_comparisons", {"product_id": "p"}, _KEYSET_SORT),
+    ("get_user_savings", "savings_records", {"user_id": "u"}, _KEYSET_SORT),
+    ("get_user_savings (next page)", "savings_records", {"user_id": "u", **_AFTER_CURSOR}, _KEYSET_SORT),
+    ("get_savings_summary", "savings_rollups", {"user_id": "u", "period": "all"}, []),
+    ("get_popular_routes", "analytics_popular", {"view": "routes", "window": "all"}, []),
+    ("get_popular_products", "analytics_popular", {"view": "products", "window": "24h"}, []),
+    ("get_price_history", "price_rollups",
+     {"resolution": "day", "type": "ride", "key": "k", "bucket": {"$gte": datetime(2024, 1, 1)}},
+     [("provider", ASCENDING), ("bucket", ASCENDING)]),
+    ("get_price_history (provider)", "price_rollups",
+     {"resolution": "hour", "type": "ride", "key": "k", "provider": "uber", "bucket": {"$gte": datetime(2024, 1, 1)}},
+     [("provider", ASCENDING), ("bucket", ASCENDING)]),
+    ("get_user_alerts", "price_alerts", {"user_id": "u", "is_active": True}, [("created_at", DESCENDING)]),
+    ("get_user_alerts (all)", "price_alerts", {"user_id": "u"}, [("created_at", DESCENDING)]),
+    ("delete_price_alert", "price_alerts", {"id": "a"}, []),
+    ("alert sync (new)", "price_alerts", {"is_active": True, "created_at": {"$gte": datetime(2024, 1, 1)}}, []),
+    ("alert sync (triggered)", "price_alerts", {"is_active": False, "triggered_at": {"$gte": datetime(2024, 1, 1)}},
+     []),
+    ("alert sync (deleted)", "price_alert_deletions", {"deleted_at": {"$gte": datetime(2024, 1, 1)}}, []),
+    ("get_user_preferences", "user_preferences", {"user_id": "u"}, []),
+    ("analyze_ride_comparison", "ride_comparisons", {"id": "c"}, []),
+    ("analyze_grocery_comparison", "grocery_comparisons", {"id": "c"}, []),
+    ("analysis cache lookup", "ai_analyses", {"cache_key": "k", "timestamp": {"$gte": datetime(2024, 1, 1)}},
+     [("timestamp", DESCENDING)]),
+    ("stored personalized insights", "personalized_insights", {"user_id": "u", "comparison_type": "ride"},
+     [("timestamp", DESCENDING)]),
+    ("stored smart alerts", "smart_alerts", {"user_id": "u"}, []),
+    ("job claim (due)", "jobs", {"status": "queued", "run_at": {"$lte": datetime(2024, 1, 1)}},
+     [("run_at", ASCENDING)]),
+    ("job claim (lock expired)", "jobs", {"status": "running", "locked_until": {"$lt": datetime(2024, 1, 1)}}, []),
+]
+
+
+async def ensure_collections(db) -> bool:
+    """Create the collections that need options before their first insert.
+
+    Returns False when Mongo doesn't answer a ping or a collection couldn't be created.
+    """
+    try:
+        await db.command("ping")
+    except Exception as e:
+        logger.error(f"Skipping index creation, Mongo is unreachable: {str(e)}")
+        return False
+    return await ensure_price_points(db)
+
+
+async def create_indexes(db):
+    """Create every declared index; create_index is a no-op when it already exists"""
+    for collection, specs in INDEX_SPECS.items():
+        for keys, options in specs:
+            try:
+                await db[collection].create_index(keys, **options)
+            except Exception as e:
+                logger.error(f"Failed to create index {keys} on {collection}: {str(e)}")
+
+
+async def ensure_indexes(db) -> bool:
+    """ensure_collections, then create_indexes; returns False, without trying any index, if the first fails"""
+    if not await ensure_collections(db):
+        return False
+    await create_indexes(db)
+    return True
+
+
+class IndexBuilder:
+    """Runs ensure_indexes off the startup path, retrying until Mongo is reachable.
+
+    `collections_ready` turns on once ensure_collections has succeeded, before
+    the (possibly slow) index builds; writers to those collections wait for it.
+    """
+
+    def __init__(self, db, retry_seconds: float = float(os.environ.get('INDEX_BUILD_RETRY_SECONDS', '30'))):
+        self.db = db
+        self.retry_seconds = retry_seconds
+        self.collections_ready = False
+        self.built = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while not await ensure_collections(self.db):
+            await asyncio.sleep(self.retry_seconds)
+        self.collections_ready = True
+        await create_indexes(self.db)
+        self.built = True
+        logger.info("Indexes are in place")
+
+
+def plan_stages(plan: Dict[str, Any]) -> Iterator[str]:
+    """Yield every stage name in an explain() plan tree"""
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for child_key in ("inputStage", "queryPlan", "winningPlan"):
+        if child_key in plan:
+            yield from plan_stages(plan[child_key])
+    for child in plan.get("inputStages", []):
+        yield from plan_stages(child)
+
+
+async def find_collscans(db) -> List[str]:
+    """Explain each endpoint query and return the ones that fall back to a COLLSCAN"""
+    offenders = []
+    for endpoint, collection, query, sort in ENDPOINT_QUERIES:
+        cursor = db[collection].find(query).limit(20)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        stages = list(plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {})))
+        logger.info(f"{endpoint}: {' <- '.join(stages)}")
+        if "COLLSCAN" in stages:
+            offenders.append(f"{endpoint} ({collection} {query})")
+    return offenders
+
+
+def _connect():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    return client, client[os.environ['DB_NAME']]
+
+
+async def _main(check_plans: bool) -> int:
+    client, db = _connect()
+    try:
+        if not await ensure_indexes(db):
+            return 1
+        offenders = await find_collscans(db) if check_plans else []
+    finally:
+        client.close()
+
+    for offender in offenders:
+        logger.error(f"COLLSCAN: {offender}")
+    if check_plans and not offenders:
+        logger.info("All endpoint queries are index-backed")
+    return 1 if offenders else 0
+
+
+if __name__ == "__main__":
+    from pathlib import Path
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    sys.exit(asyncio.run(_main("--check-plans" in sys.argv)))
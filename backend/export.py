@@ -0,0 +1,85 @@
+import csv
+import io
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+
+EXPORT_BATCH_SIZE = 500
+
+# record_type -> (collection, CSV columns)
+EXPORT_SOURCES: Dict[str, Tuple[str, List[str]]] = {
+    "ride_comparison": ("ride_comparisons", [
+        "pickup_location", "drop_location", "distance_km", "estimated_duration_mins",
+        "best_price_provider", "best_time_provider", "providers"
+    ]),
+    "grocery_comparison": ("grocery_comparisons", [
+        "product_name", "brand", "category", "search_query",
+        "best_price_provider", "best_delivery_provider", "providers"
+    ]),
+    "savings": ("savings_records", [
+        "comparison_type", "comparison_id", "original_price", "chosen_price",
+        "savings_amount", "provider_chosen"
+    ]),
+}
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+
+def csv_columns(record_types: List[str]) -> List[str]:
+    """Shared header for the selected record types, in first-seen order"""
+    columns = ["record_type", "id", "user_id", "timestamp"]
+    for record_type in record_types:
+        for column in EXPORT_SOURCES[record_type][1]:
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+
+async def iter_records(db, user_id: str, record_types: List[str]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """Yield (record_type, document) oldest first, one cursor batch in memory at a time"""
+    for record_type in record_types:
+        collection = EXPORT_SOURCES[record_type][0]
+        cursor = db[collection].find({"user_id": user_id}, {"_id": 0}).sort(
+            [("timestamp", 1), ("id", 1)]
+        ).batch_size(EXPORT_BATCH_SIZE)
+        async for document in cursor:
+            yield record_type, document
+
+
+async def ndjson_stream(db, user_id: str, record_types: List[str]) -> AsyncIterator[bytes]:
+    async for record_type, document in iter_records(db, user_id, record_types):
+        yield (json.dumps({"record_type": record_type, **document}, default=_json_default) + "\n").encode()
+
+
+async def csv_stream(db, user_id: str, record_types: List[str]) -> AsyncIterator[bytes]:
+    columns = csv_columns(record_types)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+
+    def flush() -> bytes:
+        data = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    writer.writeheader()
+    yield flush()
+    async for record_type, document in iter_records(db, user_id, record_types):
+        row = {"record_type": record_type}
+        for column in columns[1:]:
+            value = document.get(column)
+            if isinstance(value, (list, dict)):
+                value = json.dumps(value, default=_json_default)
+            elif value is not None and not isinstance(value, (str, int, float)):
+                value = _json_default(value)
+            row[column] = value
+        writer.writerow(row)
+        yield flush()
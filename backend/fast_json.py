@@ -0,0 +1,94 @@
+"""Read-optimized JSON responses for the list endpoints.
+
+Read endpoints used to build a Pydantic model per document and then let FastAPI
+validate the result against `response_model` again before encoding it. For data
+we wrote ourselves that work is redundant. A ReadSerializer:
+
+- projects only the model's fields (and never `_id`) out of Mongo
+- fills defaults for fields added after a document was written, and runs the
+  models' `mode="before"` validators (where legacy documents are upgraded,
+  e.g. the quote ETA bounds), in nested models too
+- validates against the model only when FAST_JSON_VALIDATE=true (debug mode)
+
+and FastJSONResponse encodes the documents directly with orjson. Endpoints
+keep `response_model` so the OpenAPI schema is unchanged.
+"""
+import os
+from typing import Any, Dict, List, Optional, Tuple, Type, Union, get_args, get_origin
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+
+FAST_JSON_VALIDATE = os.environ.get('FAST_JSON_VALIDATE', 'false').lower() == 'true'
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _orjson_default(value: Any) -> Any:
+    # datetimes, enums, dicts and lists are native to orjson; anything else goes through FastAPI's encoder
+    return jsonable_encoder(value)
+
+
+def _nested_model(annotation: Any) -> Optional[Tuple[Type[BaseModel], bool]]:
+    """(model, is_list) for `Model`, `Optional[Model]` and `List[Model]` annotations"""
+    origin, args = get_origin(annotation), get_args(annotation)
+    if origin is list and args:
+        found = _nested_model(args[0])
+        return (found[0], True) if found and not found[1] else None
+    if origin is Union:
+        models = [arg for arg in args if arg is not type(None)]
+        return _nested_model(models[0]) if len(models) == 1 else None
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation, False
+    return None
+
+
+class ReadSerializer:
+    """Shapes stored documents like `model` without constructing model instances"""
+
+    def __init__(self, model: Type[BaseModel], validate: bool = FAST_JSON_VALIDATE):
+        self.model = model
+        self.validate = validate
+        self.projection = {"_id": 0, **{name: 1 for name in model.model_fields}}
+        # Only plain defaults: a missing id or timestamp must not be invented per read
+        self.defaults = {
+            name: field.default for name, field in model.model_fields.items()
+            if not field.is_required() and field.default_factory is None
+        }
+        self.upgrades = [decorator.func for decorator in model.__pydantic_decorators__.model_validators.values()
+                         if decorator.info.mode == "before"]
+        self.nested: Dict[str, Tuple[ReadSerializer, bool]] = {}
+        for name, field in model.model_fields.items():
+            found = _nested_model(field.annotation)
+            if found:
+                self.nested[name] = (ReadSerializer(found[0], validate=False), found[1])
+
+    def prepare(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        documents = [self.prepare_one(document) for document in documents]
+        if self.validate:
+            for document in documents:
+                self.model.model_validate(document)
+        return documents
+
+    def prepare_one(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        for upgrade in self.upgrades:
+            document = upgrade(document)
+        for name, default in self.defaults.items():
+            if name not in document:
+                # Copy mutable defaults so documents don't share them
+                document[name] = default.copy() if isinstance(default, (list, dict)) else default
+        for name, (serializer, many) in self.nested.items():
+            value = document.get(name)
+            if many and isinstance(value, list):
+                document[name] = [serializer.prepare_one(item) if isinstance(item, dict) else item for item in value]
+            elif not many and isinstance(value, dict):
+                document[name] = serializer.prepare_one(value)
+        return document
@@ -0,0 +1,120 @@
+"""Liveness and readiness for orchestrator probes.
+
+`/api/health/live` does no I/O: if the event loop answers, the process is alive.
+
+`/api/health/ready` never touches a dependency itself. HealthChecker runs every
+check in the background each HEALTH_CHECK_INTERVAL_SECONDS, each bounded by
+HEALTH_CHECK_TIMEOUT_SECONDS, and probes read the last results. However many
+pods poll however often, Mongo sees one `ping` per interval per process, and
+a slow Mongo makes the probe report "not ready" instead of hanging it.
+
+A process is ready once every required check has passed recently (within
+three intervals). Optional checks (the LLM gateway) are reported but don't
+take the pod out of rotation: only the AI endpoints depend on them.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# A check returns extra details to report; raising marks the dependency as down
+Check = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+class HealthChecker:
+    def __init__(self, interval: float = 5.0, timeout: float = 2.0):
+        self.interval = interval
+        self.timeout = timeout
+        self._checks: Dict[str, Tuple[Check, bool]] = {}
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, check: Check, required: bool = True):
+        self._checks[name] = (check, required)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await self.check_all()
+            await asyncio.sleep(self.interval)
+
+    async def check_all(self):
+        await asyncio.gather(*[self._check(name, check, required)
+                               for name, (check, required) in self._checks.items()])
+
+    async def _check(self, name: str, check: Check, required: bool):
+        started = time.perf_counter()
+        try:
+            details = await asyncio.wait_for(check(), self.timeout)
+            result = {"status": details.pop("status", "ok"), **details}
+        except asyncio.TimeoutError:
+            result = {"status": "down", "error": f"no answer within {self.timeout}s"}
+        except Exception as e:
+            result = {"status": "down", "error": str(e)}
+        if result["status"] == "down" and self._results.get(name, {}).get("status") != "down":
+            logger.warning(f"Health check {name} failed: {result.get('error')}")
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        result["required"] = required
+        result["checked_at"] = datetime.utcnow()
+        self._results[name] = result
+        self._checked_at[name] = time.monotonic()
+
+    def _fresh(self, name: str) -> bool:
+        checked_at = self._checked_at.get(name)
+        return checked_at is not None and time.monotonic() - checked_at <= 3 * self.interval
+
+    def report(self) -> Dict[str, Any]:
+        dependencies = {}
+        ready = True
+        for name, (_, required) in self._checks.items():
+            result = self._results.get(name)
+            if result is None:
+                result = {"status": "unknown", "required": required}
+            elif not self._fresh(name):
+                result = {**result, "status": "stale"}
+            dependencies[name] = result
+            if required and result["status"] != "ok":
+                ready = False
+        return {"status": "ready" if ready else "not_ready", "dependencies": dependencies,
+                "timestamp": datetime.utcnow()}
+
+    def stats(self) -> Dict[str, Any]:
+        report = self.report()
+        stats: Dict[str, Any] = {"ready": report["status"] == "ready"}
+        for name, result in report["dependencies"].items():
+            stats[f"{name}_up"] = result["status"] == "ok"
+            if "latency_ms" in result:
+                stats[f"{name}_latency_ms"] = result["latency_ms"]
+        return stats
+
+
+def mongo_ping_check(client) -> Check:
+    async def check() -> Dict[str, Any]:
+        await client.admin.command("ping")
+        return {}
+    return check
+
+
+def health_checker_from_env() -> HealthChecker:
+    return HealthChecker(
+        interval=float(os.environ.get('HEALTH_CHECK_INTERVAL_SECONDS', '5')),
+        timeout=float(os.environ.get('HEALTH_CHECK_TIMEOUT_SECONDS', '2'))
+    )
@@ -0,0 +1,273 @@
+"""Mongo-backed background job queue.
+
+Jobs live in the `jobs` collection:
+
+    {id, type, payload, status: queued|running|done|failed, attempts, max_attempts,
+     run_at, locked_until, worker_id, active_key, last_error, created_at, updated_at}
+
+Workers claim jobs atomically with find_one_and_update. A claimed job stays
+invisible to other workers until `locked_until` (the visibility timeout); if its
+worker dies the job becomes claimable again. Failures are retried with
+exponential backoff until max_attempts. `active_key` (unique, sparse) is set
+while a job is queued or running so the same refresh is never enqueued twice.
+"""
+import asyncio
+import logging
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from mongo_config import AGGREGATION_MAX_TIME_MS, QUERY_MAX_TIME_MS
+
+
+logger = logging.getLogger(__name__)
+
+# Queued jobs due for longer than this mean nothing is claiming them
+UNCLAIMED_AFTER = timedelta(minutes=10)
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class JobQueue:
+    def __init__(self, db, visibility_timeout: float = 300, max_attempts: int = 5,
+                 backoff_base: float = 30, backoff_max: float = 3600):
+        self.db = db
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    async def enqueue(self, job_type: str, payload: Dict[str, Any], dedup_key: Optional[str] = None,
+                      run_at: Optional[datetime] = None) -> bool:
+        """Queue a job; returns False if one with the same dedup_key is already pending"""
+        now = datetime.utcnow()
+        job = {
+            "id": str(uuid.uuid4()),
+            "type": job_type,
+            "payload": payload,
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": self.max_attempts,
+            "run_at": run_at or now,
+            "locked_until": None,
+            "created_at": now,
+            "updated_at": now
+        }
+        if dedup_key:
+            job["active_key"] = f"{job_type}:{dedup_key}"
+        try:
+            await self.db.jobs.insert_one(job)
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def claim(self, worker_id: str, job_types: List[str]) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest due job, including ones whose previous lock expired"""
+        now = datetime.utcnow()
+        return await self.db.jobs.find_one_and_update(
+            {
+                "type": {"$in": job_types},
+                "$or": [
+                    {"status": "queued", "run_at": {"$lte": now}},
+                    {"status": "running", "locked_until": {"$lt": now}}
+                ]
+            },
+            {
+                "$set": {
+                    "status": "running",
+                    "worker_id": worker_id,
+                    "locked_until": now + timedelta(seconds=self.visibility_timeout),
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("run_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def complete(self, job: Dict[str, Any]):
+        await self.db.jobs.update_one(
+            {"id": job["id"], "worker_id": job["worker_id"]},
+            {"$set": {"status": "done", "updated_at": datetime.utcnow()},
+             "$unset": {"active_key": "", "locked_until": ""}}
+        )
+
+    async def fail(self, job: Dict[str, Any], error: str):
+        now = datetime.utcnow()
+        update: Dict[str, Any]
+        if job["attempts"] < job.get("max_attempts", self.max_attempts):
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (job["attempts"] - 1))
+            delay *= random.uniform(0.8, 1.2)
+            update = {"$set": {"status": "queued", "run_at": now + timedelta(seconds=delay),
+                               "last_error": error, "updated_at": now},
+                      "$unset": {"locked_until": ""}}
+        else:
+            update = {"$set": {"status": "failed", "last_error": error, "updated_at": now},
+                      "$unset": {"active_key": "", "locked_until": ""}}
+        await self.db.jobs.update_one({"id": job["id"], "worker_id": job["worker_id"]}, update)
+
+    async def stats(self) -> Dict[str, int]:
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        async for group in self.db.jobs.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+                                                  maxTimeMS=AGGREGATION_MAX_TIME_MS):
+            counts[group["_id"]] = group["count"]
+        return counts
+
+    async def unclaimed(self, older_than: timedelta = UNCLAIMED_AFTER) -> int:
+        """Queued jobs that have been due for longer than `older_than`"""
+        return await self.db.jobs.count_documents(
+            {"status": "queued", "run_at": {"$lte": datetime.utcnow() - older_than}}, maxTimeMS=QUERY_MAX_TIME_MS
+        )
+
+
+async def warn_if_unclaimed(queue: JobQueue):
+    """Warn when queued jobs are going stale: no worker.py (or API job worker) is running"""
+    try:
+        unclaimed = await queue.unclaimed()
+    except Exception as e:
+        logger.error(f"Failed to check the job queue: {str(e)}")
+        return
+    if unclaimed:
+        logger.warning(f"{unclaimed} jobs have waited over {UNCLAIMED_AFTER} without a worker claiming them; "
+                       "personalized insights and smart alerts never refresh until worker.py runs")
+
+
+class JobWorkerPool:
+    """`concurrency` asyncio loops claiming and running jobs for the registered handlers"""
+
+    def __init__(self, queue: JobQueue, concurrency: int = 2, poll_interval: float = 2.0):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.handlers: Dict[str, JobHandler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self.processed = 0
+        self.failed = 0
+
+    def register(self, job_type: str, handler: JobHandler):
+        self.handlers[job_type] = handler
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self):
+        while True:
+            try:
+                job = await self.queue.claim(self.worker_id, list(self.handlers))
+            except Exception as e:
+                logger.error(f"Job claim failed: {str(e)}")
+                job = None
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            await self._execute(job)
+
+    async def _execute(self, job: Dict[str, Any]):
+        try:
+            # Never outlive the lock, or another worker may pick the job up concurrently
+            await asyncio.wait_for(self.handlers[job["type"]](job["payload"]), self.queue.visibility_timeout)
+            await self.queue.complete(job)
+            self.processed += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"Job {job['type']} {job['id']} attempt {job['attempts']} failed: {str(e)}")
+            await self.queue.fail(job, str(e) or type(e).__name__)
+
+
+def in_offpeak_window(now: datetime, window: str) -> bool:
+    """`window` is "start-end" in UTC hours, e.g. "1-5"; it may wrap midnight ("22-4")"""
+    start, end = (int(hour) for hour in window.split("-"))
+    if start <= end:
+        return start <= now.hour < end
+    return now.hour >= start or now.hour < end
+
+
+class OffPeakScheduler:
+    """Once per day, during the off-peak window, enqueue precompute jobs for active users"""
+
+    def __init__(self, db, queue: JobQueue, enqueue_for_user: Callable[[str], Awaitable[int]],
+                 window: str = "1-5", active_days: int = 7, check_interval: float = 600):
+        self.db = db
+        self.queue = queue
+        self.enqueue_for_user = enqueue_for_user
+        self.window = window
+        self.active_days = active_days
+        self.check_interval = check_interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                if in_offpeak_window(datetime.utcnow(), self.window):
+                    await self.schedule_once_today()
+            except Exception as e:
+                logger.error(f"Off-peak scheduling failed: {str(e)}")
+            await asyncio.sleep(self.check_interval)
+
+    async def active_users(self) -> List[str]:
+        since = datetime.utcnow() - timedelta(days=self.active_days)
+        users = set()
+        for collection in ("ride_comparisons", "grocery_comparisons"):
+            users.update(await self.db[collection].distinct("user_id", {"timestamp": {"$gte": since}}))
+        users.discard(None)
+        return sorted(users)
+
+    async def schedule_once_today(self) -> int:
+        # Several API processes may run a scheduler; the marker document lets one of them win per day
+        today = datetime.utcnow().strftime("%Y-%m-%d")
+        try:
+            await self.db.job_schedule.insert_one({"_id": f"offpeak:{today}", "created_at": datetime.utcnow()})
+        except DuplicateKeyError:
+            return 0
+        enqueued = 0
+        for user_id in await self.active_users():
+            enqueued += await self.enqueue_for_user(user_id)
+        logger.info(f"Enqueued {enqueued} off-peak precompute jobs")
+        return enqueued
+
+
+def job_queue_from_env(db) -> JobQueue:
+    return JobQueue(
+        db,
+        visibility_timeout=float(os.environ.get('JOB_VISIBILITY_TIMEOUT_SECONDS', '300')),
+        max_attempts=int(os.environ.get('JOB_MAX_ATTEMPTS', '5')),
+        backoff_base=float(os.environ.get('JOB_BACKOFF_BASE_SECONDS', '30')),
+        backoff_max=float(os.environ.get('JOB_BACKOFF_MAX_SECONDS', '3600'))
+    )
+
+
+def job_workers_from_env(queue: JobQueue) -> JobWorkerPool:
+    # API processes leave jobs to worker.py (see its docstring) unless JOB_WORKER_CONCURRENCY is set
+    return JobWorkerPool(
+        queue,
+        concurrency=int(os.environ.get('JOB_WORKER_CONCURRENCY', '0')),
+        poll_interval=float(os.environ.get('JOB_POLL_SECONDS', '2'))
+    )
@@ -0,0 +1,291 @@
+"""Shared gateway for every LLM call the AI endpoints make.
+
+- a global semaphore caps concurrent upstream calls (LLM_MAX_CONCURRENCY)
+- requests waiting for a slot beyond LLM_MAX_QUEUE_DEPTH are shed
+- each user gets a token bucket (LLM_USER_RATE_PER_MINUTE, LLM_USER_BURST), kept in
+  the shared state backend so the limit holds across worker processes
+- identical in-flight requests (same session_id and prompt) share one call
+- `stream()` forwards chunks as they arrive; closing the stream cancels upstream
+- every upstream call records its duration and estimated token counts (metrics.py)
+
+Set LLM_CLIENT=fake to run against FakeLlmClient, which answers after
+FAKE_LLM_LATENCY_MS without network access.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from metrics import metrics
+from prompts import estimate_tokens
+from shared_state import MemoryState, SharedState
+
+
+logger = logging.getLogger(__name__)
+
+
+class LlmGatewayError(Exception):
+    """Raised instead of calling upstream when the gateway refuses a request"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LlmOverloaded(LlmGatewayError):
+    pass
+
+
+class LlmRateLimited(LlmGatewayError):
+    pass
+
+
+class LlmClient:
+    """Minimal interface the gateway needs from an LLM backend"""
+
+    async def complete(self, session_id: str, system_message: str, prompt: str) -> str:
+        raise NotImplementedError
+
+    async def stream(self, session_id: str, system_message: str, prompt: str) -> AsyncIterator[str]:
+        """Yield the completion in chunks; clients without streaming send it as one chunk"""
+        yield await self.complete(session_id, system_message, prompt)
+
+
+class EmergentLlmClient(LlmClient):
+    def __init__(self, api_key: Optional[str], provider: str = "openai", model: str = "gpt-4o-mini"):
+        self.api_key = api_key
+        self.provider = provider
+        self.model = model
+
+    async def complete(self, session_id: str, system_message: str, prompt: str) -> str:
+        from emergentintegrations.llm.chat import LlmChat, UserMessage
+
+        chat = LlmChat(
+            api_key=self.api_key,
+            session_id=session_id,
+            system_message=system_message
+        ).with_model(self.provider, self.model)
+        return await chat.send_message(UserMessage(text=prompt))
+
+
+class FakeLlmClient(LlmClient):
+    """Offline client with injected latency, for tests and load experiments"""
+
+    def __init__(self, latency_ms: float = 0.0, response: str = '{"recommendation": "fake"}',
+                 chunk_latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.response = response
+        self.chunk_latency_ms = chunk_latency_ms
+        self.calls = 0
+        self.cancelled = 0
+
+    async def complete(self, session_id: str, system_message: str, prompt: str) -> str:
+        self.calls += 1
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return self.response
+
+    async def stream(self, session_id: str, system_message: str, prompt: str) -> AsyncIterator[str]:
+        """Time-to-first-token of latency_ms, then one word every chunk_latency_ms"""
+        self.calls += 1
+        try:
+            if self.latency_ms:
+                await asyncio.sleep(self.latency_ms / 1000)
+            words = self.response.split(" ")
+            for position, word in enumerate(words):
+                yield word if position == len(words) - 1 else word + " "
+                if self.chunk_latency_ms:
+                    await asyncio.sleep(self.chunk_latency_ms / 1000)
+        except (asyncio.CancelledError, GeneratorExit):
+            self.cancelled += 1
+            raise
+
+
+class LlmGateway:
+    def __init__(self, client: LlmClient, max_concurrency: int = 8, max_queue_depth: int = 32,
+                 user_rate_per_minute: float = 10, user_burst: float = 5, state: Optional[SharedState] = None):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.user_rate = user_rate_per_minute / 60
+        self.user_burst = user_burst
+        self.state = state or MemoryState()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+        self.active = 0
+        self.queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.shed = 0
+        self.rate_limited = 0
+        self.deduplicated = 0
+        self.cancelled = 0
+        # Recent upstream behaviour, for the readiness report (no probe calls to the paid API)
+        self.latency_ms: Optional[float] = None
+        self.consecutive_failures = 0
+
+    async def complete(self, session_id: str, system_message: str, prompt: str,
+                       user_id: Optional[str] = None) -> str:
+        dedup_key = (session_id, hashlib.sha256(prompt.encode()).hexdigest())
+        task = self._inflight.get(dedup_key)
+        if task is not None:
+            self.deduplicated += 1
+            return await asyncio.shield(task)
+
+        await self._admit(user_id)
+        task = self._inflight.get(dedup_key)
+        if task is not None:
+            # An identical request started while this one waited on the rate limiter
+            self.deduplicated += 1
+            return await asyncio.shield(task)
+        # Count the request as queued now so a burst in one event-loop tick is shed correctly
+        self.queued += 1
+        task = asyncio.ensure_future(self._call(session_id, system_message, prompt))
+        self._inflight[dedup_key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(dedup_key, None))
+        return await asyncio.shield(task)
+
+    async def _admit(self, user_id: Optional[str]):
+        """Raise instead of queueing when the user or the gateway is over its limit"""
+        if user_id:
+            try:
+                allowed, retry_after = await self.state.take_token(f"llm-rate:{user_id}", self.user_rate,
+                                                                   self.user_burst)
+            except Exception as e:
+                # Fail open: an unreachable state backend shouldn't take the AI endpoints down
+                logger.warning(f"Rate limit state unavailable: {str(e)}")
+                allowed, retry_after = True, 0.0
+            if not allowed:
+                self.rate_limited += 1
+                raise LlmRateLimited(f"AI rate limit exceeded for user {user_id}", retry_after)
+        if self.active + self.queued >= self.max_concurrency + self.max_queue_depth:
+            self.shed += 1
+            raise LlmOverloaded("AI service is busy, try again shortly", 1.0)
+
+    async def stream(self, session_id: str, system_message: str, prompt: str,
+                     user_id: Optional[str] = None) -> AsyncIterator[str]:
+        """Admit the request now (so refusals can still be a 429) and return the chunk stream"""
+        await self._admit(user_id)
+        return self._stream(session_id, system_message, prompt)
+
+    async def _stream(self, session_id: str, system_message: str, prompt: str) -> AsyncIterator[str]:
+        started = time.perf_counter()
+        outcome, received = "error", []
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        self.active += 1
+        upstream = self.client.stream(session_id, system_message, prompt)
+        try:
+            async for chunk in upstream:
+                received.append(chunk)
+                yield chunk
+            self.completed += 1
+            outcome = "ok"
+            self._record_upstream(started, True)
+        except (asyncio.CancelledError, GeneratorExit):
+            self.cancelled += 1
+            outcome = "cancelled"
+            raise
+        except Exception:
+            self.failed += 1
+            self._record_upstream(started, False)
+            raise
+        finally:
+            # Closing the upstream generator cancels the in-flight provider request
+            await upstream.aclose()
+            self.active -= 1
+            self._semaphore.release()
+            _record_call("stream", outcome, started, system_message + prompt, "".join(received))
+
+    async def _call(self, session_id: str, system_message: str, prompt: str) -> str:
+        started = time.perf_counter()
+        outcome, response = "error", ""
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        self.active += 1
+        try:
+            response = await self.client.complete(session_id, system_message, prompt)
+            self.completed += 1
+            outcome = "ok"
+            self._record_upstream(started, True)
+            return response
+        except Exception:
+            self.failed += 1
+            self._record_upstream(started, False)
+            raise
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+            _record_call("complete", outcome, started, system_message + prompt, response)
+
+    def _record_upstream(self, started: float, ok: bool):
+        if not ok:
+            self.consecutive_failures += 1
+            return
+        self.consecutive_failures = 0
+        latency_ms = (time.perf_counter() - started) * 1000
+        # Exponentially weighted, so one slow call doesn't dominate the health report
+        self.latency_ms = latency_ms if self.latency_ms is None else 0.8 * self.latency_ms + 0.2 * latency_ms
+
+    async def health(self) -> Dict[str, Any]:
+        """Readiness details from recent calls: down after repeated failures, saturated when shedding"""
+        if self.consecutive_failures >= 3:
+            status = "down"
+        elif self.active + self.queued >= self.max_concurrency + self.max_queue_depth:
+            status = "saturated"
+        else:
+            status = "ok"
+        return {
+            "status": status,
+            # Includes time queued in the gateway, as callers see it
+            "call_latency_ms": round(self.latency_ms, 2) if self.latency_ms is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+            "active": self.active,
+            "queue_depth": self.queued
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "queue_depth": self.queued,
+            "max_queue_depth": self.max_queue_depth,
+            "completed": self.completed,
+            "failed": self.failed,
+            "shed": self.shed,
+            "rate_limited": self.rate_limited,
+            "deduplicated": self.deduplicated,
+            "cancelled_streams": self.cancelled
+        }
+
+
+def _record_call(mode: str, outcome: str, started: float, prompt: str, completion: str):
+    metrics.observe("llm_call_duration_seconds", time.perf_counter() - started, mode=mode, outcome=outcome)
+    metrics.inc("llm_prompt_tokens_total", estimate_tokens(prompt), mode=mode)
+    metrics.inc("llm_completion_tokens_total", estimate_tokens(completion), mode=mode)
+
+
+def llm_gateway_from_env(state: Optional[SharedState] = None) -> LlmGateway:
+    if os.environ.get('LLM_CLIENT', 'emergent') == 'fake':
+        client: LlmClient = FakeLlmClient(
+            float(os.environ.get('FAKE_LLM_LATENCY_MS', '500')),
+            chunk_latency_ms=float(os.environ.get('FAKE_LLM_CHUNK_LATENCY_MS', '20'))
+        )
+    else:
+        client = EmergentLlmClient(os.environ.get('EMERGENT_LLM_KEY'))
+    return LlmGateway(
+        client,
+        max_concurrency=int(os.environ.get('LLM_MAX_CONCURRENCY', '8')),
+        max_queue_depth=int(os.environ.get('LLM_MAX_QUEUE_DEPTH', '32')),
+        user_rate_per_minute=float(os.environ.get('LLM_USER_RATE_PER_MINUTE', '10')),
+        user_burst=float(os.environ.get('LLM_USER_BURST', '5')),
+        state=state
+    )
@@ -0,0 +1,407 @@
+"""Request instrumentation, Prometheus text export and an opt-in request profiler.
+
+InstrumentationMiddleware (plain ASGI, so streaming responses pass through
+untouched) records for every request:
+
+- comparify_http_request_duration_seconds{method, route, status}: latency
+  histogram keyed on the route template ("/api/rides/history"), not the raw path
+- comparify_http_request_mongo_seconds{route} and ..._mongo_commands{route}: time
+  spent in and number of Mongo commands issued while serving the request
+
+MongoCommandListener (pass it to the Motor client via `event_listeners`) also
+keeps comparify_mongo_command_duration_seconds{command, collection}. Motor
+runs commands on executor threads with the caller's context copied, so the
+listener attributes each command to the request that issued it.
+MongoPoolListener records comparify_mongo_pool_checkout_wait_seconds and
+exports open/checked-out connection counts and pool utilization as gauges.
+
+LLM calls record comparify_llm_call_duration_seconds{mode, outcome} and token
+counters (see llm_gateway.py). Components with a `stats()` method are exported
+as gauges via `registry.register_stats`. GET /api/metrics serves `render()`.
+
+Profiling is off unless PROFILING_ENABLED=true. Then a request is profiled when
+it carries `X-Profile: <PROFILING_TOKEN>` (any value when no token is set) or is
+sampled at PROFILE_SAMPLE_RATE; sampled profiles are only kept for requests
+slower than PROFILE_SLOW_MS. Output goes to PROFILE_DIR: pyinstrument HTML when
+it is installed, cProfile .prof otherwise (cProfile sees every coroutine running
+on the loop meanwhile, so profile under low concurrency). The file name comes
+back in the `X-Profile-Path` response header.
+"""
+import bisect
+import contextvars
+import logging
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+try:
+    import pyinstrument
+except ImportError:  # optional dependency
+    pyinstrument = None
+
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN', '')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', '500'))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp/comparify-profiles')
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_LOG_MS', '1000'))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Histograms and counters keyed by (name, labels), rendered in Prometheus text format"""
+
+    def __init__(self, prefix: str = "comparify"):
+        self.prefix = prefix
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._help: Dict[str, str] = {}
+        self._stats: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        # Mongo listener callbacks arrive on executor threads
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = LATENCY_BUCKETS, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._histograms.setdefault(name, {})
+            histogram = family.get(key)
+            if histogram is None:
+                histogram = family[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._counters.setdefault(name, {})
+            family[key] = family.get(key, 0) + amount
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def register_stats(self, component: str, stats: Callable[[], Dict[str, Any]]):
+        """Export a component's numeric stats() values as comparify_<component>_<key> gauges"""
+        self._stats[component] = stats
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, family in sorted(self._histograms.items()):
+                full = self._header(lines, name, "histogram")
+                for labels, histogram in sorted(family.items()):
+                    cumulative = 0
+                    for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                        cumulative += count
+                        le = bound if bound == "+Inf" else _number(bound)
+                        lines.append(f"{full}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{full}_sum{_labels(labels)} {_number(histogram.sum)}")
+                    lines.append(f"{full}_count{_labels(labels)} {histogram.count}")
+            for name, family in sorted(self._counters.items()):
+                full = self._header(lines, name, "counter")
+                for labels, value in sorted(family.items()):
+                    lines.append(f"{full}{_labels(labels)} {_number(value)}")
+        for component, stats in sorted(self._stats.items()):
+            try:
+                values = stats()
+            except Exception as e:
+                logger.error(f"Metrics stats for {component} failed: {str(e)}")
+                continue
+            for key, value in sorted(values.items()):
+                if isinstance(value, (bool, int, float)):
+                    full = self._header(lines, f"{component}_{key}", "gauge")
+                    lines.append(f"{full} {_number(float(value))}")
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines: List[str], name: str, kind: str) -> str:
+        full = f"{self.prefix}_{_METRIC_NAME.sub('_', name)}"
+        if name in self._help:
+            lines.append(f"# HELP {full} {self._help[name]}")
+        lines.append(f"# TYPE {full} {kind}")
+        return full
+
+
+_METRIC_NAME = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+@dataclass
+class RequestTimings:
+    """Per-request Mongo totals, filled in by MongoCommandListener"""
+    mongo_seconds: float = 0.0
+    mongo_commands: int = 0
+
+
+current_request: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar(
+    "current_request", default=None
+)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        self._collections: Dict[Tuple[int, int], Tuple[str, RequestTimings]] = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = ""
+        self._collections[(event.request_id, event.operation_id)] = (collection, current_request.get())
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+    def _finish(self, event, outcome: str):
+        collection, timings = self._collections.pop((event.request_id, event.operation_id), ("", None))
+        seconds = event.duration_micros / 1e6
+        self.registry.observe("mongo_command_duration_seconds", seconds, MONGO_BUCKETS,
+                              command=event.command_name, collection=collection, outcome=outcome)
+        if timings is not None:
+            timings.mongo_seconds += seconds
+            timings.mongo_commands += 1
+
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """Connection pool occupancy per server and time spent waiting to check a connection out"""
+
+    def __init__(self, registry: MetricsRegistry, max_pool_size: int):
+        self.registry = registry
+        self.max_pool_size = max_pool_size
+        self.open: Dict[Any, int] = {}
+        self.checked_out: Dict[Any, int] = {}
+        self.checkout_failures = 0
+        self.pool_clears = 0
+        self.checkouts = 0
+        self.checkout_wait_seconds = 0.0
+        self._lock = threading.Lock()
+        # A checkout's started and finished events come from the same thread
+        self._waits = threading.local()
+
+    def _add(self, counts: Dict[Any, int], address, amount: int):
+        with self._lock:
+            counts[address] = counts.get(address, 0) + amount
+
+    def connection_check_out_started(self, event):
+        self._waits.started = time.perf_counter()
+
+    def _observe_wait(self, outcome: str):
+        started = getattr(self._waits, "started", None)
+        if started is not None:
+            self._waits.started = None
+            waited = time.perf_counter() - started
+            self.registry.observe("mongo_pool_checkout_wait_seconds", waited, MONGO_BUCKETS, outcome=outcome)
+            with self._lock:
+                self.checkouts += 1
+                self.checkout_wait_seconds += waited
+
+    def connection_checked_out(self, event):
+        self._observe_wait("ok")
+        self._add(self.checked_out, event.address, 1)
+
+    def connection_check_out_failed(self, event):
+        self._observe_wait(str(event.reason))
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        self._add(self.checked_out, event.address, -1)
+
+    def connection_created(self, event):
+        self._add(self.open, event.address, 1)
+
+    def connection_closed(self, event):
+        self._add(self.open, event.address, -1)
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self.open.pop(event.address, None)
+            self.checked_out.pop(event.address, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            busiest = max(self.checked_out.values(), default=0)
+            return {
+                "servers": len(self.open),
+                "max_pool_size": self.max_pool_size,
+                "open": sum(self.open.values()),
+                "checked_out": sum(self.checked_out.values()),
+                # Of the busiest server's pool; at 1.0 further checkouts queue
+                "utilization": round(busiest / self.max_pool_size, 4) if self.max_pool_size else 0.0,
+                "checkout_failures": self.checkout_failures,
+                "checkout_wait_avg_ms": round(self.checkout_wait_seconds / self.checkouts * 1000, 3)
+                if self.checkouts else 0.0,
+                "pool_clears": self.pool_clears
+            }
+
+
+class RequestProfiler:
+    """One profile at a time: a second profiled request while one is running is served unprofiled"""
+
+    def __init__(self, enabled: bool = PROFILING_ENABLED, token: str = PROFILING_TOKEN,
+                 sample_rate: float = PROFILE_SAMPLE_RATE, slow_ms: float = PROFILE_SLOW_MS,
+                 directory: str = PROFILE_DIR):
+        self.enabled = enabled
+        self.token = token
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.directory = Path(directory)
+        self.active = False
+        self.written = 0
+
+    def wanted(self, header: Optional[str]) -> Optional[bool]:
+        """None: don't profile; True: requested via header (always kept); False: sampled (kept if slow)"""
+        if not self.enabled or self.active:
+            return None
+        if header is not None and (not self.token or header == self.token):
+            return True
+        if self.sample_rate and random.random() < self.sample_rate:
+            return False
+        return None
+
+    def start(self, path: str) -> Tuple[Any, str]:
+        """Start profiling; returns the profiler and the file name its output will get"""
+        self.active = True
+        if pyinstrument is not None:
+            profiler = pyinstrument.Profiler(async_mode="enabled")
+            profiler.start()
+            extension = "html"
+        else:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+            extension = "prof"
+        return profiler, f"{int(time.time() * 1000)}-{_METRIC_NAME.sub('_', path.strip('/'))}.{extension}"
+
+    def finish(self, profiler, name: str, elapsed_ms: float, requested: bool) -> bool:
+        """Stop profiling and write the output if it was requested or the request was slow"""
+        self.active = False
+        if pyinstrument is not None:
+            profiler.stop()
+        else:
+            profiler.disable()
+        if not requested and elapsed_ms < self.slow_ms:
+            return False
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if pyinstrument is not None:
+            (self.directory / name).write_text(profiler.output_html(), encoding="utf-8")
+        else:
+            profiler.dump_stats(str(self.directory / name))
+        self.written += 1
+        return True
+
+
+class InstrumentationMiddleware:
+    def __init__(self, app, registry: MetricsRegistry, profiler: Optional[RequestProfiler] = None):
+        self.app = app
+        self.registry = registry
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = current_request.set(timings)
+        status = 500
+        profile_requested = None
+        if self.profiler is not None:
+            header = dict(scope.get("headers") or []).get(b"x-profile")
+            profile_requested = self.profiler.wanted(header.decode("latin-1") if header is not None else None)
+        profiler = profile_name = None
+        if profile_requested is not None:
+            profiler, profile_name = self.profiler.start(scope["path"])
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profile_requested:
+                    # Written once the request finishes (for streams, after the last chunk)
+                    message["headers"] = [*message.get("headers", []), (b"x-profile-path", profile_name.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            self.registry.observe("http_request_duration_seconds", elapsed, method=scope["method"], route=route,
+                                  status=str(status))
+            self.registry.observe("http_request_mongo_seconds", timings.mongo_seconds, MONGO_BUCKETS, route=route)
+            self.registry.observe("http_request_mongo_commands", timings.mongo_commands, COUNT_BUCKETS, route=route)
+            if profiler is not None:
+                try:
+                    if self.profiler.finish(profiler, profile_name, elapsed * 1000, profile_requested):
+                        logger.info(f"Profile of {scope['method']} {route} ({elapsed * 1000:.0f}ms) written to "
+                                    f"{self.profiler.directory / profile_name}")
+                except Exception as e:
+                    logger.error(f"Writing request profile failed: {str(e)}")
+            if elapsed * 1000 >= SLOW_REQUEST_MS:
+                logger.warning(f"Slow request {scope['method']} {route}: {elapsed * 1000:.0f}ms "
+                               f"({timings.mongo_seconds * 1000:.0f}ms in {timings.mongo_commands} Mongo commands)")
+
+
+metrics = MetricsRegistry()
+metrics.describe("http_request_duration_seconds", "Request latency by route template")
+metrics.describe("http_request_mongo_seconds", "Time spent in Mongo commands per request")
+metrics.describe("http_request_mongo_commands", "Mongo commands issued per request")
+metrics.describe("mongo_command_duration_seconds", "Mongo command latency")
+metrics.describe("mongo_pool_checkout_wait_seconds", "Time spent waiting for a pooled Mongo connection")
+metrics.describe("llm_call_duration_seconds", "LLM call latency, including queueing in the gateway")
+metrics.describe("llm_prompt_tokens_total", "Estimated prompt tokens sent to the LLM")
+metrics.describe("llm_completion_tokens_total", "Estimated completion tokens received from the LLM")
@@ -0,0 +1,61 @@
+"""Mongo client settings: connection pool, timeouts and read preferences.
+
+`mongo_client_options()` builds the AsyncIOMotorClient keyword arguments from
+the environment (they override the same options given in MONGO_URL):
+
+    MONGO_MAX_POOL_SIZE                maxPoolSize per server (default 100)
+    MONGO_MIN_POOL_SIZE                minPoolSize, connections kept warm (default 0)
+    MONGO_MAX_IDLE_TIME_MS             close pooled connections idle this long (default: never)
+    MONGO_WAIT_QUEUE_TIMEOUT_MS        give up waiting for a pooled connection (default 1000)
+    MONGO_SERVER_SELECTION_TIMEOUT_MS  give up finding a usable server (default 5000)
+    MONGO_CONNECT_TIMEOUT_MS           TCP connect / handshake timeout (default 5000)
+    MONGO_SOCKET_TIMEOUT_MS            per-socket read timeout (default: none; maxTimeMS bounds queries)
+
+The driver defaults (30s server selection, no wait-queue timeout) let a slow
+or missing primary hold every request open; with these a request fails fast
+and the API answers 503 instead.
+
+History and analytics endpoints read through `secondary_database`, which uses
+MONGO_SECONDARY_READ_PREFERENCE (default secondaryPreferred; primary turns it
+off) and, if set, MONGO_MAX_STALENESS_SECONDS (90 or more). Those reads can lag
+the primary by the replication delay. Request-path queries carry maxTimeMS
+QUERY_MAX_TIME_MS and aggregations AGGREGATION_MAX_TIME_MS.
+"""
+import os
+from typing import Any, Dict
+
+from pymongo.read_preferences import make_read_preference, read_pref_mode_from_name
+
+
+QUERY_MAX_TIME_MS = int(os.environ.get('MONGO_QUERY_MAX_TIME_MS', '2000'))
+AGGREGATION_MAX_TIME_MS = int(os.environ.get('MONGO_AGGREGATION_MAX_TIME_MS', '10000'))
+
+_POOL_OPTIONS = (
+    ("maxPoolSize", 'MONGO_MAX_POOL_SIZE', '100'),
+    ("minPoolSize", 'MONGO_MIN_POOL_SIZE', '0'),
+    ("maxIdleTimeMS", 'MONGO_MAX_IDLE_TIME_MS', None),
+    ("waitQueueTimeoutMS", 'MONGO_WAIT_QUEUE_TIMEOUT_MS', '1000'),
+    ("serverSelectionTimeoutMS", 'MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'),
+    ("connectTimeoutMS", 'MONGO_CONNECT_TIMEOUT_MS', '5000'),
+    ("socketTimeoutMS", 'MONGO_SOCKET_TIMEOUT_MS', None),
+)
+
+
+def mongo_client_options() -> Dict[str, Any]:
+    options: Dict[str, Any] = {"appname": os.environ.get('MONGO_APP_NAME', 'comparify-api')}
+    for option, variable, default in _POOL_OPTIONS:
+        value = os.environ.get(variable, default)
+        if value:
+            options[option] = int(value)
+    return options
+
+
+def secondary_read_preference():
+    """Read preference for history/analytics reads that tolerate replication lag"""
+    mode = read_pref_mode_from_name(os.environ.get('MONGO_SECONDARY_READ_PREFERENCE', 'secondaryPreferred'))
+    max_staleness = int(os.environ.get('MONGO_MAX_STALENESS_SECONDS', '-1'))
+    return make_read_preference(mode, None, max_staleness)
+
+
+def secondary_database(client, name: str):
+    return client.get_database(name, read_preference=secondary_read_preference())
@@ -0,0 +1,63 @@
+import base64
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', '100'))
+
+# Newest first, id breaks ties between documents written in the same millisecond
+KEYSET_SORT = [("timestamp", -1), ("id", -1)]
+
+
+def clamp_page_size(limit: int) -> int:
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def encode_cursor(document: Dict[str, Any]) -> str:
+    """Opaque cursor pointing just past `document` in KEYSET_SORT order"""
+    payload = json.dumps({"t": document["timestamp"].isoformat(), "i": document["id"]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of encode_cursor; raises ValueError for anything we didn't issue"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["t"]), str(payload["i"])
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+
+
+def keyset_query(query: Dict[str, Any], cursor: Optional[str]) -> Dict[str, Any]:
+    """Restrict `query` to documents strictly after `cursor` so every page is an index seek"""
+    if not cursor:
+        return query
+    timestamp, last_id = decode_cursor(cursor)
+    return {
+        **query,
+        "$or": [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "id": {"$lt": last_id}}
+        ]
+    }
+
+
+async def fetch_page(collection, query: Dict[str, Any], cursor: Optional[str], limit: int,
+                     projection: Optional[Dict[str, Any]] = None,
+                     max_time_ms: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Return one page of documents and the cursor for the next page (None on the last page)
+
+    A projection must keep `timestamp` and `id`, which the cursor is built from.
+    """
+    limit = clamp_page_size(limit)
+    find = collection.find(keyset_query(query, cursor), projection).sort(KEYSET_SORT).limit(limit + 1)
+    if max_time_ms:
+        find = find.max_time_ms(max_time_ms)
+    documents = await find.to_list(limit + 1)
+    if len(documents) <= limit:
+        return documents, None
+    documents = documents[:limit]
+    return documents, encode_cursor(documents[-1])
@@ -0,0 +1,97 @@
+"""User preferences with an in-process read-through / write-through cache.
+
+Compare ranking, the preferences endpoints and personalization all read
+preferences through PreferencesStore.get, which serves from an LRU with a TTL
+(PREFERENCES_CACHE_TTL_SECONDS) and falls back to one `find_one`. Users without
+preferences are cached too, so anonymous-ish traffic doesn't hit Mongo either.
+
+`upsert` is one `find_one_and_update(upsert=True, return_document=AFTER)` round
+trip; the returned document replaces the cached entry. Other API processes
+keep their copy until it expires, so the TTL bounds cross-process staleness.
+Returned documents are shared with the cache and must not be mutated.
+"""
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+
+class PreferencesStore:
+    def __init__(self, db, ttl_seconds: float = 60, max_entries: int = 50000):
+        self.db = db
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Optional[Dict[str, Any]]]]" = OrderedDict()
+        # Bumped on every write; a read that raced a write doesn't overwrite the newer cached document
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.upserts = 0
+
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            del self._entries[user_id]
+
+        self.misses += 1
+        writes = self._writes
+        document = await self.db.user_preferences.find_one({"user_id": user_id}, {"_id": 0})
+        if self._writes == writes:
+            self._remember(user_id, document)
+        return document
+
+    async def upsert(self, user_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Create or update a user's preferences; returns the stored document"""
+        now = datetime.utcnow()
+        self._writes += 1
+        document = await self.db.user_preferences.find_one_and_update(
+            {"user_id": user_id},
+            {
+                "$set": {**fields, "user_id": user_id, "updated_at": now},
+                "$setOnInsert": {"id": str(uuid.uuid4()), "created_at": now}
+            },
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._writes += 1
+        self.upserts += 1
+        self._remember(user_id, document)
+        return document
+
+    def invalidate(self, user_id: str):
+        self._writes += 1
+        self._entries.pop(user_id, None)
+
+    def _remember(self, user_id: str, document: Optional[Dict[str, Any]]):
+        self._entries[user_id] = (time.monotonic() + self.ttl_seconds, document)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "upserts": self.upserts,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+def preferences_store_from_env(db) -> PreferencesStore:
+    return PreferencesStore(
+        db,
+        ttl_seconds=float(os.environ.get('PREFERENCES_CACHE_TTL_SECONDS', '60')),
+        max_entries=int(os.environ.get('PREFERENCES_CACHE_MAX_ENTRIES', '50000'))
+    )
@@ -0,0 +1,270 @@
+"""Provider price history: raw quote points plus hourly/daily rollups.
+
+Every fresh provider fetch appends one point per quote to `price_points`, a
+MongoDB time-series collection whose metaField is {type, key, provider}, so
+Mongo buckets points per provider and route/product key (route_key for rides,
+the catalog product key for groceries). Cache hits don't add points: the
+quotes are the same ones already recorded. Nor do fetches before the startup
+IndexBuilder has created the collection.
+
+A `price_rollup` job downsamples the points into `price_rollups`, one document
+per (resolution, type, key, provider, bucket) with count/sum/min/max of price
+and ETA. Hours are recomputed from raw points and days from hourly rollups;
+each bucket is replaced wholesale ($merge whenMatched: replace), so re-running
+a window is idempotent. `price_rollup_state` holds the watermark (start of the
+first hour not rolled up yet). Hours are only rolled up ROLLUP_LAG after they
+end, so the current hour never appears in history.
+
+Collections:
+    price_points        {ts, meta: {type, key, provider}, price, eta_min}
+    price_rollups       {resolution, type, key, provider, bucket, count, price_sum, price_min,
+                         price_max, eta_count, eta_sum, eta_min, eta_max}
+    price_rollup_state  {_id: "rollups", watermark, updated_at}
+
+History reads only touch rollups: 90 days of one key is 90 daily rows per
+provider (or 2,160 hourly ones) however many quotes were recorded.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ASCENDING
+from pymongo.errors import CollectionInvalid
+
+from mongo_config import AGGREGATION_MAX_TIME_MS, QUERY_MAX_TIME_MS
+
+
+logger = logging.getLogger(__name__)
+
+POINTS_RETENTION = timedelta(days=120)
+ROLLUP_LAG = timedelta(minutes=5)
+# Caps one job's work after a backfill or long downtime (and keeps each aggregation
+# well inside AGGREGATION_MAX_TIME_MS); the next run continues
+MAX_HOURS_PER_RUN = 24
+ROLLUP_INTERVAL_SECONDS = float(os.environ.get('PRICE_ROLLUP_INTERVAL_SECONDS', '600'))
+
+RESOLUTIONS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+# "auto" reads hourly buckets up to this range and daily buckets beyond it
+AUTO_HOURLY_RANGE = timedelta(days=7)
+MAX_HOURLY_RANGE = timedelta(days=92)
+DEFAULT_RANGE = timedelta(days=30)
+
+ROLLUP_KEY = ["resolution", "type", "key", "provider", "bucket"]
+
+
+def floor_hour(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+async def ensure_price_points(db) -> bool:
+    """Create the time-series collection, returning False if it couldn't be created.
+
+    Inserting first would create a plain collection instead, so the API holds
+    price-point writes until this succeeds (see IndexBuilder).
+    """
+    try:
+        await db.create_collection(
+            "price_points",
+            timeseries={"timeField": "ts", "metaField": "meta", "granularity": "minutes"},
+            expireAfterSeconds=int(POINTS_RETENTION.total_seconds())
+        )
+        return True
+    except CollectionInvalid:
+        pass  # already exists
+    except Exception as e:
+        logger.error(f"Failed to create the price_points time-series collection: {str(e)}")
+        return False
+    try:
+        cursor = await db.list_collections(filter={"name": "price_points"})
+        existing = await cursor.to_list(1)
+    except Exception as e:
+        logger.error(f"Failed to check the price_points collection: {str(e)}")
+        return False
+    if existing and existing[0].get("type") != "timeseries":
+        # Created by an insert before this ran: no time buckets and no TTL, so points never expire
+        logger.error("price_points is a plain collection, not a time-series one; points will not expire. "
+                     "Drop it (or copy it into a new time-series collection) and restart")
+    return True
+
+
+def quote_price(comparison_type: str, quote) -> float:
+    """What a user pays: the effective fare for rides, price plus delivery for groceries"""
+    return quote.effective_fare if comparison_type == "ride" else quote.total_price
+
+
+def price_points(comparison_type: str, key: str, quotes: List[Any],
+                 ts: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    ts = ts or datetime.utcnow()
+    return [
+        {
+            "ts": ts,
+            "meta": {"type": comparison_type, "key": key, "provider": quote.provider},
+            "price": quote_price(comparison_type, quote),
+            "eta_min": quote.eta_min_mins
+        }
+        for quote in quotes
+    ]
+
+
+def _rollup_stages(resolution: str, unit: str, fields: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """$group per meta key and time bucket, then replace the matching rollup documents"""
+    return [
+        {"$group": {
+            "_id": {"type": fields["type"], "key": fields["key"], "provider": fields["provider"],
+                    "bucket": {"$dateTrunc": {"date": fields["time"], "unit": unit}}},
+            "count": fields["count"],
+            "price_sum": {"$sum": fields["price_sum"]},
+            "price_min": {"$min": fields["price_min"]},
+            "price_max": {"$max": fields["price_max"]},
+            "eta_count": fields["eta_count"],
+            "eta_sum": {"$sum": fields["eta_sum"]},
+            "eta_min": {"$min": fields["eta_min"]},
+            "eta_max": {"$max": fields["eta_max"]},
+        }},
+        {"$project": {
+            "_id": 0, "resolution": resolution, "type": "$_id.type", "key": "$_id.key",
+            "provider": "$_id.provider", "bucket": "$_id.bucket", "count": 1, "price_sum": 1, "price_min": 1,
+            "price_max": 1, "eta_count": 1, "eta_sum": 1, "eta_min": 1, "eta_max": 1
+        }},
+        {"$merge": {"into": "price_rollups", "on": ROLLUP_KEY, "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+
+
+HOURLY_FIELDS = {
+    "type": "$meta.type", "key": "$meta.key", "provider": "$meta.provider", "time": "$ts",
+    "count": {"$sum": 1}, "price_sum": "$price", "price_min": "$price", "price_max": "$price",
+    "eta_count": {"$sum": {"$cond": [{"$isNumber": "$eta_min"}, 1, 0]}},
+    "eta_sum": "$eta_min", "eta_min": "$eta_min", "eta_max": "$eta_min",
+}
+
+DAILY_FIELDS = {
+    "type": "$type", "key": "$key", "provider": "$provider", "time": "$bucket",
+    "count": {"$sum": "$count"}, "price_sum": "$price_sum", "price_min": "$price_min", "price_max": "$price_max",
+    "eta_count": {"$sum": "$eta_count"}, "eta_sum": "$eta_sum", "eta_min": "$eta_min", "eta_max": "$eta_max",
+}
+
+
+class PriceRollups:
+    """Downsamples price points into hourly and daily rollups, and answers history queries from them"""
+
+    def __init__(self, db, read_db=None):
+        self.db = db
+        # History reads may use a secondary (see mongo_config.py); rollups read and write the primary
+        self.read_db = read_db if read_db is not None else db
+        self.runs = 0
+        self.hours_rolled = 0
+        self.watermark: Optional[datetime] = None
+
+    async def run(self, now: Optional[datetime] = None) -> int:
+        """Roll up every complete hour since the watermark (at most MAX_HOURS_PER_RUN); returns hours rolled"""
+        end = floor_hour((now or datetime.utcnow()) - ROLLUP_LAG)
+        start = await self._load_watermark(end)
+        end = min(end, start + timedelta(hours=MAX_HOURS_PER_RUN))
+        if start >= end:
+            return 0
+
+        await self.db.price_points.aggregate(
+            [{"$match": {"ts": {"$gte": start, "$lt": end}}}] + _rollup_stages("hour", "hour", HOURLY_FIELDS),
+            maxTimeMS=AGGREGATION_MAX_TIME_MS
+        ).to_list(None)
+        # Days overlapping the window, recomputed from all of their hourly rollups
+        day_start, day_end = floor_day(start), floor_day(end - timedelta(microseconds=1)) + timedelta(days=1)
+        await self.db.price_rollups.aggregate(
+            [{"$match": {"resolution": "hour", "bucket": {"$gte": day_start, "$lt": day_end}}}]
+            + _rollup_stages("day", "day", DAILY_FIELDS),
+            maxTimeMS=AGGREGATION_MAX_TIME_MS
+        ).to_list(None)
+
+        await self.db.price_rollup_state.update_one(
+            {"_id": "rollups"}, {"$set": {"watermark": end, "updated_at": datetime.utcnow()}}, upsert=True
+        )
+        hours = int((end - start) / timedelta(hours=1))
+        self.runs += 1
+        self.hours_rolled += hours
+        self.watermark = end
+        logger.info(f"Price rollups: {hours} hours up to {end.isoformat()}")
+        return hours
+
+    async def _load_watermark(self, end: datetime) -> datetime:
+        state = await self.db.price_rollup_state.find_one({"_id": "rollups"})
+        if state:
+            return state["watermark"]
+        # First run: start at the oldest point still retained
+        oldest = await self.db.price_points.find_one({}, {"ts": 1}, sort=[("ts", ASCENDING)])
+        return floor_hour(oldest["ts"]) if oldest else end
+
+    async def history(self, comparison_type: str, key: str, provider: Optional[str], start: datetime,
+                      end: datetime, resolution: str = "auto") -> Dict[str, Any]:
+        """Per-provider price series for one route/product key; raises ValueError on a bad range"""
+        if start >= end:
+            raise ValueError("start must be before end")
+        if resolution == "auto":
+            resolution = "hour" if end - start <= AUTO_HOURLY_RANGE else "day"
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"resolution must be one of auto, {', '.join(RESOLUTIONS)}")
+        if resolution == "hour" and end - start > MAX_HOURLY_RANGE:
+            raise ValueError(f"hourly history is limited to {MAX_HOURLY_RANGE.days} days")
+
+        query = {"resolution": resolution, "type": comparison_type, "key": key,
+                 "bucket": {"$gte": start, "$lt": end}}
+        if provider:
+            query["provider"] = provider
+        rows = await self.read_db.price_rollups.find(query, {"_id": 0}).sort(
+            [("provider", ASCENDING), ("bucket", ASCENDING)]
+        ).max_time_ms(QUERY_MAX_TIME_MS).to_list(None)
+
+        series: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            series.setdefault(row["provider"], []).append({
+                "bucket": row["bucket"],
+                "count": row["count"],
+                "price_min": row["price_min"],
+                "price_avg": round(row["price_sum"] / row["count"], 2),
+                "price_max": row["price_max"],
+                "eta_avg": round(row["eta_sum"] / row["eta_count"], 1) if row["eta_count"] else None
+            })
+        return {"comparison_type": comparison_type, "key": key, "resolution": resolution,
+                "start": start, "end": end, "providers": series}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "hours_rolled": self.hours_rolled,
+            "watermark": self.watermark.isoformat() if self.watermark else None
+        }
+
+
+class PriceRollupScheduler:
+    """Periodically enqueues the rollup job; the job's dedup key keeps one pending across processes"""
+
+    def __init__(self, enqueue: Callable[[], Awaitable[bool]], interval: float = ROLLUP_INTERVAL_SECONDS):
+        self.enqueue = enqueue
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.enqueue()
+            except Exception as e:
+                logger.error(f"Price rollup scheduling failed: {str(e)}")
+            await asyncio.sleep(self.interval)
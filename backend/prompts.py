@@ -0,0 +1,133 @@
+"""Compact, token-budgeted inputs for the personalization and smart-alert prompts.
+
+Instead of interpolating raw Mongo documents (with `_id`, full provider arrays
+and feature lists), the AI endpoints project only the fields below and send
+aggregate stats, rendered as compact JSON and trimmed to PROMPT_TOKEN_BUDGET.
+"""
+import json
+import math
+import os
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+
+
+PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', '600'))
+TOP_N = 5
+
+RIDE_HISTORY_PROJECTION = {
+    "_id": 0, "pickup_location": 1, "drop_location": 1, "distance_km": 1,
+    "best_price_provider": 1, "best_time_provider": 1,
+    "providers.provider": 1, "providers.estimated_fare": 1,
+    "providers.coupon_discount": 1, "providers.wallet_balance": 1, "providers.surge_multiplier": 1
+}
+GROCERY_HISTORY_PROJECTION = {
+    "_id": 0, "product_name": 1, "category": 1, "best_price_provider": 1, "best_delivery_provider": 1,
+    "providers.provider": 1, "providers.price": 1, "providers.delivery_fee": 1
+}
+SAVINGS_PROJECTION = {"_id": 0, "comparison_type": 1, "savings_amount": 1, "provider_chosen": 1}
+PREFERENCES_PROJECTION = {"_id": 0, "preferred_providers": 1, "budget_limits": 1}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough GPT-style token estimate (~4 characters per token)"""
+    return math.ceil(len(text) / 4)
+
+
+def _averages(values: Dict[str, List[float]]) -> Dict[str, float]:
+    return {key: round(sum(items) / len(items), 1) for key, items in values.items() if items}
+
+
+def _top(counter: Counter) -> Dict[str, int]:
+    return dict(counter.most_common(TOP_N))
+
+
+def summarize_ride_history(history: List[Dict[str, Any]]) -> Dict[str, Any]:
+    fares = defaultdict(list)
+    surges = defaultdict(list)
+    for comparison in history:
+        for provider in comparison.get("providers", []):
+            name = provider.get("provider")
+            if "estimated_fare" in provider:
+                fares[name].append(provider["estimated_fare"] - provider.get("coupon_discount", 0)
+                                   - provider.get("wallet_balance", 0))
+            if "surge_multiplier" in provider:
+                surges[name].append(provider["surge_multiplier"])
+    distances = [comparison["distance_km"] for comparison in history if "distance_km" in comparison]
+    return {
+        "comparisons": len(history),
+        "top_routes": _top(Counter(f"{c.get('pickup_location')} -> {c.get('drop_location')}" for c in history)),
+        "avg_distance_km": round(sum(distances) / len(distances), 1) if distances else 0,
+        "cheapest_provider_counts": _top(Counter(c.get("best_price_provider") for c in history)),
+        "fastest_provider_counts": _top(Counter(c.get("best_time_provider") for c in history)),
+        "avg_effective_fare": _averages(fares),
+        "avg_surge": _averages(surges)
+    }
+
+
+def summarize_grocery_history(history: List[Dict[str, Any]]) -> Dict[str, Any]:
+    prices = defaultdict(list)
+    fees = defaultdict(list)
+    for comparison in history:
+        for provider in comparison.get("providers", []):
+            name = provider.get("provider")
+            if "price" in provider:
+                prices[name].append(provider["price"])
+            if "delivery_fee" in provider:
+                fees[name].append(provider["delivery_fee"])
+    return {
+        "comparisons": len(history),
+        "top_products": _top(Counter(c.get("product_name") for c in history)),
+        "top_categories": _top(Counter(c.get("category") for c in history)),
+        "cheapest_provider_counts": _top(Counter(c.get("best_price_provider") for c in history)),
+        "fastest_delivery_counts": _top(Counter(c.get("best_delivery_provider") for c in history)),
+        "avg_price": _averages(prices),
+        "avg_delivery_fee": _averages(fees)
+    }
+
+
+def summarize_savings(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    by_type = defaultdict(float)
+    by_provider = defaultdict(float)
+    for record in records:
+        comparison_type = getattr(record.get("comparison_type"), "value", record.get("comparison_type"))
+        by_type[comparison_type] += record.get("savings_amount", 0)
+        by_provider[record.get("provider_chosen")] += record.get("savings_amount", 0)
+    return {
+        "records": len(records),
+        "total_savings": round(sum(by_type.values()), 2),
+        "savings_by_type": {key: round(value, 2) for key, value in by_type.items()},
+        "savings_by_provider": {key: round(value, 2) for key, value in by_provider.items()}
+    }
+
+
+def render_within_budget(data: Any, budget_tokens: Optional[int] = None) -> str:
+    """Compact JSON for `data`, shrinking its largest collections until it fits the budget"""
+    budget = budget_tokens if budget_tokens is not None else PROMPT_TOKEN_BUDGET
+    data = json.loads(json.dumps(data, default=str))
+    text = json.dumps(data, separators=(",", ":"))
+    while estimate_tokens(text) > budget and _shrink_largest(data):
+        text = json.dumps(data, separators=(",", ":"))
+    if estimate_tokens(text) > budget:
+        text = text[:budget * 4]
+    return text
+
+
+def _shrink_largest(data: Any) -> bool:
+    """Halve the largest list/dict nested anywhere in `data`; False when nothing is left to trim"""
+    largest, size = None, 1
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        children = node.values() if isinstance(node, dict) else node if isinstance(node, list) else []
+        if isinstance(node, (dict, list)) and len(node) > size:
+            largest, size = node, len(node)
+        stack.extend(child for child in children if isinstance(child, (dict, list)))
+    if largest is None:
+        return False
+    keep = size // 2
+    if isinstance(largest, list):
+        del largest[keep:]
+    else:
+        for key in list(largest)[keep:]:
+            del largest[key]
+    return True
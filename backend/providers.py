@@ -0,0 +1,257 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROVIDER_TIMEOUT = float(os.environ.get('PROVIDER_TIMEOUT_SECONDS', '2.0'))
+
+
+# Mock data generators for development
+def generate_mock_ride_providers(pickup: str, drop: str, distance: float):
+    return [
+        {
+            "provider": "Uber",
+            "vehicle_type": "UberGo",
+            "estimated_fare": 120,
+            "estimated_time": "8-12 mins",
+            "surge_multiplier": 1.0,
+            "coupon_discount": 20,
+            "wallet_balance": 0,
+            "features": ["AC Car", "GPS Tracking", "24/7 Support"]
+        },
+        {
+            "provider": "Ola",
+            "vehicle_type": "Mini",
+            "estimated_fare": 110,
+            "estimated_time": "10-15 mins",
+            "surge_multiplier": 1.2,
+            "coupon_discount": 0,
+            "wallet_balance": 50,
+            "features": ["AC Car", "Safety Features", "Easy Cancellation"]
+        },
+        {
+            "provider": "Rapido",
+            "vehicle_type": "Bike",
+            "estimated_fare": 35,
+            "estimated_time": "12-18 mins",
+            "surge_multiplier": 1.0,
+            "coupon_discount": 0,
+            "wallet_balance": 0,
+            "features": ["Fastest Route", "Helmet Provided", "Eco-Friendly"]
+        },
+        {
+            "provider": "Namma Yatri",
+            "vehicle_type": "Auto",
+            "estimated_fare": 65,
+            "estimated_time": "15-20 mins",
+            "surge_multiplier": 1.0,
+            "coupon_discount": 0,
+            "wallet_balance": 0,
+            "features": ["Fixed Fare", "No Commission", "Local Drivers"]
+        }
+    ]
+
+def generate_mock_grocery_providers(product_name: str):
+    return [
+        {
+            "provider": "Blinkit",
+            "product_name": product_name,
+            "brand": "India Gate",
+            "size": "5 kg",
+            "price": 520,
+            "mrp": 550,
+            "price_per_unit": 104,
+            "unit": "kg",
+            "delivery_fee": 0,
+            "delivery_time": "10-15 mins",
+            "discount": 30,
+            "rating": 4.4,
+            "review_count": 2100,
+            "in_stock": True,
+            "offers": ["First Order 10% Off", "Free Delivery"]
+        },
+        {
+            "provider": "Instamart",
+            "product_name": product_name,
+            "brand": "India Gate",
+            "size": "5 kg",
+            "price": 540,
+            "mrp": 580,
+            "price_per_unit": 108,
+            "unit": "kg",
+            "delivery_fee": 25,
+            "delivery_time": "15-25 mins",
+            "discount": 40,
+            "rating": 4.3,
+            "review_count": 750,
+            "in_stock": True,
+            "offers": ["Weekend Special", "Bulk Order Discount"]
+        },
+        {
+            "provider": "Zepto",
+            "product_name": product_name,
+            "brand": "India Gate",
+            "size": "5 kg",
+            "price": 535,
+            "mrp": 550,
+            "price_per_unit": 107,
+            "unit": "kg",
+            "delivery_fee": 0,
+            "delivery_time": "8-12 mins",
+            "discount": 15,
+            "rating": 4.5,
+            "review_count": 890,
+            "in_stock": True,
+            "offers": ["Free Delivery", "Express Delivery"]
+        },
+        {
+            "provider": "BigBasket",
+            "product_name": product_name,
+            "brand": "India Gate",
+            "size": "5 kg",
+            "price": 510,
+            "mrp": 600,
+            "price_per_unit": 102,
+            "unit": "kg",
+            "delivery_fee": 40,
+            "delivery_time": "2-4 hours",
+            "discount": 90,
+            "rating": 4.2,
+            "review_count": 1580,
+            "in_stock": True,
+            "offers": ["Buy 2 Get 5% Off", "Free Delivery above ₹200"]
+        }
+    ]
+
+
+# Provider adapters
+class ProviderAdapter:
+    """Base class for a single provider integration"""
+    name: str = ""
+    comparison_type: str = ""
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.timeout = timeout if timeout is not None else DEFAULT_PROVIDER_TIMEOUT
+
+    async def fetch_quotes(self, query: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Return this provider's quotes for a compare request"""
+        raise NotImplementedError
+
+
+class StubProviderAdapter(ProviderAdapter):
+    """Offline adapter serving the mock quotes after a configurable delay"""
+
+    def __init__(self, name: str, comparison_type: str, latency_ms: float = 0.0,
+                 timeout: Optional[float] = None, fail: bool = False):
+        super().__init__(timeout)
+        self.name = name
+        self.comparison_type = comparison_type
+        self.latency_ms = latency_ms
+        self.fail = fail
+
+    async def fetch_quotes(self, query: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        if self.fail:
+            raise RuntimeError(f"{self.name} stub configured to fail")
+
+        if self.comparison_type == "ride":
+            quotes = generate_mock_ride_providers(
+                query.get("pickup_location", ""),
+                query.get("drop_location", ""),
+                query.get("distance_km", 0.0)
+            )
+        else:
+            quotes = generate_mock_grocery_providers(query.get("product_name", ""))
+        return [quote for quote in quotes if quote["provider"] == self.name]
+
+
+class ProviderRegistry:
+    """Adapters available to the compare endpoints, grouped by comparison type"""
+
+    def __init__(self):
+        self._adapters: Dict[str, Dict[str, ProviderAdapter]] = {}
+
+    def register(self, adapter: ProviderAdapter):
+        self._adapters.setdefault(adapter.comparison_type, {})[adapter.name] = adapter
+
+    def unregister(self, comparison_type: str, name: str):
+        self._adapters.get(comparison_type, {}).pop(name, None)
+
+    def adapters(self, comparison_type: str) -> List[ProviderAdapter]:
+        return list(self._adapters.get(comparison_type, {}).values())
+
+    def names(self, comparison_type: str) -> List[str]:
+        return list(self._adapters.get(comparison_type, {}))
+
+
+def parse_stub_latencies(value: str) -> Dict[str, float]:
+    """Parse PROVIDER_STUB_LATENCY_MS, e.g. "50" or "Uber=40,Ola=250,*=20" """
+    latencies = {}
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "=" in part:
+            name, ms = part.rsplit("=", 1)
+            latencies[name.strip()] = float(ms)
+        else:
+            latencies["*"] = float(part)
+    return latencies
+
+
+def register_stub_adapters(registry: ProviderRegistry, latencies: Optional[Dict[str, float]] = None):
+    """Register a stub adapter for every mock ride and grocery provider"""
+    if latencies is None:
+        latencies = parse_stub_latencies(os.environ.get('PROVIDER_STUB_LATENCY_MS', ''))
+    default_latency = latencies.get("*", 0.0)
+
+    for quote in generate_mock_ride_providers("", "", 0.0):
+        name = quote["provider"]
+        registry.register(StubProviderAdapter(name, "ride", latencies.get(name, default_latency)))
+    for quote in generate_mock_grocery_providers(""):
+        name = quote["provider"]
+        registry.register(StubProviderAdapter(name, "grocery", latencies.get(name, default_latency)))
+
+
+async def _call_adapter(adapter: ProviderAdapter, query: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    start = time.perf_counter()
+    error = None
+    try:
+        quotes = await asyncio.wait_for(adapter.fetch_quotes(query), adapter.timeout)
+        status = "ok"
+    except asyncio.TimeoutError:
+        quotes, status = [], "timeout"
+    except Exception as e:
+        logger.warning(f"Provider {adapter.name} failed: {str(e)}")
+        quotes, status, error = [], "error", str(e)
+
+    provider_status = {
+        "provider": adapter.name,
+        "status": status,
+        "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+        "quote_count": len(quotes)
+    }
+    if error:
+        provider_status["error"] = error
+    return quotes, provider_status
+
+
+async def fan_out(adapters: List[ProviderAdapter], query: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Query all adapters concurrently; slow or failing providers are reported, not fatal"""
+    results = await asyncio.gather(*(_call_adapter(adapter, query) for adapter in adapters))
+
+    quotes: List[Dict[str, Any]] = []
+    statuses: List[Dict[str, Any]] = []
+    for provider_quotes, provider_status in results:
+        quotes.extend(provider_quotes)
+        statuses.append(provider_status)
+    return quotes, statuses
+
+
+provider_registry = ProviderRegistry()
+register_stub_adapters(provider_registry)
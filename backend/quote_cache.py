@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# How often a worker waiting on another worker's fetch checks for its result
+SHARED_POLL_SECONDS = 0.05
+
+
+def normalize_text(value: Optional[str]) -> str:
+    """Lowercase and collapse whitespace so trivially different inputs share a key"""
+    return " ".join((value or "").lower().split())
+
+
+def ride_cache_key(route_key: str, distance_km: float) -> Tuple:
+    """Keyed on the normalized route (see routes.py) so near-identical addresses share entries"""
+    return (route_key, round(distance_km, 1))
+
+
+def grocery_cache_key(product_name: str, brand: Optional[str], category: str) -> Tuple:
+    return (normalize_text(product_name), normalize_text(brand), normalize_text(category))
+
+
+class QuoteCache:
+    """TTL + LRU cache of provider fan-out results with single-flight coalescing.
+
+    Concurrent lookups for a key that is being fetched await the same task
+    instead of starting another fan-out.
+
+    With a shared state backend (see shared_state.py and `use_shared`) local
+    misses check the shared cache next, and a fetch lock keyed on the cache
+    key makes workers wait for one worker's fan-out instead of each running
+    their own. Local entries expire when the shared entry they came from does.
+    """
+
+    def __init__(self, ttl_seconds: Dict[str, float], max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, Hashable], asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.shared = None
+        self.shared_hits = 0
+        self.shared_waits = 0
+        self.shared_errors = 0
+
+    async def get_or_fetch(self, comparison_type: str, key: Hashable,
+                           fetch: Callable[[], Awaitable[Any]],
+                           should_cache: Optional[Callable[[Any], bool]] = None) -> Any:
+        full_key = (comparison_type, key)
+        entry = self._entries.get(full_key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(full_key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[full_key]
+            self.expirations += 1
+
+        task = self._inflight.get(full_key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._fetch(full_key, fetch, should_cache))
+            self._inflight[full_key] = task
+            task.add_done_callback(lambda done: self._complete(full_key, done, should_cache))
+        # Shield so one cancelled caller doesn't cancel the fetch for everyone else
+        return (await asyncio.shield(task))[0]
+
+    def use_shared(self, state, encode: Callable[[Any], bytes], decode: Callable[[str, bytes], Any],
+                   lock_seconds: float = 5.0):
+        """Share entries across worker processes; `decode` gets the comparison type and the encoded result"""
+        self.shared = state
+        self._encode = encode
+        self._decode = decode
+        self.lock_seconds = lock_seconds
+
+    async def _fetch(self, full_key: Tuple[str, Hashable], fetch: Callable[[], Awaitable[Any]],
+                     should_cache: Optional[Callable[[Any], bool]]) -> Tuple[Any, float]:
+        """(result, seconds it may stay cached)"""
+        ttl = self.ttl_seconds.get(full_key[0], 0)
+        if self.shared is None or ttl <= 0:
+            return await fetch(), ttl
+
+        digest = hashlib.sha1(repr(full_key).encode()).hexdigest()
+        entry_key, lock_key = f"quotes:{digest}", f"quotes-lock:{digest}"
+        # Unique per fetch, so only the lock's current owner releases it
+        lock_token = uuid.uuid4().hex.encode()
+        locked = False
+        try:
+            cached = await self._shared_entry(full_key[0], entry_key)
+            if cached is not None:
+                self.shared_hits += 1
+                return cached
+            locked = await self.shared.add(lock_key, lock_token, self.lock_seconds)
+            if not locked:
+                # Another worker is fetching: use its result, or fetch ourselves if it takes too long
+                self.shared_waits += 1
+                deadline = time.monotonic() + self.lock_seconds
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(SHARED_POLL_SECONDS)
+                    cached = await self._shared_entry(full_key[0], entry_key)
+                    if cached is not None:
+                        return cached
+        except Exception as e:
+            self.shared_errors += 1
+            logger.warning(f"Shared quote cache unavailable: {str(e)}")
+
+        result = await fetch()
+        try:
+            if should_cache is None or should_cache(result):
+                await self.shared.set(entry_key, f"{time.time() + ttl:.3f} ".encode() + self._encode(result), ttl)
+            if locked:
+                # If the fetch outlived the lock, another worker may hold it now: leave theirs alone
+                await self.shared.delete_if(lock_key, lock_token)
+        except Exception as e:
+            self.shared_errors += 1
+            logger.warning(f"Shared quote cache unavailable: {str(e)}")
+        return result, ttl
+
+    async def _shared_entry(self, comparison_type: str, entry_key: str) -> Optional[Tuple[Any, float]]:
+        """(result, remaining TTL); shared entries are stored as b"<expires_at> <encoded result>" """
+        value = await self.shared.get(entry_key)
+        if value is None:
+            return None
+        expires_at, _, encoded = value.partition(b" ")
+        return self._decode(comparison_type, encoded), float(expires_at) - time.time()
+
+    def _complete(self, full_key: Tuple[str, Hashable], task: asyncio.Future,
+                  should_cache: Optional[Callable[[Any], bool]]):
+        self._inflight.pop(full_key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        result, ttl = task.result()
+        if ttl <= 0 or (should_cache is not None and not should_cache(result)):
+            return
+
+        self._entries[full_key] = (time.monotonic() + ttl, result)
+        self._entries.move_to_end(full_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "inflight": len(self._inflight),
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "shared_backend": self.shared.name if self.shared is not None else None,
+            "shared_hits": self.shared_hits,
+            "shared_waits": self.shared_waits,
+            "shared_errors": self.shared_errors,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0
+        }
+
+
+quote_cache = QuoteCache(
+    ttl_seconds={
+        "ride": float(os.environ.get('QUOTE_CACHE_RIDE_TTL_SECONDS', '30')),
+        "grocery": float(os.environ.get('QUOTE_CACHE_GROCERY_TTL_SECONDS', '120'))
+    },
+    max_entries=int(os.environ.get('QUOTE_CACHE_MAX_ENTRIES', '10000'))
+)
@@ -0,0 +1,258 @@
+"""Compact internal form of provider quotes.
+
+Adapters return free-form dicts. Each quote is parsed exactly once, right after
+the fan-out, into a slotted RideQuoteData/GroceryQuoteData: numeric fields are
+coerced, the ETA string is parsed into eta_min_mins/eta_max_mins, grocery
+price_per_unit is recomputed from price and pack size (per kg / l / piece, see
+catalog.unit_price) and any provider-specific fields are kept in `extra` (None
+when there are none). The quote cache holds these objects, scoring reads their
+attributes, and `to_dict()` runs once at the edge when the comparison is stored
+and returned.
+
+Documents written before ETA bounds existed are still readable (the API models
+fill the bounds in on load); to backfill them in place run:
+
+    python quotes.py --migrate [--batch-size 500]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from catalog import unit_price
+
+
+logger = logging.getLogger(__name__)
+
+_ETA_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(?:\s*-\s*(\d+(?:\.\d+)?))?\s*(h|hr|hrs|hour|hours)?\b", re.IGNORECASE)
+
+
+@lru_cache(maxsize=4096)
+def parse_eta(text: Optional[str]) -> Tuple[Optional[float], Optional[float]]:
+    """"8-12 mins" -> (8.0, 12.0); "2-4 hours" -> (120.0, 240.0); unparseable -> (None, None)"""
+    match = _ETA_PATTERN.search(text or "")
+    if match is None:
+        return None, None
+    scale = 60.0 if match.group(3) else 1.0
+    low = float(match.group(1)) * scale
+    return low, float(match.group(2)) * scale if match.group(2) else low
+
+
+def _eta_bounds(data: Dict[str, Any], eta_field: str) -> Tuple[Optional[float], Optional[float]]:
+    if data.get("eta_min_mins") is not None and data.get("eta_max_mins") is not None:
+        return float(data["eta_min_mins"]), float(data["eta_max_mins"])
+    return parse_eta(data.get(eta_field))
+
+
+@dataclass(slots=True)
+class RideQuoteData:
+    provider: str
+    vehicle_type: str
+    estimated_fare: float
+    estimated_time: str
+    eta_min_mins: Optional[float]
+    eta_max_mins: Optional[float]
+    surge_multiplier: float = 1.0
+    coupon_discount: float = 0.0
+    wallet_balance: float = 0.0
+    features: List[str] = field(default_factory=list)
+    extra: Optional[Dict[str, Any]] = None
+
+    FIELDS = frozenset(("provider", "vehicle_type", "estimated_fare", "estimated_time", "eta_min_mins",
+                        "eta_max_mins", "surge_multiplier", "coupon_discount", "wallet_balance", "features"))
+
+    @property
+    def effective_fare(self) -> float:
+        return self.estimated_fare - self.coupon_discount - self.wallet_balance
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RideQuoteData":
+        eta_min, eta_max = _eta_bounds(data, "estimated_time")
+        return cls(
+            provider=data["provider"],
+            vehicle_type=data.get("vehicle_type", ""),
+            estimated_fare=float(data["estimated_fare"]),
+            estimated_time=data.get("estimated_time", ""),
+            eta_min_mins=eta_min,
+            eta_max_mins=eta_max,
+            surge_multiplier=float(data.get("surge_multiplier", 1.0)),
+            coupon_discount=float(data.get("coupon_discount", 0.0)),
+            wallet_balance=float(data.get("wallet_balance", 0.0)),
+            features=list(data.get("features", [])),
+            extra=_extra_fields(data, cls.FIELDS)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **(self.extra or {}),
+            "provider": self.provider,
+            "vehicle_type": self.vehicle_type,
+            "estimated_fare": self.estimated_fare,
+            "estimated_time": self.estimated_time,
+            "eta_min_mins": self.eta_min_mins,
+            "eta_max_mins": self.eta_max_mins,
+            "surge_multiplier": self.surge_multiplier,
+            "coupon_discount": self.coupon_discount,
+            "wallet_balance": self.wallet_balance,
+            "features": self.features
+        }
+
+
+@dataclass(slots=True)
+class GroceryQuoteData:
+    provider: str
+    product_name: str
+    price: float
+    delivery_fee: float
+    delivery_time: str
+    eta_min_mins: Optional[float]
+    eta_max_mins: Optional[float]
+    brand: Optional[str] = None
+    size: Optional[str] = None
+    mrp: Optional[float] = None
+    price_per_unit: Optional[float] = None
+    unit: Optional[str] = None
+    discount: float = 0.0
+    rating: Optional[float] = None
+    review_count: int = 0
+    in_stock: bool = True
+    offers: List[str] = field(default_factory=list)
+    extra: Optional[Dict[str, Any]] = None
+
+    FIELDS = frozenset(("provider", "product_name", "price", "delivery_fee", "delivery_time", "eta_min_mins",
+                        "eta_max_mins", "brand", "size", "mrp", "price_per_unit", "unit", "discount", "rating",
+                        "review_count", "in_stock", "offers"))
+
+    @property
+    def total_price(self) -> float:
+        return self.price + self.delivery_fee
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "GroceryQuoteData":
+        eta_min, eta_max = _eta_bounds(data, "delivery_time")
+        price = float(data["price"])
+        # Provider-reported unit prices use mixed units and rounding; fall back to them only for unparseable sizes
+        per_unit = unit_price(price, data.get("size"))
+        return cls(
+            provider=data["provider"],
+            product_name=data.get("product_name", ""),
+            price=price,
+            delivery_fee=float(data.get("delivery_fee", 0.0)),
+            delivery_time=data.get("delivery_time", ""),
+            eta_min_mins=eta_min,
+            eta_max_mins=eta_max,
+            brand=data.get("brand"),
+            size=data.get("size"),
+            mrp=_optional_float(data.get("mrp")),
+            price_per_unit=per_unit[0] if per_unit else _optional_float(data.get("price_per_unit")),
+            unit=per_unit[1] if per_unit else data.get("unit"),
+            discount=float(data.get("discount", 0.0)),
+            rating=_optional_float(data.get("rating")),
+            review_count=int(data.get("review_count", 0)),
+            in_stock=bool(data.get("in_stock", True)),
+            offers=list(data.get("offers", [])),
+            extra=_extra_fields(data, cls.FIELDS)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **(self.extra or {}),
+            "provider": self.provider,
+            "product_name": self.product_name,
+            "brand": self.brand,
+            "size": self.size,
+            "price": self.price,
+            "mrp": self.mrp,
+            "price_per_unit": self.price_per_unit,
+            "unit": self.unit,
+            "delivery_fee": self.delivery_fee,
+            "delivery_time": self.delivery_time,
+            "eta_min_mins": self.eta_min_mins,
+            "eta_max_mins": self.eta_max_mins,
+            "discount": self.discount,
+            "rating": self.rating,
+            "review_count": self.review_count,
+            "in_stock": self.in_stock,
+            "offers": self.offers
+        }
+
+
+def _extra_fields(data: Dict[str, Any], known: frozenset) -> Optional[Dict[str, Any]]:
+    if data.keys() <= known:
+        return None
+    return {key: value for key, value in data.items() if key not in known}
+
+
+def _optional_float(value: Any) -> Optional[float]:
+    return None if value is None else float(value)
+
+
+QUOTE_TYPES = {"ride": RideQuoteData, "grocery": GroceryQuoteData}
+
+
+def parse_quotes(comparison_type: str, quotes: List[Dict[str, Any]]) -> List[Any]:
+    """Adapter dicts -> slotted quotes; malformed quotes are logged and dropped"""
+    quote_type = QUOTE_TYPES[comparison_type]
+    parsed = []
+    for quote in quotes:
+        try:
+            parsed.append(quote_type.from_dict(quote))
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Dropping malformed {comparison_type} quote from {quote.get('provider')}: {str(e)}")
+    return parsed
+
+
+async def migrate_eta_bounds(db, batch_size: int = 500) -> Dict[str, int]:
+    """Backfill eta_min_mins/eta_max_mins on comparisons stored before they existed"""
+    from pymongo import UpdateOne
+
+    migrated = {}
+    for collection, comparison_type in (("ride_comparisons", "ride"), ("grocery_comparisons", "grocery")):
+        quote_type = QUOTE_TYPES[comparison_type]
+        count = 0
+        operations = []
+        cursor = db[collection].find({"providers.eta_min_mins": {"$exists": False}}, {"_id": 1, "providers": 1})
+        async for document in cursor.batch_size(batch_size):
+            providers = [quote_type.from_dict(quote).to_dict() for quote in document.get("providers", [])]
+            operations.append(UpdateOne({"_id": document["_id"]}, {"$set": {"providers": providers}}))
+            if len(operations) >= batch_size:
+                await db[collection].bulk_write(operations, ordered=False)
+                count += len(operations)
+                operations = []
+        if operations:
+            await db[collection].bulk_write(operations, ordered=False)
+            count += len(operations)
+        migrated[collection] = count
+    return migrated
+
+
+async def _main(batch_size: int):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        migrated = await migrate_eta_bounds(client[os.environ['DB_NAME']], batch_size)
+    finally:
+        client.close()
+    for collection, count in migrated.items():
+        logger.info(f"Backfilled ETA bounds on {count} {collection} documents")
+
+
+if __name__ == "__main__":
+    from pathlib import Path
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Migrate stored provider quotes")
+    parser.add_argument("--migrate", action="store_true", help="backfill ETA bounds on stored comparisons")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    if args.migrate:
+        asyncio.run(_main(args.batch_size))
+    else:
+        parser.print_help()
@@ -0,0 +1,269 @@
+"""Route normalization for ride comparisons.
+
+Every ride comparison gets a stable `route_key` ("<pickup>|<drop>") at compare
+time. The quote cache, the popular-routes analytics and price-alert matching
+all use it instead of the raw strings, so near-identical addresses share cache
+entries, analytics buckets and alerts. Each location resolves to, in order:
+
+- `cell:<geohash>` when coordinates are known and ROUTE_GEOHASH_PRECISION > 0
+- `place:<id>` when the canonical text matches a gazetteer alias
+- `point:<lat>,<lng>` (rounded to ~100m) for bare coordinates
+- `text:<canonical text>` otherwise
+
+The gazetteer is a JSON file named by GAZETTEER_PATH. There is no default:
+without it locations are keyed on canonical text (and coordinates).
+fixtures/gazetteer.json is a small offline fixture for tests and benchmarks,
+not a deployment gazetteer.
+
+Keys depend on the gazetteer and ROUTE_GEOHASH_PRECISION, so changing either
+changes the keys of new comparisons. To add route_key to comparisons and alerts
+stored before it existed, or (--recompute) to rewrite every stored key after
+such a change, run:
+
+    python routes.py --backfill [--recompute] [--batch-size 500]
+
+Price history rollups and analytics buckets keep the old keys until they age
+out.
+
+Alerts are keyed the same way as compares. An alert created with only a text
+`route` can't be geohashed, so with ROUTE_GEOHASH_PRECISION > 0 it matches
+compares sent with coordinates only when both locations resolve to gazetteer
+places that have coordinates. Alerts that pass pickup/drop coordinates get the
+same cell keys as the compare.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+GAZETTEER_PATH = os.environ.get('GAZETTEER_PATH', '')
+# Offline test data; only tests and benchmarks load it
+FIXTURE_GAZETTEER_PATH = str(Path(__file__).parent / 'fixtures' / 'gazetteer.json')
+GEOHASH_PRECISION = int(os.environ.get('ROUTE_GEOHASH_PRECISION', '0'))
+MAX_ALIAS_TOKENS = 6
+
+ABBREVIATIONS = {
+    "rd": "road", "st": "street", "stn": "station", "blk": "block", "sec": "sector", "ngr": "nagar",
+    "jn": "junction", "jct": "junction", "opp": "opposite", "nr": "near", "apt": "apartment",
+    "ext": "extension", "mkt": "market", "hosp": "hospital", "int": "international", "intl": "international",
+}
+FILLER_TOKENS = {"near", "opposite", "behind", "next", "to"}
+
+_PUNCTUATION = re.compile(r"[^\w\s]|_")
+_PINCODE = re.compile(r"^\d{6}$")
+_COORDINATES = re.compile(r"^\s*(-?\d{1,2}(?:\.\d+)?)\s*,\s*(-?\d{1,3}(?:\.\d+)?)\s*$")
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(latitude: float, longitude: float, precision: int) -> str:
+    """Standard base32 geohash of a point"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    cell, bits, value, even = [], 0, 0, True
+    while len(cell) < precision:
+        span, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (span[0] + span[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            span[0] = middle
+        else:
+            span[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            cell.append(_GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return "".join(cell)
+
+
+def canonical_tokens(text: Optional[str]) -> Tuple[str, ...]:
+    """Lowercase, strip accents and punctuation, expand abbreviations and drop pincodes"""
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode()
+    tokens = _PUNCTUATION.sub(" ", text.lower()).split()
+    return tuple(ABBREVIATIONS.get(token, token) for token in tokens if not _PINCODE.match(token))
+
+
+class Gazetteer:
+    """Known places with their aliases, matched on canonical token sequences"""
+
+    def __init__(self, places: Sequence[Dict[str, Any]], region_tokens: Sequence[str] = ()):
+        self.places = {place["id"]: place for place in places}
+        self.region_tokens = frozenset(region_tokens)
+        self._aliases: Dict[Tuple[str, ...], str] = {}
+        for place in places:
+            for alias in [place["name"], *place.get("aliases", [])]:
+                tokens = canonical_tokens(alias)
+                if tokens:
+                    self._aliases.setdefault(tokens, place["id"])
+
+    @classmethod
+    def load(cls, path: str) -> "Gazetteer":
+        with open(path, encoding="utf-8") as handle:
+            data = json.load(handle)
+        return cls(data["places"], data.get("region_tokens", ()))
+
+    def match(self, tokens: Tuple[str, ...]) -> Optional[str]:
+        """Place id for an exact alias, then with region words trimmed, then the longest alias inside"""
+        place_id = self._aliases.get(tokens)
+        if place_id:
+            return place_id
+        trimmed = self.strip_region(tokens)
+        place_id = self._aliases.get(trimmed)
+        if place_id:
+            return place_id
+        for size in range(min(MAX_ALIAS_TOKENS, len(tokens)), 0, -1):
+            for start in range(len(tokens) - size + 1):
+                place_id = self._aliases.get(tokens[start:start + size])
+                if place_id:
+                    return place_id
+        return None
+
+    def strip_region(self, tokens: Tuple[str, ...]) -> Tuple[str, ...]:
+        start, end = 0, len(tokens)
+        while end > start and tokens[end - 1] in self.region_tokens:
+            end -= 1
+        while start < end and tokens[start] in FILLER_TOKENS:
+            start += 1
+        return tokens[start:end]
+
+
+class RouteNormalizer:
+    def __init__(self, gazetteer: Optional[Gazetteer] = None, geohash_precision: int = GEOHASH_PRECISION):
+        self.gazetteer = gazetteer
+        self.geohash_precision = geohash_precision
+        self.location_key = lru_cache(maxsize=100000)(self._location_key)
+
+    def _location_key(self, location: str, coordinates: Optional[Tuple[float, float]] = None) -> str:
+        bare = _COORDINATES.match(location or "")
+        if bare and coordinates is None:
+            coordinates = (float(bare.group(1)), float(bare.group(2)))
+        tokens = () if bare else canonical_tokens(location)
+        place_id = self.gazetteer.match(tokens) if self.gazetteer and tokens else None
+        if self.geohash_precision > 0:
+            if coordinates is None and place_id is not None:
+                place = self.gazetteer.places[place_id]
+                if "lat" in place and "lng" in place:
+                    coordinates = (place["lat"], place["lng"])
+            if coordinates is not None:
+                return f"cell:{geohash(coordinates[0], coordinates[1], self.geohash_precision)}"
+        if place_id is not None:
+            return f"place:{place_id}"
+        if bare:
+            # ~100m grid instead of the digits as text
+            return f"point:{coordinates[0]:.3f},{coordinates[1]:.3f}"
+        if self.gazetteer:
+            tokens = self.gazetteer.strip_region(tokens) or tokens
+        return f"text:{' '.join(tokens)}"
+
+    def route_key(self, pickup: str, drop: str, pickup_coordinates: Optional[Sequence[float]] = None,
+                  drop_coordinates: Optional[Sequence[float]] = None) -> str:
+        return (f"{self.location_key(pickup, _point(pickup_coordinates))}|"
+                f"{self.location_key(drop, _point(drop_coordinates))}")
+
+    def route_key_from_route(self, route: str, pickup_coordinates: Optional[Sequence[float]] = None,
+                             drop_coordinates: Optional[Sequence[float]] = None) -> Optional[str]:
+        """Alerts describe routes as one string: "pickup-drop", "pickup -> drop" or "pickup to drop" """
+        for separator in ("->", " to ", "-"):
+            if separator in route:
+                pickup, drop = route.split(separator, 1)
+                if pickup.strip() and drop.strip():
+                    return self.route_key(pickup, drop, pickup_coordinates, drop_coordinates)
+        return None
+
+
+def _point(coordinates: Optional[Sequence[float]]) -> Optional[Tuple[float, float]]:
+    return (float(coordinates[0]), float(coordinates[1])) if coordinates else None
+
+
+def route_normalizer_from_env() -> RouteNormalizer:
+    if not GAZETTEER_PATH:
+        logger.info("GAZETTEER_PATH not set, routes are keyed on canonical text and coordinates only")
+        return RouteNormalizer(None)
+    # A configured but missing gazetteer is an error: falling back would silently change every route key
+    return RouteNormalizer(Gazetteer.load(GAZETTEER_PATH))
+
+
+route_normalizer = route_normalizer_from_env()
+
+
+def document_route_key(document: Dict[str, Any]) -> str:
+    """Stored route_key, or the key computed the same way for comparisons stored before it existed"""
+    return document.get("route_key") or comparison_route_key(document)
+
+
+def comparison_route_key(document: Dict[str, Any]) -> str:
+    return route_normalizer.route_key(
+        document.get("pickup_location", ""), document.get("drop_location", ""),
+        document.get("pickup_coordinates"), document.get("drop_coordinates")
+    )
+
+
+def alert_route_key(alert: Dict[str, Any]) -> Optional[str]:
+    return route_normalizer.route_key_from_route(alert["route"], alert.get("pickup_coordinates"),
+                                                 alert.get("drop_coordinates"))
+
+
+async def backfill_route_keys(db, batch_size: int = 500, recompute: bool = False) -> Dict[str, int]:
+    """Set route_key where it is missing, or on every document with `recompute`"""
+    from pymongo import UpdateOne
+
+    missing = {} if recompute else {"route_key": {"$exists": False}}
+    counts = {}
+    sources: List[Tuple[str, Dict[str, Any], Any]] = [
+        ("ride_comparisons", missing, comparison_route_key),
+        ("price_alerts", {**missing, "route": {"$nin": [None, ""]}}, alert_route_key),
+    ]
+    for collection, query, key_of in sources:
+        count = 0
+        operations = []
+        projection = {"_id": 1, "route": 1, "pickup_location": 1, "drop_location": 1,
+                      "pickup_coordinates": 1, "drop_coordinates": 1}
+        async for document in db[collection].find(query, projection).batch_size(batch_size):
+            operations.append(UpdateOne({"_id": document["_id"]}, {"$set": {"route_key": key_of(document)}}))
+            if len(operations) >= batch_size:
+                await db[collection].bulk_write(operations, ordered=False)
+                count += len(operations)
+                operations = []
+        if operations:
+            await db[collection].bulk_write(operations, ordered=False)
+            count += len(operations)
+        counts[collection] = count
+    return counts
+
+
+async def _main(batch_size: int, recompute: bool):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        counts = await backfill_route_keys(client[os.environ['DB_NAME']], batch_size, recompute)
+    finally:
+        client.close()
+    for collection, count in counts.items():
+        logger.info(f"Backfilled route_key on {count} {collection} documents")
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Route key maintenance")
+    parser.add_argument("--backfill", action="store_true", help="add route_key to stored comparisons and alerts")
+    parser.add_argument("--recompute", action="store_true",
+                        help="with --backfill, rewrite every route_key (after changing the gazetteer or precision)")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    if args.backfill:
+        asyncio.run(_main(args.batch_size, args.recompute))
+    else:
+        parser.print_help()
@@ -0,0 +1,168 @@
+"""Incrementally maintained savings totals per user and per user-month.
+
+`record_savings` folds every new record into `savings_rollups` with $inc, so the
+summary endpoint is a single point read. Rollup documents look like:
+
+    {"user_id": "u1", "period": "all" | "2025-01", "total_savings": 120.0,
+     "total_transactions": 4, "ride_savings": 80.0, "grocery_savings": 40.0, ...}
+
+Rebuild or verify them from the raw records with:
+
+    python savings_rollups.py [--user-id USER] [--check]
+
+Raw inserts and rollup increments are separate writes, so run the rebuild while
+writes are quiet if it reports drift.
+"""
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import DeleteOne, ReplaceOne, UpdateOne
+
+
+logger = logging.getLogger(__name__)
+
+ALL_TIME = "all"
+
+
+def _comparison_type(record: Dict[str, Any]) -> str:
+    comparison_type = record["comparison_type"]
+    return getattr(comparison_type, "value", comparison_type)
+
+
+def rollup_periods(timestamp: datetime) -> Tuple[str, str]:
+    return ALL_TIME, timestamp.strftime("%Y-%m")
+
+
+async def apply_savings(db, records: List[Dict[str, Any]]):
+    """$inc the all-time and monthly rollups for each record in one bulk write"""
+    operations = []
+    now = datetime.utcnow()
+    for record in records:
+        amount = record["savings_amount"]
+        increments = {
+            "total_savings": amount,
+            "total_transactions": 1,
+            f"{_comparison_type(record)}_savings": amount
+        }
+        for period in rollup_periods(record["timestamp"]):
+            operations.append(UpdateOne(
+                {"user_id": record["user_id"], "period": period},
+                {"$inc": increments, "$set": {"updated_at": now}},
+                upsert=True
+            ))
+    if operations:
+        await db.savings_rollups.bulk_write(operations, ordered=False)
+
+
+def summary_from_rollup(rollup: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Shape a rollup document like the original aggregation response"""
+    rollup = rollup or {}
+    total_savings = rollup.get("total_savings", 0)
+    total_transactions = rollup.get("total_transactions", 0)
+    return {
+        "total_savings": total_savings,
+        "total_transactions": total_transactions,
+        "avg_savings": total_savings / total_transactions if total_transactions else 0,
+        "ride_savings": rollup.get("ride_savings", 0),
+        "grocery_savings": rollup.get("grocery_savings", 0)
+    }
+
+
+async def compute_rollups(db, user_id: Optional[str] = None) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """Recompute rollups from savings_records, keyed by (user_id, period)"""
+    pipeline = []
+    if user_id:
+        pipeline.append({"$match": {"user_id": user_id}})
+    pipeline.append({"$group": {
+        "_id": {
+            "user_id": "$user_id",
+            "month": {"$dateToString": {"format": "%Y-%m", "date": "$timestamp"}},
+            "comparison_type": "$comparison_type"
+        },
+        "savings": {"$sum": "$savings_amount"},
+        "transactions": {"$sum": 1}
+    }})
+
+    rollups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    async for group in db.savings_records.aggregate(pipeline, allowDiskUse=True):
+        key = group["_id"]
+        for period in (ALL_TIME, key["month"]):
+            rollup = rollups.setdefault((key["user_id"], period), {"total_savings": 0, "total_transactions": 0})
+            rollup["total_savings"] += group["savings"]
+            rollup["total_transactions"] += group["transactions"]
+            type_field = f"{key['comparison_type']}_savings"
+            rollup[type_field] = rollup.get(type_field, 0) + group["savings"]
+    return rollups
+
+
+def _matches(expected: Dict[str, Any], actual: Optional[Dict[str, Any]]) -> bool:
+    if actual is None:
+        return False
+    fields = set(expected) | {field for field in actual if field.endswith("_savings")}
+    return all(abs(expected.get(field, 0) - actual.get(field, 0)) < 1e-6 for field in fields)
+
+
+async def rebuild_rollups(db, user_id: Optional[str] = None, check_only: bool = False) -> List[Tuple[str, str]]:
+    """Compare stored rollups with recomputed ones; rewrite them unless check_only.
+
+    Returns the (user_id, period) keys that did not match.
+    """
+    expected = await compute_rollups(db, user_id)
+    query = {"user_id": user_id} if user_id else {}
+    stored = {
+        (rollup["user_id"], rollup["period"]): rollup
+        async for rollup in db.savings_rollups.find(query, {"_id": 0})
+    }
+
+    mismatched = [key for key, rollup in expected.items() if not _matches(rollup, stored.get(key))]
+    stale = [key for key in stored if key not in expected]
+    if check_only:
+        return mismatched + stale
+
+    now = datetime.utcnow()
+    operations = [
+        ReplaceOne(
+            {"user_id": key[0], "period": key[1]},
+            {"user_id": key[0], "period": key[1], **expected[key], "updated_at": now},
+            upsert=True
+        )
+        for key in mismatched
+    ]
+    operations += [DeleteOne({"user_id": key[0], "period": key[1]}) for key in stale]
+    if operations:
+        await db.savings_rollups.bulk_write(operations, ordered=False)
+    return mismatched + stale
+
+
+async def _main(user_id: Optional[str], check_only: bool) -> int:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        mismatched = await rebuild_rollups(client[os.environ['DB_NAME']], user_id, check_only)
+    finally:
+        client.close()
+
+    for user, period in mismatched:
+        logger.warning(f"Rollup mismatch for user {user} period {period}")
+    action = "found" if check_only else "repaired"
+    logger.info(f"{action} {len(mismatched)} mismatched rollups")
+    return 1 if check_only and mismatched else 0
+
+
+if __name__ == "__main__":
+    import argparse
+    from pathlib import Path
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Rebuild or verify savings rollups")
+    parser.add_argument("--user-id")
+    parser.add_argument("--check", action="store_true", help="only report mismatches")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_main(args.user_id, args.check)))
@@ -0,0 +1,124 @@
+"""Columnar scoring of provider quotes.
+
+Parsed quotes (see quotes.py) are laid out as NumPy columns (effective price,
+ETA bounds, delivery fee, per-unit price, rating) so picking the cheapest/fastest
+option and ranking every option by a preference-weighted score are single
+vectorized passes, however many vehicle types or SKUs the providers return.
+
+Scores are lower-is-better: each criterion is min-max normalized to [0, 1]
+(rating is inverted), weighted, then preferred providers get a bonus and options
+over the user's budget are pushed below every option within it.
+"""
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from quotes import GroceryQuoteData, RideQuoteData
+
+
+RANKING_TOP_K = int(os.environ.get('RANKING_TOP_K', '5'))
+PREFERRED_PROVIDER_BONUS = 0.15
+
+DEFAULT_WEIGHTS: Dict[str, Dict[str, float]] = {
+    "ride": {"price": 0.6, "eta_min": 0.3, "eta_max": 0.1},
+    "grocery": {"price": 0.5, "eta_min": 0.15, "per_unit_price": 0.15, "rating": 0.2},
+}
+HIGHER_IS_BETTER = {"rating"}
+
+
+class QuoteTable:
+    """Provider quotes as parallel columns; row i is quotes[i]"""
+
+    def __init__(self, providers: List[str], columns: Dict[str, np.ndarray]):
+        self.providers = providers
+        self.columns = columns
+        # Lower-cased provider names as integer codes, so preference matching is one np.isin
+        codes: Dict[str, int] = {}
+        self.provider_codes = np.fromiter((codes.setdefault(name.lower(), len(codes)) for name in providers),
+                                          dtype=np.int64, count=len(providers))
+        self.provider_names = codes
+
+    def __len__(self):
+        return len(self.providers)
+
+    def best(self, column: str) -> int:
+        """Row with the lowest value; ties go to the earliest row, like min()
+
+        When no row has a value (e.g. no provider sent a parseable ETA) the
+        cheapest row wins, and row 0 if prices are missing too.
+        """
+        values = self.columns[column]
+        if np.isnan(values).all():
+            if column == "price" or np.isnan(self.columns["price"]).all():
+                return 0
+            values = self.columns["price"]
+        return int(np.nanargmin(values))
+
+    def scores(self, weights: Dict[str, float], preferred_providers: Iterable[str] = (),
+               budget: Optional[float] = None) -> np.ndarray:
+        score = np.zeros(len(self), dtype=np.float64)
+        for column, weight in weights.items():
+            values = self.columns.get(column)
+            if values is None or not weight or np.isnan(values).all():
+                continue
+            low, high = np.nanmin(values), np.nanmax(values)
+            spread = high - low
+            normalized = (values - low) / spread if spread else np.zeros_like(values)
+            if column in HIGHER_IS_BETTER:
+                normalized = 1.0 - normalized
+            score += weight * np.nan_to_num(normalized, nan=1.0)
+
+        preferred = [self.provider_names[name.lower()] for name in preferred_providers
+                     if name.lower() in self.provider_names]
+        if preferred:
+            score -= PREFERRED_PROVIDER_BONUS * np.isin(self.provider_codes, preferred)
+        if budget is not None:
+            score += (self.columns["price"] > budget) * (sum(weights.values()) + 1.0)
+        return score
+
+    def top_k(self, k: int, weights: Dict[str, float], preferred_providers: Iterable[str] = (),
+              budget: Optional[float] = None) -> List[int]:
+        """Row indices of the k best-scored options, best first"""
+        score = self.scores(weights, preferred_providers, budget)
+        k = min(k, len(score))
+        if k <= 0:
+            return []
+        candidates = np.argpartition(score, k - 1)[:k] if k < len(score) else np.arange(len(score))
+        return candidates[np.lexsort((candidates, score[candidates]))].tolist()
+
+
+def _column(quotes: List[Any], attribute: str) -> np.ndarray:
+    values = (getattr(quote, attribute) for quote in quotes)
+    return np.fromiter((np.nan if value is None else value for value in values), dtype=np.float64, count=len(quotes))
+
+
+def ride_table(quotes: List[RideQuoteData]) -> QuoteTable:
+    return QuoteTable([quote.provider for quote in quotes], {
+        "price": np.fromiter((quote.effective_fare for quote in quotes), dtype=np.float64, count=len(quotes)),
+        "eta_min": _column(quotes, "eta_min_mins"),
+        "eta_max": _column(quotes, "eta_max_mins"),
+    })
+
+
+def grocery_table(quotes: List[GroceryQuoteData]) -> QuoteTable:
+    return QuoteTable([quote.provider for quote in quotes], {
+        "price": np.fromiter((quote.total_price for quote in quotes), dtype=np.float64, count=len(quotes)),
+        "delivery_fee": _column(quotes, "delivery_fee"),
+        "eta_min": _column(quotes, "eta_min_mins"),
+        "eta_max": _column(quotes, "eta_max_mins"),
+        "per_unit_price": _column(quotes, "price_per_unit"),
+        "rating": _column(quotes, "rating"),
+    })
+
+
+def rank_providers(table: QuoteTable, comparison_type: str, preferences: Optional[Dict[str, Any]],
+                   k: int = RANKING_TOP_K) -> List[int]:
+    """Top-k rows for a user, weighted by DEFAULT_WEIGHTS and their UserPreferences"""
+    preferences = preferences or {}
+    return table.top_k(
+        k,
+        DEFAULT_WEIGHTS[comparison_type],
+        (preferences.get("preferred_providers") or {}).get(comparison_type, ()),
+        (preferences.get("budget_limits") or {}).get(comparison_type)
+    )
@@ -0,0 +1,42 @@
+"""Run the API with one or more uvicorn worker processes.
+
+Each worker imports `server` itself, so every process builds its own Mongo
+client, caches and background tasks after it starts; nothing is created
+before the fork. Settings come from the environment (and backend/.env):
+
+    WEB_CONCURRENCY   worker processes (default 1)
+    HOST, PORT        bind address (default 0.0.0.0:8001)
+
+With more than one worker, set STATE_BACKEND=redis (see shared_state.py) so
+the quote cache, fetch locks and LLM rate limits are shared:
+
+    STATE_BACKEND=redis REDIS_URL=redis://localhost:6379/0 WEB_CONCURRENCY=4 python serve.py
+"""
+import logging
+import os
+from pathlib import Path
+
+import uvicorn
+from dotenv import load_dotenv
+
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    load_dotenv(Path(__file__).parent / '.env')
+    workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+    if workers > 1 and os.environ.get('STATE_BACKEND', 'memory') == 'memory':
+        logger.warning(f"{workers} workers with STATE_BACKEND=memory: caches and rate limits are per worker")
+    uvicorn.run(
+        "server:app",
+        host=os.environ.get('HOST', '0.0.0.0'),
+        port=int(os.environ.get('PORT', '8001')),
+        workers=workers,
+        app_dir=str(Path(__file__).parent)
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    main()
@@ -1,29 +1,115 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
+import json
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from typing import List, Optional, Dict, Any, Set
 import uuid
 from datetime import datetime
 from enum import Enum
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+from providers import provider_registry, fan_out
+from quote_cache import quote_cache, ride_cache_key, grocery_cache_key
+from db_indexes import IndexBuilder
+from pagination import fetch_page
+from export import EXPORT_SOURCES, ndjson_stream, csv_stream
+from savings_rollups import apply_savings, summary_from_rollup, ALL_TIME
+from analytics import AnalyticsRefresher, WINDOWS, read_popular
+from write_buffer import write_buffer_from_env
+from alerts_engine import AlertEvaluator
+from routes import route_normalizer
+from catalog import MAX_SUGGESTIONS, product_catalog, product_key, resolve_product_id
+from ai_cache import analysis_cache_from_env, analysis_cache_key
+from llm_gateway import LlmGatewayError, llm_gateway_from_env
+from fast_json import FastJSONResponse, ReadSerializer
+from quotes import parse_eta, parse_quotes
+from scoring import ride_table, grocery_table, rank_providers
+from jobs import OffPeakScheduler, job_queue_from_env, job_workers_from_env, warn_if_unclaimed
+from preferences import preferences_store_from_env
+from shared_state import shared_state_from_env
+from price_history import DEFAULT_RANGE, PriceRollups, PriceRollupScheduler, price_points
+from metrics import InstrumentationMiddleware, MongoCommandListener, MongoPoolListener, RequestProfiler, metrics
+from mongo_config import QUERY_MAX_TIME_MS, mongo_client_options, secondary_database
+from health import health_checker_from_env, mongo_ping_check
+from pymongo.errors import ConnectionFailure, ExecutionTimeout
+from prompts import (
+    PROMPT_TOKEN_BUDGET, RIDE_HISTORY_PROJECTION, GROCERY_HISTORY_PROJECTION, SAVINGS_PROJECTION,
+    PREFERENCES_PROJECTION, summarize_ride_history, summarize_grocery_history, summarize_savings,
+    render_within_budget
+)
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# MongoDB connection with env-driven pool and timeouts (see mongo_config.py); every
+# command is timed per request and pool occupancy is exported (see metrics.py)
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+mongo_options = mongo_client_options()
+mongo_pool_listener = MongoPoolListener(metrics, mongo_options["maxPoolSize"])
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandListener(metrics), mongo_pool_listener],
+                            **mongo_options)
 db = client[os.environ['DB_NAME']]
+# History and analytics reads tolerate replication lag and may go to a secondary
+secondary_db = secondary_database(client, os.environ['DB_NAME'])
+
+# Indexes are created in the background after startup (see db_indexes.py)
+index_builder = IndexBuilder(db)
+
+# Comparison and savings inserts go through the write-behind buffer (write-through unless enabled)
+write_buffer = write_buffer_from_env(db)
+write_buffer.on_flushed("savings_records", lambda records: apply_savings(db, records))
+
+# In-memory index of active price alerts, checked against every fresh compare
+alert_evaluator = AlertEvaluator(db)
+
+# User preferences, cached in-process and written through in one round trip
+preferences_store = preferences_store_from_env(db)
+
+# Repeated AI analyses of the same quotes and preferences are served from here
+analysis_cache = analysis_cache_from_env(db)
+
+# Caches, fetch locks and rate limits that must agree across worker processes (STATE_BACKEND)
+shared_state = shared_state_from_env()
+
+# All AI endpoints share one LLM gateway (concurrency cap, per-user limits, dedup)
+llm_gateway = llm_gateway_from_env(shared_state)
+
+# Probes read dependency status from a background checker instead of querying Mongo themselves
+health_checker = health_checker_from_env()
+health_checker.register("mongo", mongo_ping_check(client))
+health_checker.register("llm_gateway", llm_gateway.health, required=False)
+
+# Mongo-backed queue for background precompute jobs; worker.py runs the workers (see jobs.py)
+job_queue = job_queue_from_env(db)
+job_workers = job_workers_from_env(job_queue)
+# One-off checks started by the startup hook, kept referenced until they finish
+startup_checks: Set[asyncio.Task] = set()
 
 # Create the main app without a prefix
 app = FastAPI(title="Comparify API", description="Price comparison app backend")
 
+@app.exception_handler(ConnectionFailure)
+@app.exception_handler(ExecutionTimeout)
+async def mongo_unavailable_handler(request: Request, exc: Exception):
+    """No server, no free pooled connection, or maxTimeMS exceeded: tell clients to retry"""
+    logger.warning(f"Mongo unavailable for {request.url.path}: {type(exc).__name__}: {str(exc)}")
+    return JSONResponse(status_code=503, content={"detail": "Database temporarily unavailable"},
+                        headers={"Retry-After": "1"})
+
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
@@ -42,14 +128,71 @@ class RideVehicleType(str, Enum):
     cab = "cab"
 
 # Data Models
+class RideQuote(BaseModel):
+    model_config = ConfigDict(extra="allow")  # Keep provider-specific fields
+
+    provider: str
+    vehicle_type: str = ""
+    estimated_fare: float
+    estimated_time: str = ""
+    eta_min_mins: Optional[float] = None  # Parsed from estimated_time
+    eta_max_mins: Optional[float] = None
+    surge_multiplier: float = 1.0
+    coupon_discount: float = 0.0
+    wallet_balance: float = 0.0
+    features: List[str] = []
+
+    @model_validator(mode="before")
+    @classmethod
+    def fill_eta_bounds(cls, data: Any) -> Any:
+        """Comparisons stored before ETA bounds existed only carry the string"""
+        return _with_eta_bounds(data, "estimated_time")
+
+class GroceryQuote(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    provider: str
+    product_name: str = ""
+    brand: Optional[str] = None
+    size: Optional[str] = None
+    price: float
+    mrp: Optional[float] = None
+    price_per_unit: Optional[float] = None
+    unit: Optional[str] = None
+    delivery_fee: float = 0.0
+    delivery_time: str = ""
+    eta_min_mins: Optional[float] = None  # Parsed from delivery_time
+    eta_max_mins: Optional[float] = None
+    discount: float = 0.0
+    rating: Optional[float] = None
+    review_count: int = 0
+    in_stock: bool = True
+    offers: List[str] = []
+
+    @model_validator(mode="before")
+    @classmethod
+    def fill_eta_bounds(cls, data: Any) -> Any:
+        return _with_eta_bounds(data, "delivery_time")
+
+def _with_eta_bounds(data: Any, eta_field: str) -> Any:
+    if isinstance(data, dict) and data.get("eta_min_mins") is None and data.get(eta_field):
+        eta_min, eta_max = parse_eta(data[eta_field])
+        data = {**data, "eta_min_mins": eta_min, "eta_max_mins": eta_max}
+    return data
+
 class RideComparison(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: Optional[str] = None
     pickup_location: str
     drop_location: str
+    pickup_coordinates: Optional[List[float]] = None  # [lat, lng]
+    drop_coordinates: Optional[List[float]] = None
+    route_key: Optional[str] = None  # Normalized "pickup|drop" route, see routes.py
     distance_km: float
     estimated_duration_mins: int
-    providers: List[Dict[str, Any]]  # Provider-specific data
+    providers: List[RideQuote]
+    provider_status: List[Dict[str, Any]] = []  # Per-provider status and latency of the fan-out
+    ranked_options: List[int] = []  # Indices into providers, best first for the user's preferences
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     best_price_provider: str
     best_time_provider: str
@@ -57,6 +200,8 @@ class RideComparison(BaseModel):
 class RideComparisonCreate(BaseModel):
     pickup_location: str
     drop_location: str
+    pickup_coordinates: Optional[List[float]] = None
+    drop_coordinates: Optional[List[float]] = None
     distance_km: float
     estimated_duration_mins: int
     user_id: Optional[str] = None
@@ -66,9 +211,12 @@ class GroceryComparison(BaseModel):
     user_id: Optional[str] = None
     product_name: str
     brand: Optional[str] = None
+    product_id: Optional[str] = None  # Catalog product, None when the name didn't resolve
     category: str
     search_query: str
-    providers: List[Dict[str, Any]]  # Provider-specific data with normalized prices
+    providers: List[GroceryQuote]
+    provider_status: List[Dict[str, Any]] = []  # Per-provider status and latency of the fan-out
+    ranked_options: List[int] = []  # Indices into providers, best first for the user's preferences
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     best_price_provider: str
     best_delivery_provider: str
@@ -76,6 +224,7 @@ class GroceryComparison(BaseModel):
 class GroceryComparisonCreate(BaseModel):
     product_name: str
     brand: Optional[str] = None
+    product_id: Optional[str] = None  # From /products/autocomplete; resolved from the name if omitted
     category: str
     search_query: str
     user_id: Optional[str] = None
@@ -97,6 +246,14 @@ class UserPreferencesCreate(BaseModel):
     notification_settings: Optional[Dict[str, bool]] = {}
     location_preferences: Optional[Dict[str, str]] = {}
 
+class SavingsRecordCreate(BaseModel):
+    user_id: str
+    comparison_type: ComparisonType
+    comparison_id: str
+    original_price: float
+    chosen_price: float
+    provider_chosen: str
+
 class SavingsRecord(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
@@ -113,233 +270,212 @@ class PriceAlert(BaseModel):
     user_id: str
     comparison_type: ComparisonType
     product_name: Optional[str] = None  # For groceries
+    product_id: Optional[str] = None  # Catalog product, matched against compare results
     route: Optional[str] = None  # For rides (pickup-drop)
+    pickup_coordinates: Optional[List[float]] = None  # [lat, lng], keyed like the compare's
+    drop_coordinates: Optional[List[float]] = None
+    route_key: Optional[str] = None  # Normalized route, matched against compare results
     target_price: float
     current_price: float
     is_active: bool = True
     created_at: datetime = Field(default_factory=datetime.utcnow)
     last_checked: datetime = Field(default_factory=datetime.utcnow)
+    triggered_at: Optional[datetime] = None
 
 class PriceAlertCreate(BaseModel):
     user_id: str
     comparison_type: ComparisonType
     product_name: Optional[str] = None
     route: Optional[str] = None
+    pickup_coordinates: Optional[List[float]] = None
+    drop_coordinates: Optional[List[float]] = None
     target_price: float
 
-# Mock data generators for development
-def generate_mock_ride_providers(pickup: str, drop: str, distance: float):
-    return [
-        {
-            "provider": "Uber",
-            "vehicle_type": "UberGo",
-            "estimated_fare": 120,
-            "estimated_time": "8-12 mins",
-            "surge_multiplier": 1.0,
-            "coupon_discount": 20,
-            "wallet_balance": 0,
-            "features": ["AC Car", "GPS Tracking", "24/7 Support"]
-        },
-        {
-            "provider": "Ola",
-            "vehicle_type": "Mini",
-            "estimated_fare": 110,
-            "estimated_time": "10-15 mins",
-            "surge_multiplier": 1.2,
-            "coupon_discount": 0,
-            "wallet_balance": 50,
-            "features": ["AC Car", "Safety Features", "Easy Cancellation"]
-        },
-        {
-            "provider": "Rapido",
-            "vehicle_type": "Bike",
-            "estimated_fare": 35,
-            "estimated_time": "12-18 mins",
-            "surge_multiplier": 1.0,
-            "coupon_discount": 0,
-            "wallet_balance": 0,
-            "features": ["Fastest Route", "Helmet Provided", "Eco-Friendly"]
-        },
-        {
-            "provider": "Namma Yatri",
-            "vehicle_type": "Auto",
-            "estimated_fare": 65,
-            "estimated_time": "15-20 mins",
-            "surge_multiplier": 1.0,
-            "coupon_discount": 0,
-            "wallet_balance": 0,
-            "features": ["Fixed Fare", "No Commission", "Local Drivers"]
-        }
-    ]
+# Keyset-paginated responses; pass next_cursor back as `cursor` to get the following page
+class RideComparisonPage(BaseModel):
+    items: List[RideComparison]
+    next_cursor: Optional[str] = None
 
-def generate_mock_grocery_providers(product_name: str):
-    return [
-        {
-            "provider": "Blinkit",
-            "product_name": product_name,
-            "brand": "India Gate",
-            "size": "5 kg",
-            "price": 520,
-            "mrp": 550,
-            "price_per_unit": 104,
-            "unit": "kg",
-            "delivery_fee": 0,
-            "delivery_time": "10-15 mins",
-            "discount": 30,
-            "rating": 4.4,
-            "review_count": 2100,
-            "in_stock": True,
-            "offers": ["First Order 10% Off", "Free Delivery"]
-        },
-        {
-            "provider": "Instamart", 
-            "product_name": product_name,
-            "brand": "India Gate",
-            "size": "5 kg",
-            "price": 540,
-            "mrp": 580,
-            "price_per_unit": 108,
-            "unit": "kg",
-            "delivery_fee": 25,
-            "delivery_time": "15-25 mins",
-            "discount": 40,
-            "rating": 4.3,
-            "review_count": 750,
-            "in_stock": True,
-            "offers": ["Weekend Special", "Bulk Order Discount"]
-        },
-        {
-            "provider": "Zepto",
-            "product_name": product_name,
-            "brand": "India Gate", 
-            "size": "5 kg",
-            "price": 535,
-            "mrp": 550,
-            "price_per_unit": 107,
-            "unit": "kg",
-            "delivery_fee": 0,
-            "delivery_time": "8-12 mins",
-            "discount": 15,
-            "rating": 4.5,
-            "review_count": 890,
-            "in_stock": True,
-            "offers": ["Free Delivery", "Express Delivery"]
-        },
-        {
-            "provider": "BigBasket",
-            "product_name": product_name,
-            "brand": "India Gate",
-            "size": "5 kg", 
-            "price": 510,
-            "mrp": 600,
-            "price_per_unit": 102,
-            "unit": "kg",
-            "delivery_fee": 40,
-            "delivery_time": "2-4 hours",
-            "discount": 90,
-            "rating": 4.2,
-            "review_count": 1580,
-            "in_stock": True,
-            "offers": ["Buy 2 Get 5% Off", "Free Delivery above ₹200"]
-        }
-    ]
+class GroceryComparisonPage(BaseModel):
+    items: List[GroceryComparison]
+    next_cursor: Optional[str] = None
+
+class SavingsRecordPage(BaseModel):
+    items: List[SavingsRecord]
+    next_cursor: Optional[str] = None
+
+# Read endpoints return stored documents directly (see fast_json.py)
+ride_comparison_reader = ReadSerializer(RideComparison)
+grocery_comparison_reader = ReadSerializer(GroceryComparison)
+savings_record_reader = ReadSerializer(SavingsRecord)
+price_alert_reader = ReadSerializer(PriceAlert)
 
 # API Routes
 @api_router.get("/")
 async def root():
     return {"message": "Comparify API - Save money on rides & groceries"}
 
+async def fetch_quotes(comparison_type: str, key: str, query: Dict[str, Any]):
+    """Fan out to the registered adapters and parse their quotes once; the quote cache keeps the parsed form"""
+    providers, provider_status = await fan_out(provider_registry.adapters(comparison_type), query)
+    quotes = parse_quotes(comparison_type, providers)
+    # Only fresh quotes go into the price history; cache hits would repeat them. Until the
+    # time-series collection exists an insert would create a plain price_points collection
+    if quotes and index_builder.collections_ready:
+        try:
+            await write_buffer.write_many("price_points", price_points(comparison_type, key, quotes))
+        except Exception as e:
+            logger.error(f"Failed to record price points: {str(e)}")
+    return quotes, provider_status
+
+def encode_quotes(result) -> bytes:
+    quotes, provider_status = result
+    return json.dumps({"quotes": [quote.to_dict() for quote in quotes], "provider_status": provider_status}).encode()
+
+def decode_quotes(comparison_type: str, encoded: bytes):
+    result = json.loads(encoded)
+    return parse_quotes(comparison_type, result["quotes"]), result["provider_status"]
+
+if shared_state.shared:
+    quote_cache.use_shared(shared_state, encode_quotes, decode_quotes,
+                           lock_seconds=float(os.environ.get('QUOTE_CACHE_LOCK_SECONDS', '5')))
+
+async def load_ranking_preferences(user_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Preferred providers and budget limits used to rank compare results (usually from the cache)"""
+    if not user_id:
+        return None
+    return await preferences_store.get(user_id)
+
 # Ride comparison endpoints
 @api_router.post("/rides/compare", response_model=RideComparison)
 async def compare_rides(comparison_data: RideComparisonCreate):
     """Compare ride prices across multiple providers"""
-    providers = generate_mock_ride_providers(
-        comparison_data.pickup_location, 
+    route_key = route_normalizer.route_key(
+        comparison_data.pickup_location,
         comparison_data.drop_location,
-        comparison_data.distance_km
+        comparison_data.pickup_coordinates,
+        comparison_data.drop_coordinates
     )
+    cache_key = ride_cache_key(route_key, comparison_data.distance_km)
+    quotes, provider_status = await quote_cache.get_or_fetch(
+        "ride",
+        cache_key,
+        lambda: fetch_quotes("ride", route_key, comparison_data.dict()),
+        should_cache=lambda result: bool(result[0])
+    )
+    if not quotes:
+        raise HTTPException(status_code=503, detail="No ride providers returned quotes")
     
     # Find best options
-    best_price = min(providers, key=lambda x: x["estimated_fare"] - x["coupon_discount"] - x["wallet_balance"])
-    best_time = min(providers, key=lambda x: int(x["estimated_time"].split("-")[0]))
+    table = ride_table(quotes)
+    best_price_row = table.best("price")
+    preferences = await load_ranking_preferences(comparison_data.user_id)
     
     comparison = RideComparison(
         **comparison_data.dict(),
-        providers=providers,
-        best_price_provider=best_price["provider"],
-        best_time_provider=best_time["provider"]
+        route_key=route_key,
+        providers=[quote.to_dict() for quote in quotes],
+        provider_status=provider_status,
+        ranked_options=rank_providers(table, "ride", preferences),
+        best_price_provider=quotes[best_price_row].provider,
+        best_time_provider=quotes[table.best("eta_min")].provider
     )
     
     # Save to database
-    await db.ride_comparisons.insert_one(comparison.dict())
+    await write_buffer.write("ride_comparisons", comparison.dict())
+    alert_evaluator.check("ride", route_key, quotes[best_price_row].effective_fare)
     return comparison
 
-@api_router.get("/rides/history", response_model=List[RideComparison])
-async def get_ride_history(user_id: Optional[str] = None, limit: int = 20):
-    """Get ride comparison history"""
+@api_router.get("/rides/history", response_model=RideComparisonPage)
+async def get_ride_history(user_id: Optional[str] = None, route_key: Optional[str] = None, limit: int = 20, cursor: Optional[str] = None):
+    """Get ride comparison history, optionally for one normalized route"""
     query = {"user_id": user_id} if user_id else {}
-    comparisons = await db.ride_comparisons.find(query).limit(limit).sort("timestamp", -1).to_list(limit)
-    return [RideComparison(**comp) for comp in comparisons]
+    if route_key:
+        query["route_key"] = route_key
+    try:
+        comparisons, next_cursor = await fetch_page(secondary_db.ride_comparisons, query, cursor, limit,
+                                                    ride_comparison_reader.projection, QUERY_MAX_TIME_MS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse({"items": ride_comparison_reader.prepare(comparisons), "next_cursor": next_cursor})
 
 # Grocery comparison endpoints
 @api_router.post("/groceries/compare", response_model=GroceryComparison)
 async def compare_groceries(comparison_data: GroceryComparisonCreate):
     """Compare grocery prices across multiple providers"""
-    providers = generate_mock_grocery_providers(comparison_data.product_name)
+    product_id = resolve_product_id(comparison_data.product_name, comparison_data.brand, comparison_data.product_id)
+    key = product_key(product_id, comparison_data.product_name)
+    cache_key = grocery_cache_key(
+        key,
+        None if product_id else comparison_data.brand,
+        comparison_data.category
+    )
+    quotes, provider_status = await quote_cache.get_or_fetch(
+        "grocery",
+        cache_key,
+        lambda: fetch_quotes("grocery", key, comparison_data.dict()),
+        should_cache=lambda result: bool(result[0])
+    )
+    if not quotes:
+        raise HTTPException(status_code=503, detail="No grocery providers returned quotes")
     
     # Find best options
-    best_price = min(providers, key=lambda x: x["price"] + x["delivery_fee"])
-    best_delivery = min(providers, key=lambda x: int(x["delivery_time"].split("-")[0]))
+    table = grocery_table(quotes)
+    best_price_row = table.best("price")
+    preferences = await load_ranking_preferences(comparison_data.user_id)
     
     comparison = GroceryComparison(
-        **comparison_data.dict(),
-        providers=providers,
-        best_price_provider=best_price["provider"],
-        best_delivery_provider=best_delivery["provider"]
+        **{**comparison_data.dict(), "product_id": product_id},
+        providers=[quote.to_dict() for quote in quotes],
+        provider_status=provider_status,
+        ranked_options=rank_providers(table, "grocery", preferences),
+        best_price_provider=quotes[best_price_row].provider,
+        best_delivery_provider=quotes[table.best("eta_min")].provider
     )
     
     # Save to database
-    await db.grocery_comparisons.insert_one(comparison.dict())
+    await write_buffer.write("grocery_comparisons", comparison.dict())
+    alert_evaluator.check("grocery", key, quotes[best_price_row].total_price)
     return comparison
 
-@api_router.get("/groceries/history", response_model=List[GroceryComparison])
-async def get_grocery_history(user_id: Optional[str] = None, limit: int = 20):
-    """Get grocery comparison history"""
+@api_router.get("/groceries/history", response_model=GroceryComparisonPage)
+async def get_grocery_history(user_id: Optional[str] = None, product_id: Optional[str] = None, limit: int = 20, cursor: Optional[str] = None):
+    """Get grocery comparison history, optionally for one catalog product"""
     query = {"user_id": user_id} if user_id else {}
-    comparisons = await db.grocery_comparisons.find(query).limit(limit).sort("timestamp", -1).to_list(limit)
-    return [GroceryComparison(**comp) for comp in comparisons]
+    if product_id:
+        query["product_id"] = product_id
+    try:
+        comparisons, next_cursor = await fetch_page(secondary_db.grocery_comparisons, query, cursor, limit,
+                                                    grocery_comparison_reader.projection, QUERY_MAX_TIME_MS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse({"items": grocery_comparison_reader.prepare(comparisons), "next_cursor": next_cursor})
+
+@api_router.get("/products/autocomplete")
+async def autocomplete_products(q: str, limit: int = 10):
+    """Typeahead over the product catalog, most popular matches first"""
+    if limit < 1 or limit > MAX_SUGGESTIONS:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_SUGGESTIONS}")
+    return FastJSONResponse(product_catalog.autocomplete(q, limit))
 
 # User preferences endpoints
 @api_router.post("/user/preferences", response_model=UserPreferences)
 async def create_user_preferences(preferences: UserPreferencesCreate):
     """Create or update user preferences"""
-    existing = await db.user_preferences.find_one({"user_id": preferences.user_id})
-    
-    if existing:
-        # Update existing preferences
-        update_data = preferences.dict()
-        update_data["updated_at"] = datetime.utcnow()
-        await db.user_preferences.update_one(
-            {"user_id": preferences.user_id},
-            {"$set": update_data}
-        )
-        updated = await db.user_preferences.find_one({"user_id": preferences.user_id})
-        return UserPreferences(**updated)
-    else:
-        # Create new preferences
-        new_preferences = UserPreferences(**preferences.dict())
-        await db.user_preferences.insert_one(new_preferences.dict())
-        return new_preferences
+    stored = await preferences_store.upsert(preferences.user_id, preferences.dict())
+    return UserPreferences(**stored)
 
 @api_router.get("/user/preferences/{user_id}", response_model=UserPreferences)
 async def get_user_preferences(user_id: str):
     """Get user preferences"""
-    preferences = await db.user_preferences.find_one({"user_id": user_id})
+    preferences = await preferences_store.get(user_id)
     if not preferences:
         raise HTTPException(status_code=404, detail="User preferences not found")
     return UserPreferences(**preferences)
 
 # Savings tracking endpoints
+MAX_SAVINGS_BATCH = 1000
+
 @api_router.post("/savings/record", response_model=SavingsRecord)
 async def record_savings(
     user_id: str,
@@ -362,41 +498,39 @@ async def record_savings(
         provider_chosen=provider_chosen
     )
     
-    await db.savings_records.insert_one(savings_record.dict())
+    await write_buffer.write("savings_records", savings_record.dict())
     return savings_record
 
-@api_router.get("/savings/user/{user_id}", response_model=List[SavingsRecord])
-async def get_user_savings(user_id: str, limit: int = 50):
+@api_router.post("/savings/record/batch", response_model=List[SavingsRecord])
+async def record_savings_batch(records: List[SavingsRecordCreate]):
+    """Record many savings transactions in one request"""
+    if len(records) > MAX_SAVINGS_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SAVINGS_BATCH} records per batch")
+    if not records:
+        return []
+
+    savings_records = [
+        SavingsRecord(**record.dict(), savings_amount=record.original_price - record.chosen_price)
+        for record in records
+    ]
+    await write_buffer.write_many("savings_records", [record.dict() for record in savings_records])
+    return savings_records
+
+@api_router.get("/savings/user/{user_id}", response_model=SavingsRecordPage)
+async def get_user_savings(user_id: str, limit: int = 50, cursor: Optional[str] = None):
     """Get user's savings history"""
-    savings = await db.savings_records.find({"user_id": user_id}).limit(limit).sort("timestamp", -1).to_list(limit)
-    return [SavingsRecord(**record) for record in savings]
+    try:
+        savings, next_cursor = await fetch_page(secondary_db.savings_records, {"user_id": user_id}, cursor, limit,
+                                                savings_record_reader.projection, QUERY_MAX_TIME_MS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse({"items": savings_record_reader.prepare(savings), "next_cursor": next_cursor})
 
 @api_router.get("/savings/summary/{user_id}")
-async def get_savings_summary(user_id: str):
-    """Get user's savings summary statistics"""
-    pipeline = [
-        {"$match": {"user_id": user_id}},
-        {"$group": {
-            "_id": None,
-            "total_savings": {"$sum": "$savings_amount"},
-            "total_transactions": {"$sum": 1},
-            "avg_savings": {"$avg": "$savings_amount"},
-            "ride_savings": {"$sum": {"$cond": [{"$eq": ["$comparison_type", "ride"]}, "$savings_amount", 0]}},
-            "grocery_savings": {"$sum": {"$cond": [{"$eq": ["$comparison_type", "grocery"]}, "$savings_amount", 0]}}
-        }}
-    ]
-    
-    result = await db.savings_records.aggregate(pipeline).to_list(1)
-    if not result:
-        return {
-            "total_savings": 0,
-            "total_transactions": 0,
-            "avg_savings": 0,
-            "ride_savings": 0,
-            "grocery_savings": 0
-        }
-    
-    return result[0]
+async def get_savings_summary(user_id: str, period: str = ALL_TIME):
+    """Get user's savings summary statistics (all time, or a YYYY-MM period)"""
+    rollup = await db.savings_rollups.find_one({"user_id": user_id, "period": period})
+    return summary_from_rollup(rollup)
 
 # Price alerts endpoints
 @api_router.post("/alerts", response_model=PriceAlert)
@@ -405,12 +539,22 @@ async def create_price_alert(alert_data: PriceAlertCreate):
     # Get current price based on comparison type
     current_price = 0.0  # Would be fetched from real providers
     
+    route_key = product_id = None
+    if alert_data.comparison_type == ComparisonType.ride and alert_data.route:
+        route_key = route_normalizer.route_key_from_route(alert_data.route, alert_data.pickup_coordinates,
+                                                          alert_data.drop_coordinates)
+    elif alert_data.comparison_type == ComparisonType.grocery and alert_data.product_name:
+        product_id = resolve_product_id(alert_data.product_name)
+    
     alert = PriceAlert(
         **alert_data.dict(),
+        route_key=route_key,
+        product_id=product_id,
         current_price=current_price
     )
     
     await db.price_alerts.insert_one(alert.dict())
+    alert_evaluator.index.add(alert.dict())
     return alert
 
 @api_router.get("/alerts/user/{user_id}", response_model=List[PriceAlert])
@@ -420,73 +564,123 @@ async def get_user_alerts(user_id: str, active_only: bool = True):
     if active_only:
         query["is_active"] = True
         
-    alerts = await db.price_alerts.find(query).sort("created_at", -1).to_list(100)
-    return [PriceAlert(**alert) for alert in alerts]
+    alerts = await db.price_alerts.find(query, price_alert_reader.projection).sort("created_at", -1).to_list(100)
+    return FastJSONResponse(price_alert_reader.prepare(alerts))
 
 @api_router.delete("/alerts/{alert_id}")
 async def delete_price_alert(alert_id: str):
     """Delete a price alert"""
-    result = await db.price_alerts.delete_one({"id": alert_id})
-    if result.deleted_count == 0:
+    if not await alert_evaluator.delete(alert_id):
         raise HTTPException(status_code=404, detail="Alert not found")
     return {"message": "Alert deleted successfully"}
 
 # Analytics endpoints
+analytics_refresher = AnalyticsRefresher(db)
+
 @api_router.get("/analytics/popular-routes")
-async def get_popular_routes(limit: int = 10):
-    """Get most popular ride routes"""
-    pipeline = [
-        {"$group": {
-            "_id": {"pickup": "$pickup_location", "drop": "$drop_location"},
-            "count": {"$sum": 1},
-            "avg_distance": {"$avg": "$distance_km"},
-            "most_chosen_provider": {"$first": "$best_price_provider"}
-        }},
-        {"$sort": {"count": -1}},
-        {"$limit": limit}
-    ]
-    
-    results = await db.ride_comparisons.aggregate(pipeline).to_list(limit)
-    return results
+async def get_popular_routes(limit: int = 10, window: str = "all"):
+    """Get most popular ride routes (window: 24h, 7d or all)"""
+    if window not in WINDOWS:
+        raise HTTPException(status_code=400, detail=f"window must be one of {', '.join(WINDOWS)}")
+    return await read_popular(secondary_db, "routes", window, limit)
 
 @api_router.get("/analytics/popular-products")
-async def get_popular_products(limit: int = 10):
-    """Get most compared grocery products"""
-    pipeline = [
-        {"$group": {
-            "_id": "$product_name",
-            "count": {"$sum": 1},
-            "avg_savings": {"$avg": {"$subtract": [
-                {"$arrayElemAt": [{"$map": {"input": "$providers", "as": "p", "in": "$$p.price"}}, 0]},
-                {"$min": {"$map": {"input": "$providers", "as": "p", "in": "$$p.price"}}}
-            ]}},
-            "most_chosen_provider": {"$first": "$best_price_provider"}
-        }},
-        {"$sort": {"count": -1}},
-        {"$limit": limit}
-    ]
-    
-    results = await db.grocery_comparisons.aggregate(pipeline).to_list(limit)
-    return results
+async def get_popular_products(limit: int = 10, window: str = "all"):
+    """Get most compared grocery products (window: 24h, 7d or all)"""
+    if window not in WINDOWS:
+        raise HTTPException(status_code=400, detail=f"window must be one of {', '.join(WINDOWS)}")
+    return await read_popular(secondary_db, "products", window, limit)
+
+# Price history endpoints
+price_rollups = PriceRollups(db, read_db=secondary_db)
+
+@api_router.get("/prices/history")
+async def get_price_history(comparison_type: ComparisonType, key: str, provider: Optional[str] = None,
+                            start: Optional[datetime] = None, end: Optional[datetime] = None,
+                            resolution: str = "auto"):
+    """Per-provider min/avg/max prices for a route_key or product key (resolution: auto, hour or day)"""
+    end = end or datetime.utcnow()
+    start = start or end - DEFAULT_RANGE
+    try:
+        return await price_rollups.history(comparison_type.value, key, provider, start, end, resolution)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Export endpoints
+@api_router.get("/export/{user_id}")
+async def export_user_history(user_id: str, format: str = "ndjson", types: Optional[str] = None):
+    """Stream a user's full comparison and savings history as NDJSON or CSV"""
+    record_types = types.split(",") if types else list(EXPORT_SOURCES)
+    unknown = [record_type for record_type in record_types if record_type not in EXPORT_SOURCES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown record types: {', '.join(unknown)}")
+
+    if format == "ndjson":
+        stream, media_type = ndjson_stream(db, user_id, record_types), "application/x-ndjson"
+    elif format == "csv":
+        stream, media_type = csv_stream(db, user_id, record_types), "text/csv"
+    else:
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+
+    return StreamingResponse(
+        stream,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="comparify_{user_id}.{format}"'}
+    )
 
 # Health check and utility endpoints
 @api_router.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    try:
-        # Test database connection
-        await db.list_collection_names()
-        return {"status": "healthy", "timestamp": datetime.utcnow()}
-    except Exception as e:
-        raise HTTPException(status_code=503, detail=f"Database connection failed: {str(e)}")
+    """Health check endpoint (from the background checker's last Mongo ping)"""
+    mongo = health_checker.report()["dependencies"]["mongo"]
+    if mongo["status"] != "ok":
+        raise HTTPException(status_code=503, detail=f"Database connection failed: {mongo.get('error', mongo['status'])}")
+    return {"status": "healthy", "timestamp": datetime.utcnow()}
+
+@api_router.get("/health/live")
+async def liveness():
+    """Liveness probe: no I/O, answers whenever the event loop does"""
+    return {"status": "alive"}
+
+@api_router.get("/health/ready")
+async def readiness():
+    """Readiness probe: cached dependency status and latencies; 503 until required dependencies are up"""
+    report = health_checker.report()
+    return JSONResponse(status_code=200 if report["status"] == "ready" else 503, content=jsonable_encoder(report))
+
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    """Get quote, AI analysis and preferences cache hit/miss counters"""
+    return {"quote_cache": quote_cache.stats(), "analysis_cache": analysis_cache.stats(),
+            "preferences_cache": preferences_store.stats()}
+
+@api_router.get("/write-buffer/stats")
+async def get_write_buffer_stats():
+    """Get write-behind buffer queue depth, flush latency and failed/dropped writes"""
+    return write_buffer.stats()
+
+@api_router.get("/ai/gateway/stats")
+async def get_llm_gateway_stats():
+    """Get LLM gateway concurrency, queue depth and shed/rate-limited counters"""
+    return llm_gateway.stats()
+
+@api_router.get("/alerts/stats")
+async def get_alert_stats():
+    """Get indexed/triggered price alert counters"""
+    return alert_evaluator.stats()
+
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Request, Mongo and LLM metrics plus component stats, in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 # Get supported providers list
 @api_router.get("/providers")
 async def get_supported_providers():
     """Get list of supported providers"""
     return {
-        "ride_providers": ["Uber", "Ola", "Rapido", "Namma Yatri"],
-        "grocery_providers": ["Blinkit", "Instamart", "Zepto", "BigBasket"],
+        "ride_providers": provider_registry.names("ride"),
+        "grocery_providers": provider_registry.names("grocery"),
         "coming_soon": {
             "pharmacy": ["1mg", "Netmeds", "Apollo"],
             "food": ["Swiggy", "Zomato", "Uber Eats"]
@@ -494,26 +688,17 @@ async def get_supported_providers():
     }
 
 # AI-powered analysis endpoints
-@api_router.post("/ai/analyze-ride-comparison")
-async def analyze_ride_comparison(comparison_id: str, user_preferences: Optional[Dict] = None):
-    """Generate AI-powered analysis and recommendations for ride comparison"""
+async def ask_llm(session_id: str, system_message: str, prompt: str, user_id: Optional[str] = None) -> str:
+    """Send a prompt through the shared LLM gateway, mapping refusals to 429"""
     try:
-        # Get the comparison data
-        comparison = await db.ride_comparisons.find_one({"id": comparison_id})
-        if not comparison:
-            raise HTTPException(status_code=404, detail="Comparison not found")
-        
-        # Initialize LLM chat
-        llm_key = os.environ.get('EMERGENT_LLM_KEY')
-        chat = LlmChat(
-            api_key=llm_key,
-            session_id=f"ride_analysis_{comparison_id}",
-            system_message="You are a smart transportation advisor specializing in cost-effective and efficient travel recommendations. Analyze ride comparison data and provide actionable insights."
-        ).with_model("openai", "gpt-4o-mini")
-        
-        # Prepare analysis prompt
-        providers_data = comparison['providers']
-        analysis_prompt = f"""
+        return await llm_gateway.complete(session_id, system_message, prompt, user_id=user_id)
+    except LlmGatewayError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(max(1, round(e.retry_after)))})
+
+def ride_analysis_request(comparison: Dict[str, Any], user_preferences: Optional[Dict]) -> Dict[str, Any]:
+    """LLM session, prompt and cache key for a ride comparison analysis"""
+    providers_data = comparison['providers']
+    analysis_prompt = f"""
         Analyze this ride comparison for the route from {comparison['pickup_location']} to {comparison['drop_location']} (Distance: {comparison['distance_km']} km):
 
         PROVIDERS DATA:
@@ -531,53 +716,25 @@ async def analyze_ride_comparison(comparison_id: str, user_preferences: Optional
         Format your response as a JSON object with these keys: recommendation, cost_insights, time_analysis, saving_tips, market_insights.
         Keep recommendations practical and user-friendly.
         """
-        
-        # Get AI analysis
-        user_message = UserMessage(text=analysis_prompt)
-        ai_response = await chat.send_message(user_message)
-        
-        # Store the analysis
-        analysis_record = {
-            "id": str(uuid.uuid4()),
-            "comparison_id": comparison_id,
-            "comparison_type": "ride",
-            "ai_analysis": ai_response,
-            "user_preferences": user_preferences,
-            "timestamp": datetime.utcnow()
-        }
-        await db.ai_analyses.insert_one(analysis_record)
-        
-        return {
-            "analysis_id": analysis_record["id"],
-            "comparison_id": comparison_id,
-            "ai_recommendations": ai_response,
-            "timestamp": analysis_record["timestamp"]
-        }
-        
-    except Exception as e:
-        logger.error(f"AI analysis error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"AI analysis failed: {str(e)}")
+    return {
+        "comparison_type": "ride",
+        "session_id": f"ride_analysis_{comparison['id']}",
+        "system_message": "You are a smart transportation advisor specializing in cost-effective and efficient travel recommendations. Analyze ride comparison data and provide actionable insights.",
+        "prompt": analysis_prompt,
+        "user_id": comparison.get("user_id"),
+        # Same route, quotes and preferences -> same analysis
+        "cache_key": analysis_cache_key(
+            "analyze-ride-comparison",
+            {key: comparison[key] for key in ("pickup_location", "drop_location", "distance_km", "providers")},
+            user_preferences
+        ),
+        "context": {"user_preferences": user_preferences}
+    }
 
-@api_router.post("/ai/analyze-grocery-comparison")
-async def analyze_grocery_comparison(comparison_id: str, shopping_context: Optional[Dict] = None):
-    """Generate AI-powered analysis and recommendations for grocery comparison"""
-    try:
-        # Get the comparison data
-        comparison = await db.grocery_comparisons.find_one({"id": comparison_id})
-        if not comparison:
-            raise HTTPException(status_code=404, detail="Comparison not found")
-        
-        # Initialize LLM chat
-        llm_key = os.environ.get('EMERGENT_LLM_KEY')
-        chat = LlmChat(
-            api_key=llm_key,
-            session_id=f"grocery_analysis_{comparison_id}",
-            system_message="You are an expert grocery shopping advisor. Analyze product comparisons focusing on value, quality, and smart shopping strategies."
-        ).with_model("openai", "gpt-4o-mini")
-        
-        # Prepare analysis prompt
-        providers_data = comparison['providers']
-        analysis_prompt = f"""
+def grocery_analysis_request(comparison: Dict[str, Any], shopping_context: Optional[Dict]) -> Dict[str, Any]:
+    """LLM session, prompt and cache key for a grocery comparison analysis"""
+    providers_data = comparison['providers']
+    analysis_prompt = f"""
         Analyze this grocery comparison for {comparison['product_name']} from {comparison.get('brand', 'various')} brands:
 
         PROVIDERS DATA:
@@ -596,101 +753,332 @@ async def analyze_grocery_comparison(comparison_id: str, shopping_context: Optio
         Format response as JSON with keys: best_pick, unit_analysis, delivery_insights, bulk_advice, quality_notes, saving_strategies.
         Focus on practical, actionable shopping advice.
         """
+    return {
+        "comparison_type": "grocery",
+        "session_id": f"grocery_analysis_{comparison['id']}",
+        "system_message": "You are an expert grocery shopping advisor. Analyze product comparisons focusing on value, quality, and smart shopping strategies.",
+        "prompt": analysis_prompt,
+        "user_id": comparison.get("user_id"),
+        # Same product, quotes and shopping context -> same analysis
+        "cache_key": analysis_cache_key(
+            "analyze-grocery-comparison",
+            {key: comparison.get(key) for key in ("product_name", "brand", "providers")},
+            shopping_context
+        ),
+        "context": {"shopping_context": shopping_context}
+    }
+
+async def cached_analysis(analysis: Dict[str, Any], bypass_cache: bool) -> Optional[Dict[str, Any]]:
+    if bypass_cache:
+        analysis_cache.bypassed += 1
+        return None
+    return await analysis_cache.get(analysis["cache_key"])
+
+async def store_analysis(comparison_id: str, analysis: Dict[str, Any], ai_response: str) -> Dict[str, Any]:
+    """Persist a fresh analysis and make it available to the cache"""
+    analysis_record = {
+        "id": str(uuid.uuid4()),
+        "comparison_id": comparison_id,
+        "comparison_type": analysis["comparison_type"],
+        "ai_analysis": ai_response,
+        **analysis["context"],
+        "cache_key": analysis["cache_key"],
+        "timestamp": datetime.utcnow()
+    }
+    await db.ai_analyses.insert_one(analysis_record)
+    analysis_cache.put(analysis["cache_key"], analysis_record)
+    return analysis_record
+
+def analysis_response(comparison_id: str, analysis_record: Dict[str, Any], cached: bool) -> Dict[str, Any]:
+    return {
+        "analysis_id": analysis_record["id"],
+        "comparison_id": comparison_id,
+        "ai_recommendations": analysis_record["ai_analysis"],
+        "timestamp": analysis_record["timestamp"],
+        "cached": cached
+    }
+
+@api_router.post("/ai/analyze-ride-comparison")
+async def analyze_ride_comparison(comparison_id: str, user_preferences: Optional[Dict] = None, bypass_cache: bool = False):
+    """Generate AI-powered analysis and recommendations for ride comparison"""
+    try:
+        # Get the comparison data
+        comparison = await db.ride_comparisons.find_one({"id": comparison_id})
+        if not comparison:
+            raise HTTPException(status_code=404, detail="Comparison not found")
+        
+        analysis = ride_analysis_request(comparison, user_preferences)
+        cached = await cached_analysis(analysis, bypass_cache)
+        if cached:
+            return analysis_response(comparison_id, cached, cached=True)
         
         # Get AI analysis
-        user_message = UserMessage(text=analysis_prompt)
-        ai_response = await chat.send_message(user_message)
+        ai_response = await ask_llm(analysis["session_id"], analysis["system_message"], analysis["prompt"], user_id=analysis["user_id"])
         
         # Store the analysis
-        analysis_record = {
-            "id": str(uuid.uuid4()),
-            "comparison_id": comparison_id,
-            "comparison_type": "grocery",
-            "ai_analysis": ai_response,
-            "shopping_context": shopping_context,
-            "timestamp": datetime.utcnow()
-        }
-        await db.ai_analyses.insert_one(analysis_record)
-        
-        return {
-            "analysis_id": analysis_record["id"],
-            "comparison_id": comparison_id,
-            "ai_recommendations": ai_response,
-            "timestamp": analysis_record["timestamp"]
-        }
+        analysis_record = await store_analysis(comparison_id, analysis, ai_response)
+        return analysis_response(comparison_id, analysis_record, cached=False)
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"AI grocery analysis error: {str(e)}")
+        logger.error(f"AI analysis error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"AI analysis failed: {str(e)}")
 
-@api_router.post("/ai/personalized-recommendations")
-async def get_personalized_recommendations(user_id: str, comparison_type: ComparisonType):
-    """Generate personalized recommendations based on user's comparison history"""
+@api_router.post("/ai/analyze-grocery-comparison")
+async def analyze_grocery_comparison(comparison_id: str, shopping_context: Optional[Dict] = None, bypass_cache: bool = False):
+    """Generate AI-powered analysis and recommendations for grocery comparison"""
     try:
-        # Get user's comparison history
-        if comparison_type == ComparisonType.ride:
-            history = await db.ride_comparisons.find({"user_id": user_id}).limit(10).sort("timestamp", -1).to_list(10)
-        else:
-            history = await db.grocery_comparisons.find({"user_id": user_id}).limit(10).sort("timestamp", -1).to_list(10)
+        # Get the comparison data
+        comparison = await db.grocery_comparisons.find_one({"id": comparison_id})
+        if not comparison:
+            raise HTTPException(status_code=404, detail="Comparison not found")
         
-        if not history:
-            return {"message": "No comparison history found for personalized recommendations"}
+        analysis = grocery_analysis_request(comparison, shopping_context)
+        cached = await cached_analysis(analysis, bypass_cache)
+        if cached:
+            return analysis_response(comparison_id, cached, cached=True)
         
-        # Get user preferences
-        preferences = await db.user_preferences.find_one({"user_id": user_id})
+        # Get AI analysis
+        ai_response = await ask_llm(analysis["session_id"], analysis["system_message"], analysis["prompt"], user_id=analysis["user_id"])
         
-        # Initialize LLM chat
-        llm_key = os.environ.get('EMERGENT_LLM_KEY')
-        chat = LlmChat(
-            api_key=llm_key,
-            session_id=f"personalized_{user_id}_{comparison_type}",
-            system_message="You are a personal finance and shopping advisor. Analyze user behavior patterns to provide personalized money-saving recommendations."
-        ).with_model("openai", "gpt-4o-mini")
+        # Store the analysis
+        analysis_record = await store_analysis(comparison_id, analysis, ai_response)
+        return analysis_response(comparison_id, analysis_record, cached=False)
         
-        # Prepare personalization prompt
-        recommendations_prompt = f"""
-        Analyze this user's {comparison_type} comparison history and provide personalized recommendations:
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"AI grocery analysis error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"AI analysis failed: {str(e)}")
 
-        COMPARISON HISTORY (last 10):
-        {history}
+# Streaming (SSE) variants of the analysis endpoints
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
 
-        USER PREFERENCES:
-        {preferences or 'No preferences set'}
+async def _single_chunk(text: str):
+    yield text
 
-        Based on the patterns, provide:
-        1. SPENDING PATTERNS: Key insights about their choices
-        2. SAVINGS OPPORTUNITIES: Specific ways they can save more money
-        3. PROVIDER RECOMMENDATIONS: Which providers work best for their needs
-        4. BEHAVIORAL INSIGHTS: Patterns in their decision-making
-        5. PERSONALIZED TIPS: Custom advice based on their usage
+async def stream_analysis(request: Request, comparison_id: str, analysis: Dict[str, Any], bypass_cache: bool) -> StreamingResponse:
+    """Forward analysis chunks as `delta` events, then persist and send a final `done` event"""
+    cached = await cached_analysis(analysis, bypass_cache)
+    if cached:
+        chunks = _single_chunk(cached["ai_analysis"])
+    else:
+        try:
+            chunks = await llm_gateway.stream(analysis["session_id"], analysis["system_message"], analysis["prompt"], user_id=analysis["user_id"])
+        except LlmGatewayError as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(max(1, round(e.retry_after)))})
 
-        Format as JSON with keys: spending_patterns, savings_opportunities, provider_recommendations, behavioral_insights, personalized_tips.
-        Make recommendations specific and actionable.
-        """
-        
-        # Get AI recommendations
-        user_message = UserMessage(text=recommendations_prompt)
-        ai_response = await chat.send_message(user_message)
-        
-        # Store personalized insights
-        insights_record = {
-            "id": str(uuid.uuid4()),
-            "user_id": user_id,
-            "comparison_type": comparison_type,
-            "personalized_insights": ai_response,
-            "based_on_comparisons": len(history),
-            "timestamp": datetime.utcnow()
-        }
-        await db.personalized_insights.insert_one(insights_record)
+    async def events():
+        parts = []
+        try:
+            async for chunk in chunks:
+                if await request.is_disconnected():
+                    # Client went away: stop here; closing `chunks` cancels the upstream call
+                    return
+                parts.append(chunk)
+                yield sse_event("delta", {"text": chunk})
+            analysis_record = cached or await store_analysis(comparison_id, analysis, "".join(parts))
+            yield sse_event("done", analysis_response(comparison_id, analysis_record, cached=bool(cached)))
+        except Exception as e:
+            logger.error(f"AI analysis stream error: {str(e)}")
+            yield sse_event("error", {"detail": f"AI analysis failed: {str(e)}"})
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.post("/ai/analyze-ride-comparison/stream")
+async def stream_ride_comparison_analysis(request: Request, comparison_id: str, user_preferences: Optional[Dict] = None, bypass_cache: bool = False):
+    """Stream AI analysis of a ride comparison as server-sent events"""
+    comparison = await db.ride_comparisons.find_one({"id": comparison_id})
+    if not comparison:
+        raise HTTPException(status_code=404, detail="Comparison not found")
+    return await stream_analysis(request, comparison_id, ride_analysis_request(comparison, user_preferences), bypass_cache)
+
+@api_router.post("/ai/analyze-grocery-comparison/stream")
+async def stream_grocery_comparison_analysis(request: Request, comparison_id: str, shopping_context: Optional[Dict] = None, bypass_cache: bool = False):
+    """Stream AI analysis of a grocery comparison as server-sent events"""
+    comparison = await db.grocery_comparisons.find_one({"id": comparison_id})
+    if not comparison:
+        raise HTTPException(status_code=404, detail="Comparison not found")
+    return await stream_analysis(request, comparison_id, grocery_analysis_request(comparison, shopping_context), bypass_cache)
+
+# Personalized insights and smart alerts are precomputed by background jobs (see jobs.py);
+# the endpoints serve the stored result and enqueue a refresh once it goes stale
+INSIGHTS_FRESH_SECONDS = float(os.environ.get('INSIGHTS_FRESH_SECONDS', '86400'))
+
+async def compute_personalized_insights(user_id: str, comparison_type: str, rate_limit_user: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Generate and store personalized insights; None when the user has no history"""
+    # Get user's comparison history, projected to the fields the summary needs
+    if comparison_type == ComparisonType.ride:
+        history = await db.ride_comparisons.find({"user_id": user_id}, RIDE_HISTORY_PROJECTION).limit(10).sort("timestamp", -1).to_list(10)
+        history_summary = summarize_ride_history(history)
+    else:
+        history = await db.grocery_comparisons.find({"user_id": user_id}, GROCERY_HISTORY_PROJECTION).limit(10).sort("timestamp", -1).to_list(10)
+        history_summary = summarize_grocery_history(history)
+    
+    if not history:
+        return None
+    
+    # Get user preferences, only the fields the prompt renders
+    preferences = await db.user_preferences.find_one({"user_id": user_id}, PREFERENCES_PROJECTION)
+    
+    # LLM session for this request
+    session_id = f"personalized_{user_id}_{comparison_type}"
+    system_message = "You are a personal finance and shopping advisor. Analyze user behavior patterns to provide personalized money-saving recommendations."
+    
+    # Prepare personalization prompt
+    recommendations_prompt = f"""
+    Analyze this user's {comparison_type} comparison history and provide personalized recommendations:
+
+    COMPARISON HISTORY SUMMARY (last 10):
+    {render_within_budget(history_summary, PROMPT_TOKEN_BUDGET * 3 // 4)}
+
+    USER PREFERENCES:
+    {render_within_budget(preferences, PROMPT_TOKEN_BUDGET // 4) if preferences else 'No preferences set'}
+
+    Based on the patterns, provide:
+    1. SPENDING PATTERNS: Key insights about their choices
+    2. SAVINGS OPPORTUNITIES: Specific ways they can save more money
+    3. PROVIDER RECOMMENDATIONS: Which providers work best for their needs
+    4. BEHAVIORAL INSIGHTS: Patterns in their decision-making
+    5. PERSONALIZED TIPS: Custom advice based on their usage
+
+    Format as JSON with keys: spending_patterns, savings_opportunities, provider_recommendations, behavioral_insights, personalized_tips.
+    Make recommendations specific and actionable.
+    """
+    
+    # Get AI recommendations
+    ai_response = await ask_llm(session_id, system_message, recommendations_prompt, user_id=rate_limit_user)
+    
+    # Store personalized insights
+    insights_record = {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "comparison_type": comparison_type,
+        "personalized_insights": ai_response,
+        "based_on_comparisons": len(history),
+        "timestamp": datetime.utcnow()
+    }
+    await db.personalized_insights.insert_one(insights_record)
+    return insights_record
+
+async def compute_smart_alerts(user_id: str, rate_limit_user: Optional[str] = None) -> Dict[str, Any]:
+    """Generate smart alerts and store them until the end of the day"""
+    # Get user's recent activity, projected to the fields the summaries need
+    recent_rides = await db.ride_comparisons.find({"user_id": user_id}, RIDE_HISTORY_PROJECTION).limit(5).sort("timestamp", -1).to_list(5)
+    recent_groceries = await db.grocery_comparisons.find({"user_id": user_id}, GROCERY_HISTORY_PROJECTION).limit(5).sort("timestamp", -1).to_list(5)
+    savings_history = await db.savings_records.find({"user_id": user_id}, SAVINGS_PROJECTION).limit(10).sort("timestamp", -1).to_list(10)
+    
+    # LLM session for this request
+    session_id = f"smart_alerts_{user_id}"
+    system_message = "You are a smart financial assistant that identifies money-saving opportunities and generates actionable alerts for users."
+    
+    # Create smart alerts prompt
+    alerts_prompt = f"""
+    Generate smart money-saving alerts for this user based on their activity:
+
+    RECENT RIDES: {render_within_budget(summarize_ride_history(recent_rides), PROMPT_TOKEN_BUDGET // 3)}
+    RECENT GROCERIES: {render_within_budget(summarize_grocery_history(recent_groceries), PROMPT_TOKEN_BUDGET // 3)}
+    SAVINGS HISTORY: {render_within_budget(summarize_savings(savings_history), PROMPT_TOKEN_BUDGET // 3)}
+
+    Create personalized alerts for:
+    1. PRICE DROP OPPORTUNITIES: Items/routes that typically cost less at certain times
+    2. USAGE PATTERN ALERTS: Recommendations based on their regular patterns
+    3. SEASONAL SAVINGS: Time-based recommendations for better deals
+    4. PROVIDER SWITCHES: When they should consider different providers
+    5. BULK BUYING ALERTS: When bulk purchases make sense
+
+    Format as JSON with keys: price_alerts, pattern_alerts, seasonal_tips, provider_suggestions, bulk_opportunities.
+    Make alerts specific, actionable, and time-sensitive.
+    """
+    
+    # Get AI alerts
+    ai_response = await ask_llm(session_id, system_message, alerts_prompt, user_id=rate_limit_user)
+    
+    generated_at = datetime.utcnow()
+    alerts_record = {
+        "user_id": user_id,
+        "smart_alerts": ai_response,
+        "generated_at": generated_at,
+        "expires_at": generated_at.replace(hour=23, minute=59, second=59)  # Valid until end of day
+    }
+    await db.smart_alerts.replace_one({"user_id": user_id}, alerts_record, upsert=True)
+    alerts_record.pop("_id", None)
+    return alerts_record
+
+# Background jobs don't spend the user's LLM rate-limit budget
+async def run_personalized_insights_job(payload: Dict[str, Any]):
+    await compute_personalized_insights(payload["user_id"], payload["comparison_type"])
+
+async def run_smart_alerts_job(payload: Dict[str, Any]):
+    await compute_smart_alerts(payload["user_id"])
+
+job_workers.register("personalized_insights", run_personalized_insights_job)
+job_workers.register("smart_alerts", run_smart_alerts_job)
+job_workers.register("price_rollup", lambda payload: price_rollups.run())
+
+async def enqueue_insights_refresh(user_id: str, comparison_type: str) -> bool:
+    return await job_queue.enqueue("personalized_insights", {"user_id": user_id, "comparison_type": comparison_type},
+                                   dedup_key=f"{user_id}:{comparison_type}")
+
+async def enqueue_smart_alerts_refresh(user_id: str) -> bool:
+    return await job_queue.enqueue("smart_alerts", {"user_id": user_id}, dedup_key=user_id)
+
+async def enqueue_precompute_jobs(user_id: str) -> int:
+    """Off-peak refresh of everything the AI endpoints serve for one user"""
+    enqueued = await enqueue_smart_alerts_refresh(user_id)
+    for comparison_type in (ComparisonType.ride, ComparisonType.grocery):
+        enqueued += await enqueue_insights_refresh(user_id, comparison_type.value)
+    return enqueued
+
+price_rollup_scheduler = PriceRollupScheduler(
+    lambda: job_queue.enqueue("price_rollup", {}, dedup_key="price_rollup")
+)
+
+offpeak_scheduler = OffPeakScheduler(
+    db, job_queue, enqueue_precompute_jobs,
+    window=os.environ.get('JOB_OFFPEAK_WINDOW', '1-5'),
+    active_days=int(os.environ.get('JOB_ACTIVE_USER_DAYS', '7'))
+)
+
+def insights_response(insights_record: Dict[str, Any], stale: bool) -> Dict[str, Any]:
+    return {
+        "insights_id": insights_record["id"],
+        "user_id": insights_record["user_id"],
+        "personalized_recommendations": insights_record["personalized_insights"],
+        "based_on_comparisons": insights_record["based_on_comparisons"],
+        "timestamp": insights_record["timestamp"],
+        "stale": stale
+    }
+
+@api_router.post("/ai/personalized-recommendations")
+async def get_personalized_recommendations(user_id: str, comparison_type: ComparisonType):
+    """Generate personalized recommendations based on user's comparison history"""
+    try:
+        stored = await db.personalized_insights.find_one(
+            {"user_id": user_id, "comparison_type": comparison_type.value}, {"_id": 0}, sort=[("timestamp", -1)]
+        )
+        if stored:
+            stale = (datetime.utcnow() - stored["timestamp"]).total_seconds() > INSIGHTS_FRESH_SECONDS
+            if stale:
+                await enqueue_insights_refresh(user_id, comparison_type.value)
+            return insights_response(stored, stale)
         
-        return {
-            "insights_id": insights_record["id"],
-            "user_id": user_id,
-            "personalized_recommendations": ai_response,
-            "based_on_comparisons": len(history),
-            "timestamp": insights_record["timestamp"]
-        }
+        # Nothing precomputed yet: generate inline
+        insights_record = await compute_personalized_insights(user_id, comparison_type.value, rate_limit_user=user_id)
+        if insights_record is None:
+            return {"message": "No comparison history found for personalized recommendations"}
+        return insights_response(insights_record, False)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Personalized recommendations error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Personalization failed: {str(e)}")
@@ -699,56 +1087,40 @@ async def get_personalized_recommendations(user_id: str, comparison_type: Compar
 async def generate_smart_alerts(user_id: str):
     """Generate AI-powered smart alerts for price drops and opportunities"""
     try:
-        # Get user's recent activity and preferences
-        recent_rides = await db.ride_comparisons.find({"user_id": user_id}).limit(5).sort("timestamp", -1).to_list(5)
-        recent_groceries = await db.grocery_comparisons.find({"user_id": user_id}).limit(5).sort("timestamp", -1).to_list(5)
-        savings_history = await db.savings_records.find({"user_id": user_id}).limit(10).sort("timestamp", -1).to_list(10)
-        
-        # Initialize LLM chat
-        llm_key = os.environ.get('EMERGENT_LLM_KEY')
-        chat = LlmChat(
-            api_key=llm_key,
-            session_id=f"smart_alerts_{user_id}",
-            system_message="You are a smart financial assistant that identifies money-saving opportunities and generates actionable alerts for users."
-        ).with_model("openai", "gpt-4o-mini")
-        
-        # Create smart alerts prompt
-        alerts_prompt = f"""
-        Generate smart money-saving alerts for this user based on their activity:
-
-        RECENT RIDES: {recent_rides}
-        RECENT GROCERIES: {recent_groceries}  
-        SAVINGS HISTORY: {savings_history}
-
-        Create personalized alerts for:
-        1. PRICE DROP OPPORTUNITIES: Items/routes that typically cost less at certain times
-        2. USAGE PATTERN ALERTS: Recommendations based on their regular patterns
-        3. SEASONAL SAVINGS: Time-based recommendations for better deals
-        4. PROVIDER SWITCHES: When they should consider different providers
-        5. BULK BUYING ALERTS: When bulk purchases make sense
-
-        Format as JSON with keys: price_alerts, pattern_alerts, seasonal_tips, provider_suggestions, bulk_opportunities.
-        Make alerts specific, actionable, and time-sensitive.
-        """
+        stored = await db.smart_alerts.find_one({"user_id": user_id}, {"_id": 0})
+        if stored:
+            stale = stored["expires_at"] <= datetime.utcnow()
+            if stale:
+                await enqueue_smart_alerts_refresh(user_id)
+            return {**stored, "stale": stale}
         
-        # Get AI alerts
-        user_message = UserMessage(text=alerts_prompt)
-        ai_response = await chat.send_message(user_message)
-        
-        return {
-            "user_id": user_id,
-            "smart_alerts": ai_response,
-            "generated_at": datetime.utcnow(),
-            "expires_at": datetime.utcnow().replace(hour=23, minute=59, second=59)  # Valid until end of day
-        }
+        # Nothing precomputed yet: generate inline
+        return {**await compute_smart_alerts(user_id, rate_limit_user=user_id), "stale": False}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Smart alerts error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Smart alerts generation failed: {str(e)}")
 
+@api_router.get("/jobs/stats")
+async def get_job_stats():
+    """Background job counts by status, plus this process's worker counters"""
+    return {
+        "jobs": await job_queue.stats(),
+        "worker": {"concurrency": job_workers.concurrency, "processed": job_workers.processed, "failed": job_workers.failed}
+    }
+
 # Include the router in the main app
 app.include_router(api_router)
 
+for component, stats in (("quote_cache", quote_cache.stats), ("analysis_cache", analysis_cache.stats),
+                         ("write_buffer", write_buffer.stats), ("llm_gateway", llm_gateway.stats),
+                         ("alerts", alert_evaluator.stats), ("price_rollups", price_rollups.stats),
+                         ("preferences_cache", preferences_store.stats), ("mongo_pool", mongo_pool_listener.stats),
+                         ("health", health_checker.stats)):
+    metrics.register_stats(component, stats)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -757,18 +1129,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+# Outermost, so CORS preflights and errors are timed too
+app.add_middleware(InstrumentationMiddleware, registry=metrics, profiler=RequestProfiler())
 
 @app.on_event("startup")
 async def startup_event():
     logger.info("Comparify API starting up...")
-    logger.info("Connected to MongoDB")
+    health_checker.start()
+    index_builder.start()
+    alert_evaluator.start()
+    if os.environ.get('ANALYTICS_REFRESHER_ENABLED', 'true').lower() == 'true':
+        analytics_refresher.start()
+    if os.environ.get('WRITE_BUFFER_ENABLED', 'false').lower() == 'true':
+        write_buffer.start()
+    if job_workers.concurrency > 0:
+        job_workers.start()
+        offpeak_scheduler.start()
+        price_rollup_scheduler.start()
+    else:
+        # Jobs are left to worker.py; say so if none is running. Off the startup path, like the index build
+        check = asyncio.create_task(warn_if_unclaimed(job_queue))
+        startup_checks.add(check)
+        check.add_done_callback(startup_checks.discard)
+    logger.info("Comparify API started")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await health_checker.stop()
+    await index_builder.stop()
+    for check in list(startup_checks):
+        check.cancel()
+    await price_rollup_scheduler.stop()
+    await offpeak_scheduler.stop()
+    await job_workers.stop()
+    await analytics_refresher.stop()
+    await write_buffer.stop()
+    await alert_evaluator.stop()
+    await shared_state.close()
     client.close()
@@ -0,0 +1,209 @@
+"""State shared by every API worker process, behind a pluggable backend.
+
+Quote cache entries, fetch locks (cross-worker dedup of provider fan-outs)
+and per-user LLM rate limits go through a SharedState chosen by STATE_BACKEND:
+
+- memory (default): dicts in this process. Exact for a single worker; with
+  several, each worker keeps its own copy, as if there were no shared state.
+- redis: any Redis-protocol server at REDIS_URL. RedisState also accepts a
+  ready-made client, e.g. fakeredis.aioredis.FakeRedis() in tests.
+
+Values are bytes and callers own serialization. Keys are prefixed with
+STATE_KEY_PREFIX so several deployments can share one Redis.
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # optional dependency
+    aioredis = None
+
+
+class SharedState:
+    name = ""
+    # False when the state lives in this process only
+    shared = False
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float):
+        raise NotImplementedError
+
+    async def add(self, key: str, value: bytes, ttl_seconds: float) -> bool:
+        """Set only if absent; returns whether this caller set it (locks and dedup)"""
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def delete_if(self, key: str, value: bytes) -> bool:
+        """Delete only if the key still holds `value`, e.g. release a lock only while this caller owns it"""
+        raise NotImplementedError
+
+    async def take_token(self, key: str, rate_per_second: float, capacity: float) -> Tuple[bool, float]:
+        """Token bucket: take a token; on failure also return seconds until one is available"""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def try_acquire(self) -> Tuple[bool, float]:
+        """Take a token; on failure also return seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0.0
+        return False, (1 - self.tokens) / self.rate if self.rate else 60.0
+
+
+class MemoryState(SharedState):
+    name = "memory"
+
+    def __init__(self, max_entries: int = 100000, max_buckets: int = 100000):
+        self.max_entries = max_entries
+        self.max_buckets = max_buckets
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def _live(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        return entry[1]
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._live(key)
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float):
+        self._entries[key] = (time.monotonic() + ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def add(self, key: str, value: bytes, ttl_seconds: float) -> bool:
+        if self._live(key) is not None:
+            return False
+        await self.set(key, value, ttl_seconds)
+        return True
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    async def delete_if(self, key: str, value: bytes) -> bool:
+        if self._live(key) != value:
+            return False
+        del self._entries[key]
+        return True
+
+    async def take_token(self, key: str, rate_per_second: float, capacity: float) -> Tuple[bool, float]:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate_per_second, capacity)
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(key)
+        return bucket.try_acquire()
+
+
+# Refill and take atomically on the server, using the server's clock so workers
+# on different hosts agree. Idle buckets expire once they would be full again.
+TAKE_TOKEN_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+if rate > 0 then
+    redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+end
+return {allowed, tostring(tokens)}
+"""
+
+# Compare-and-delete in one step, so a lock that expired and was taken by
+# another worker isn't released by its previous owner
+DELETE_IF_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisState(SharedState):
+    name = "redis"
+    shared = True
+
+    def __init__(self, client, prefix: str = "comparify:"):
+        self.client = client
+        self.prefix = prefix
+        self._take_token = client.register_script(TAKE_TOKEN_SCRIPT)
+        self._delete_if = client.register_script(DELETE_IF_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = "comparify:") -> "RedisState":
+        if aioredis is None:
+            raise RuntimeError("STATE_BACKEND=redis requires the redis package")
+        return cls(aioredis.Redis.from_url(url), prefix)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float):
+        await self.client.set(self.prefix + key, value, px=max(1, int(ttl_seconds * 1000)))
+
+    async def add(self, key: str, value: bytes, ttl_seconds: float) -> bool:
+        return bool(await self.client.set(self.prefix + key, value, px=max(1, int(ttl_seconds * 1000)), nx=True))
+
+    async def delete(self, key: str):
+        await self.client.delete(self.prefix + key)
+
+    async def delete_if(self, key: str, value: bytes) -> bool:
+        return bool(await self._delete_if(keys=[self.prefix + key], args=[value]))
+
+    async def take_token(self, key: str, rate_per_second: float, capacity: float) -> Tuple[bool, float]:
+        allowed, tokens = await self._take_token(keys=[self.prefix + key], args=[rate_per_second, capacity])
+        if allowed:
+            return True, 0.0
+        return False, (1 - float(tokens)) / rate_per_second if rate_per_second else 60.0
+
+    async def close(self):
+        await self.client.aclose()
+
+
+BACKENDS = ("memory", "redis")
+
+
+def shared_state_from_env() -> SharedState:
+    backend = os.environ.get('STATE_BACKEND', 'memory')
+    if backend == 'memory':
+        return MemoryState()
+    if backend == 'redis':
+        return RedisState.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'),
+                                   prefix=os.environ.get('STATE_KEY_PREFIX', 'comparify:'))
+    raise ValueError(f"STATE_BACKEND must be one of {', '.join(BACKENDS)}")
@@ -0,0 +1,56 @@
+"""Run the background job workers in a dedicated process.
+
+API processes don't poll the job queue unless JOB_WORKER_CONCURRENCY is set
+(default 0), so scaling the API with WEB_CONCURRENCY doesn't multiply the
+polling load on the `jobs` collection. Run one or more of these next to the
+API instead. Each one runs `--concurrency` job loops (default 2, polling every
+JOB_POLL_SECONDS when idle), the off-peak precompute scheduler and the price
+rollup scheduler. It reads the rest of its settings from the environment
+(and backend/.env), like the API:
+
+    python worker.py --concurrency 2
+
+Several worker processes are safe: jobs are claimed atomically and schedules
+are deduplicated in Mongo.
+"""
+import argparse
+import asyncio
+import logging
+import signal
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+
+logger = logging.getLogger(__name__)
+
+
+async def run(concurrency: int):
+    import server
+
+    server.job_workers.concurrency = concurrency
+    server.job_workers.start()
+    server.offpeak_scheduler.start()
+    server.price_rollup_scheduler.start()
+    logger.info(f"Job worker {server.job_workers.worker_id} running {concurrency} loops")
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+    await stopping.wait()
+
+    await server.price_rollup_scheduler.stop()
+    await server.offpeak_scheduler.stop()
+    await server.job_workers.stop()
+    await server.shared_state.close()
+    server.client.close()
+    logger.info(f"Job worker stopped after {server.job_workers.processed} jobs")
+
+
+if __name__ == "__main__":
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Background job worker")
+    parser.add_argument("--concurrency", type=int, default=2, help="job loops in this process")
+    asyncio.run(run(parser.parse_args().concurrency))
@@ -0,0 +1,203 @@
+"""Optional write-behind buffer for comparison and savings persistence.
+
+When started, `write()` enqueues documents and returns immediately; a flusher
+task batches them per collection into `insert_many(ordered=False)` whenever
+WRITE_BUFFER_MAX_BATCH documents are waiting or WRITE_BUFFER_FLUSH_SECONDS has
+passed. A bounded queue provides backpressure: if it stays full for
+WRITE_BUFFER_ENQUEUE_TIMEOUT_SECONDS the document is written directly instead.
+
+Buffered documents become readable only after the next flush, so a client that
+compares and immediately asks for AI analysis may briefly see a 404.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError
+
+
+logger = logging.getLogger(__name__)
+
+FlushHook = Callable[[List[Dict[str, Any]]], Awaitable[None]]
+
+DUPLICATE_KEY = 11000
+
+
+class WriteBehindBuffer:
+    """Batches inserts off the request path; writes through directly until started"""
+
+    def __init__(self, db, max_batch: int = 500, flush_interval: float = 0.2,
+                 max_pending: int = 10000, enqueue_timeout: float = 1.0, max_retries: int = 2):
+        self.db = db
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.enqueue_timeout = enqueue_timeout
+        self.max_retries = max_retries
+        self._hooks: Dict[str, FlushHook] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+        self.enqueued = 0
+        self.direct_writes = 0
+        self.flushes = 0
+        self.flushed_documents = 0
+        self.failed_writes = 0
+        self.dropped_writes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def on_flushed(self, collection: str, hook: FlushHook):
+        """Run `hook` with the documents of `collection` that were actually inserted"""
+        self._hooks[collection] = hook
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write out everything still queued"""
+        if self._task is None:
+            return
+        # Let an in-progress flush finish rather than cancelling it mid-batch
+        self._stopping.set()
+        await self._task
+        self._task = None
+        while not self._queue.empty():
+            await self._flush(self._drain())
+
+    async def write(self, collection: str, document: Dict[str, Any]):
+        if self._task is None:
+            await self._write_direct(collection, [document])
+            return
+        try:
+            await asyncio.wait_for(self._queue.put((collection, document)), self.enqueue_timeout)
+            self.enqueued += 1
+        except asyncio.TimeoutError:
+            logger.debug(f"Write buffer full, writing {collection} document directly")
+            await self._write_direct(collection, [document])
+
+    async def write_many(self, collection: str, documents: List[Dict[str, Any]]):
+        """Bulk writes are already batched, so they skip the queue"""
+        await self._write_direct(collection, documents)
+
+    async def _write_direct(self, collection: str, documents: List[Dict[str, Any]]):
+        self.direct_writes += len(documents)
+        if len(documents) == 1:
+            await self.db[collection].insert_one(documents[0])
+        else:
+            try:
+                await self.db[collection].insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                # The rest of the batch was inserted; its hook still has to run
+                documents = self._inserted(collection, documents, e, retried=False)
+        hook = self._hooks.get(collection)
+        if hook:
+            await hook(documents)
+
+    def _drain(self) -> List[Tuple[str, Dict[str, Any]]]:
+        items = []
+        while len(items) < self.max_batch and not self._queue.empty():
+            items.append(self._queue.get_nowait())
+        return items
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                first = await asyncio.wait_for(self._queue.get(), self.flush_interval)
+            except asyncio.TimeoutError:
+                continue
+            # Give the batch until the interval elapses (or it fills) before flushing
+            deadline = time.monotonic() + self.flush_interval
+            while self._queue.qsize() < self.max_batch - 1 and time.monotonic() < deadline:
+                await asyncio.sleep(min(0.01, self.flush_interval))
+            await self._flush([first] + self._drain())
+
+    async def _flush(self, items: List[Tuple[str, Dict[str, Any]]]):
+        if not items:
+            return
+        start = time.perf_counter()
+        by_collection: Dict[str, List[Dict[str, Any]]] = {}
+        for collection, document in items:
+            by_collection.setdefault(collection, []).append(document)
+
+        for collection, documents in by_collection.items():
+            inserted = await self._insert_with_retry(collection, documents)
+            self.flushed_documents += len(inserted)
+            hook = self._hooks.get(collection)
+            if hook and inserted:
+                try:
+                    await hook(inserted)
+                except Exception as e:
+                    logger.error(f"Write buffer hook for {collection} failed: {str(e)}")
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.flushes += 1
+        self.last_flush_ms = round(elapsed_ms, 2)
+        self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+        self.total_flush_ms += elapsed_ms
+
+    async def _insert_with_retry(self, collection: str, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert documents, returning the ones that made it"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.db[collection].insert_many(documents, ordered=False)
+                return documents
+            except BulkWriteError as e:
+                # Per-document failures (e.g. duplicate ids) are not retryable
+                return self._inserted(collection, documents, e, retried=attempt > 0)
+            except Exception as e:
+                logger.warning(f"Flushing {collection} failed (attempt {attempt + 1}): {str(e)}")
+                await asyncio.sleep(0.1 * 2 ** attempt)
+        self.dropped_writes += len(documents)
+        logger.error(f"Dropped {len(documents)} buffered {collection} writes")
+        return []
+
+    def _inserted(self, collection: str, documents: List[Dict[str, Any]], error: BulkWriteError,
+                  retried: bool) -> List[Dict[str, Any]]:
+        """The documents of a partially failed insert_many that are in the collection"""
+        failed = set()
+        for write_error in error.details.get("writeErrors", []):
+            # A retried batch re-sends the same _ids: duplicates are rows the failed attempt already wrote
+            if not (retried and write_error.get("code") == DUPLICATE_KEY):
+                failed.add(write_error["index"])
+        if failed:
+            self.failed_writes += len(failed)
+            logger.error(f"{len(failed)} {collection} writes failed")
+        return [document for index, document in enumerate(documents) if index not in failed]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "max_pending": self.max_pending,
+            "enqueued": self.enqueued,
+            "direct_writes": self.direct_writes,
+            "flushes": self.flushes,
+            "flushed_documents": self.flushed_documents,
+            "failed_writes": self.failed_writes,
+            "dropped_writes": self.dropped_writes,
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "avg_flush_ms": round(self.total_flush_ms / self.flushes, 2) if self.flushes else 0.0
+        }
+
+
+def write_buffer_from_env(db) -> WriteBehindBuffer:
+    return WriteBehindBuffer(
+        db,
+        max_batch=int(os.environ.get('WRITE_BUFFER_MAX_BATCH', '500')),
+        flush_interval=float(os.environ.get('WRITE_BUFFER_FLUSH_SECONDS', '0.2')),
+        max_pending=int(os.environ.get('WRITE_BUFFER_MAX_PENDING', '10000')),
+        enqueue_timeout=float(os.environ.get('WRITE_BUFFER_ENQUEUE_TIMEOUT_SECONDS', '1.0'))
+    )
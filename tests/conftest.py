@@ -0,0 +1,48 @@
+import asyncio
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# server.py reads these at import time; nothing connects until a query runs
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'comparify_test')
+os.environ.setdefault('LLM_CLIENT', 'fake')
+
+FAKE_RESPONSE = '{"recommendation": "take the auto", "saving_tips": "book off-peak"}'
+
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    """server.py against an in-process Mongo and a fresh gateway over FakeLlmClient"""
+    from mongomock_motor import AsyncMongoMockClient
+
+    import server
+    from ai_cache import AnalysisCache
+    from llm_gateway import FakeLlmClient, llm_gateway_from_env
+
+    monkeypatch.setenv('FAKE_LLM_LATENCY_MS', '0')
+    monkeypatch.setenv('FAKE_LLM_CHUNK_LATENCY_MS', '0')
+    db = AsyncMongoMockClient()["comparify_test"]
+    gateway = llm_gateway_from_env()
+    assert isinstance(gateway.client, FakeLlmClient)
+    gateway.client.response = FAKE_RESPONSE
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "secondary_db", db)
+    monkeypatch.setattr(server, "analysis_cache", AnalysisCache(db))
+    monkeypatch.setattr(server, "llm_gateway", gateway)
+    return db, gateway
+
+
+def seed_comparison(db, comparison_id="ride-1", user_id="user-1"):
+    asyncio.run(db.ride_comparisons.insert_one({
+        "id": comparison_id, "user_id": user_id, "pickup_location": "Koramangala",
+        "drop_location": "Indiranagar", "distance_km": 6.5, "timestamp": datetime.utcnow(),
+        "providers": [{"provider": "uber", "estimated_fare": 180.0}, {"provider": "ola", "estimated_fare": 165.0}]
+    }))
+    return comparison_id
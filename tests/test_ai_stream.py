@@ -0,0 +1,106 @@
+"""SSE analysis endpoint driven by the offline FakeLlmClient (LLM_CLIENT=fake)."""
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+import server
+from tests.conftest import FAKE_RESPONSE, seed_comparison
+
+STREAM_PATH = "/api/ai/analyze-ride-comparison/stream"
+
+
+def parse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_sends_deltas_then_done_and_stores_the_analysis(fake_server):
+    db, gateway = fake_server
+    comparison_id = seed_comparison(db)
+
+    response = TestClient(server.app).post(STREAM_PATH, params={"comparison_id": comparison_id})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_events(response.text)
+    names = [name for name, _ in events]
+    assert names == ["delta"] * (len(names) - 1) + ["done"]
+    assert len(names) > 2
+    text = "".join(data["text"] for name, data in events if name == "delta")
+    assert text == FAKE_RESPONSE
+
+    done = events[-1][1]
+    assert done["cached"] is False
+    assert done["ai_recommendations"] == FAKE_RESPONSE
+    stored = asyncio.run(db.ai_analyses.find_one({"id": done["analysis_id"]}))
+    assert stored["comparison_id"] == comparison_id
+    assert stored["ai_analysis"] == FAKE_RESPONSE
+    assert gateway.client.calls == 1 and gateway.completed == 1
+
+
+def test_repeat_stream_is_served_from_the_cache(fake_server):
+    db, gateway = fake_server
+    comparison_id = seed_comparison(db)
+    client = TestClient(server.app)
+
+    client.post(STREAM_PATH, params={"comparison_id": comparison_id})
+    events = parse_events(client.post(STREAM_PATH, params={"comparison_id": comparison_id}).text)
+
+    assert [name for name, _ in events] == ["delta", "done"]
+    assert events[0][1]["text"] == FAKE_RESPONSE
+    assert events[1][1]["cached"] is True
+    assert gateway.client.calls == 1
+    assert asyncio.run(db.ai_analyses.count_documents({})) == 1
+
+
+def test_unknown_comparison_is_404(fake_server):
+    response = TestClient(server.app).post(STREAM_PATH, params={"comparison_id": "missing"})
+    assert response.status_code == 404
+
+
+def test_client_disconnect_cancels_the_upstream_stream(fake_server):
+    db, gateway = fake_server
+    gateway.client.response = " ".join(f"word{number}" for number in range(200))
+    gateway.client.chunk_latency_ms = 5
+    comparison_id = seed_comparison(db)
+
+    async def run():
+        first_delta = asyncio.Event()
+        requested = False
+        sent = []
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await first_delta.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if message["type"] == "http.response.body" and b"event: delta" in message.get("body", b""):
+                first_delta.set()
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+            "scheme": "http", "path": STREAM_PATH, "raw_path": STREAM_PATH.encode(), "root_path": "",
+            "query_string": f"comparison_id={comparison_id}".encode(), "headers": [],
+            "client": ("testclient", 50000), "server": ("testserver", 80)
+        }
+        await asyncio.wait_for(server.app(scope, receive, send), 5)
+        return sent
+
+    sent = asyncio.run(run())
+
+    body = b"".join(message.get("body", b"") for message in sent if message["type"] == "http.response.body")
+    assert b"event: delta" in body
+    assert b"event: done" not in body
+    assert gateway.client.cancelled == 1
+    assert gateway.cancelled == 1
+    assert gateway.active == 0 and gateway.completed == 0
+    assert asyncio.run(db.ai_analyses.count_documents({})) == 0
@@ -0,0 +1,82 @@
+"""AlertEvaluator: failed trigger writes and cross-worker sync."""
+import asyncio
+from datetime import datetime
+
+from mongomock_motor import AsyncMongoMockClient
+
+from alerts_engine import AlertEvaluator
+
+
+def alert(alert_id: str, target_price: float, product_name: str = "amul butter 500g"):
+    return {"id": alert_id, "user_id": "user-1", "comparison_type": "grocery", "product_name": product_name,
+            "target_price": target_price, "is_active": True, "created_at": datetime.utcnow()}
+
+
+async def settle(evaluator: AlertEvaluator):
+    await asyncio.gather(*evaluator._pending, return_exceptions=True)
+
+
+def product_key(evaluator: AlertEvaluator, alert_id: str) -> str:
+    return evaluator.index._by_id[alert_id][0][1]
+
+
+def test_alerts_return_to_the_index_when_the_trigger_write_fails(monkeypatch):
+    async def run():
+        db = AsyncMongoMockClient()["comparify_test"]
+        await db.price_alerts.insert_many([alert("a1", 200.0), alert("a2", 150.0), alert("a3", 90.0)])
+        evaluator = AlertEvaluator(db)
+        await evaluator.sync()
+        key = product_key(evaluator, "a1")
+
+        async def unavailable(*args, **kwargs):
+            raise ConnectionError("primary stepped down")
+
+        monkeypatch.setattr(type(db.price_alerts), "update_many", unavailable)
+        evaluator.check("grocery", key, 140.0)
+        await settle(evaluator)
+        assert all(alert_id in evaluator.index for alert_id in ("a1", "a2", "a3"))
+        assert evaluator.restored == 2 and evaluator.triggered == 0
+
+        # The next crossing retries, and this time the write goes through
+        monkeypatch.undo()
+        evaluator.check("grocery", key, 140.0)
+        await settle(evaluator)
+        return db, evaluator
+
+    db, evaluator = asyncio.run(run())
+
+    assert evaluator.triggered == 2
+    assert "a1" not in evaluator.index and "a2" not in evaluator.index and "a3" in evaluator.index
+    inactive = asyncio.run(db.price_alerts.distinct("id", {"is_active": False}))
+    assert sorted(inactive) == ["a1", "a2"]
+
+
+def test_sync_drops_alerts_triggered_or_deleted_by_another_worker():
+    async def run():
+        db = AsyncMongoMockClient()["comparify_test"]
+        await db.price_alerts.insert_many([alert("a1", 200.0), alert("a2", 150.0), alert("a3", 90.0)])
+        this_worker, other_worker = AlertEvaluator(db), AlertEvaluator(db)
+        await this_worker.sync()
+        await other_worker.sync()
+
+        other_worker.check("grocery", product_key(other_worker, "a1"), 180.0)
+        await settle(other_worker)
+        assert await other_worker.delete("a3")
+        await db.price_alerts.insert_one(alert("a4", 120.0))
+
+        await this_worker.sync()
+        return this_worker
+
+    this_worker = asyncio.run(run())
+
+    assert [alert_id for alert_id in ("a1", "a2", "a3", "a4") if alert_id in this_worker.index] == ["a2", "a4"]
+    assert this_worker.pruned == 2
+
+
+def test_deleting_an_unknown_alert_leaves_no_tombstone():
+    async def run():
+        db = AsyncMongoMockClient()["comparify_test"]
+        evaluator = AlertEvaluator(db)
+        return await evaluator.delete("missing"), await db.price_alert_deletions.count_documents({})
+
+    assert asyncio.run(run()) == (False, 0)
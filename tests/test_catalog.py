@@ -0,0 +1,33 @@
+"""ProductCatalog.resolve against the offline fixture, and the CATALOG_PATH setting."""
+import pytest
+
+import catalog
+from catalog import FIXTURE_CATALOG_PATH, ProductCatalog
+
+
+@pytest.fixture(scope="module")
+def fixture_catalog():
+    return ProductCatalog.load(FIXTURE_CATALOG_PATH)
+
+
+def test_requests_without_a_size_do_not_resolve_to_one_pack(fixture_catalog):
+    assert fixture_catalog.resolve("Amul Butter") is None
+    assert fixture_catalog.resolve("Sunflower Oil", "Fortune") is None
+
+
+def test_requests_with_a_size_resolve_to_that_pack(fixture_catalog):
+    assert fixture_catalog.resolve("Amul Butter 100 g")["id"] == "amul-butter-pasteurised-100-g"
+    assert fixture_catalog.resolve("Sunlite Sunflower Oil", "Fortune", "5 l")["id"] == \
+        "fortune-sunlite-refined-sunflower-oil-5-l"
+    assert fixture_catalog.resolve("Amul Butter 500 g") is None
+
+
+def test_catalog_is_empty_unless_configured(monkeypatch):
+    monkeypatch.setattr(catalog, "CATALOG_PATH", "")
+    assert catalog.product_catalog_from_env().products == []
+
+
+def test_configured_but_missing_catalog_fails(monkeypatch, tmp_path):
+    monkeypatch.setattr(catalog, "CATALOG_PATH", str(tmp_path / "missing.json"))
+    with pytest.raises(FileNotFoundError):
+        catalog.product_catalog_from_env()
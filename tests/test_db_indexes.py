@@ -0,0 +1,134 @@
+"""Index bootstrap, the price_points collection check, and the COLLSCAN check against a real mongod when one is available."""
+import asyncio
+import os
+import time
+import uuid
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+import db_indexes
+from db_indexes import IndexBuilder, ensure_indexes, find_collscans
+from price_history import ensure_price_points
+
+TEST_MONGO_URL = os.environ.get('TEST_MONGO_URL', 'mongodb://localhost:27017')
+
+
+def mongod_available() -> bool:
+    client = MongoClient(TEST_MONGO_URL, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+        return True
+    except PyMongoError:
+        return False
+    finally:
+        client.close()
+
+
+def test_unreachable_mongo_is_detected_once_instead_of_per_index():
+    async def run():
+        client = AsyncIOMotorClient("mongodb://localhost:1", serverSelectionTimeoutMS=200)
+        try:
+            started = time.monotonic()
+            built = await ensure_indexes(client["comparify_test"])
+            return built, time.monotonic() - started
+        finally:
+            client.close()
+
+    built, elapsed = asyncio.run(run())
+    assert built is False
+    assert elapsed < 2
+
+
+def test_index_builder_does_not_block_startup():
+    async def run():
+        client = AsyncIOMotorClient("mongodb://localhost:1", serverSelectionTimeoutMS=200)
+        builder = IndexBuilder(client["comparify_test"], retry_seconds=0.05)
+        started = time.monotonic()
+        builder.start()
+        returned_after = time.monotonic() - started
+        await asyncio.sleep(0.5)
+        await builder.stop()
+        client.close()
+        return builder.built, returned_after
+
+    built, returned_after = asyncio.run(run())
+    assert built is False
+    assert returned_after < 0.05
+
+
+@pytest.mark.skipif(not mongod_available(), reason=f"no mongod at {TEST_MONGO_URL}")
+def test_every_endpoint_query_is_index_backed():
+    async def run():
+        client = AsyncIOMotorClient(TEST_MONGO_URL)
+        name = f"comparify_plans_{uuid.uuid4().hex[:8]}"
+        try:
+            assert await ensure_indexes(client[name])
+            return await find_collscans(client[name])
+        finally:
+            await client.drop_database(name)
+            client.close()
+
+    assert asyncio.run(run()) == []
+
+
+class FakeCommandCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def to_list(self, length):
+        return self.documents[:length]
+
+
+def existing_price_points(monkeypatch, db, collection_type):
+    """mongomock implements neither time-series collections nor list_collections"""
+    async def already_exists(self, name, **kwargs):
+        raise CollectionInvalid(f"collection {name} already exists")
+
+    async def list_collections(self, filter=None):
+        return FakeCommandCursor([{"name": "price_points", "type": collection_type, "options": {}}])
+
+    monkeypatch.setattr(type(db), "create_collection", already_exists)
+    monkeypatch.setattr(type(db), "list_collections", list_collections, raising=False)
+
+
+def test_plain_price_points_collection_is_reported(monkeypatch, caplog):
+    db = AsyncMongoMockClient()["comparify_test"]
+    existing_price_points(monkeypatch, db, "collection")
+
+    assert asyncio.run(ensure_price_points(db)) is True
+    assert "price_points is a plain collection" in caplog.text
+
+
+def test_existing_time_series_collection_is_not_reported(monkeypatch, caplog):
+    db = AsyncMongoMockClient()["comparify_test"]
+    existing_price_points(monkeypatch, db, "timeseries")
+
+    assert asyncio.run(ensure_price_points(db)) is True
+    assert "price_points" not in caplog.text
+
+
+def test_collections_are_ready_before_the_indexes_are_built(monkeypatch):
+    db = AsyncMongoMockClient()["comparify_test"]
+    existing_price_points(monkeypatch, db, "timeseries")
+    builder = IndexBuilder(db, retry_seconds=0.05)
+    index_started = asyncio.Event()
+
+    async def slow_indexes(db):
+        index_started.set()
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(db_indexes, "create_indexes", slow_indexes)
+
+    async def run():
+        assert not builder.collections_ready
+        builder.start()
+        await asyncio.wait_for(index_started.wait(), 1)
+        ready, built = builder.collections_ready, builder.built
+        await builder.stop()
+        return ready, built
+
+    assert asyncio.run(run()) == (True, False)
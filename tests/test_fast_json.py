@@ -0,0 +1,53 @@
+"""ReadSerializer shaping of legacy documents for the fast read path."""
+import asyncio
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+
+import server
+from fast_json import ReadSerializer
+
+# A ride comparison stored before ETA bounds, surge and ranking fields existed
+LEGACY_RIDE = {
+    "id": "ride-legacy", "user_id": "user-1", "pickup_location": "Koramangala", "drop_location": "Indiranagar",
+    "distance_km": 6.5, "estimated_duration_mins": 20, "timestamp": datetime(2024, 1, 1),
+    "best_price_provider": "ola", "best_time_provider": "uber",
+    "providers": [
+        {"provider": "uber", "vehicle_type": "car", "estimated_fare": 180.0, "estimated_time": "5-7 mins"},
+        {"provider": "ola", "vehicle_type": "auto", "estimated_fare": 165.0, "estimated_time": "8 mins"},
+    ]
+}
+
+
+def legacy_ride():
+    return {**LEGACY_RIDE, "providers": [dict(quote) for quote in LEGACY_RIDE["providers"]]}
+
+
+def test_nested_quotes_get_defaults_and_eta_bounds():
+    document = ReadSerializer(server.RideComparison).prepare([legacy_ride()])[0]
+
+    uber, ola = document["providers"]
+    assert (uber["eta_min_mins"], uber["eta_max_mins"]) == (5.0, 7.0)
+    assert (ola["eta_min_mins"], ola["eta_max_mins"]) == (8.0, 8.0)
+    assert uber["surge_multiplier"] == 1.0 and uber["coupon_discount"] == 0.0 and uber["features"] == []
+    assert document["ranked_options"] == [] and document["route_key"] is None
+    # The prepared document is exactly what the model would have produced
+    assert server.RideComparison.model_validate(document).model_dump() == document
+
+
+def test_mutable_defaults_are_not_shared_between_documents():
+    first, second = ReadSerializer(server.RideComparison).prepare([legacy_ride(), legacy_ride()])
+    first["providers"][0]["features"].append("ac")
+    assert second["providers"][0]["features"] == []
+
+
+def test_ride_history_serves_legacy_documents_in_the_current_shape(fake_server):
+    db, _ = fake_server
+    asyncio.run(db.ride_comparisons.insert_one(legacy_ride()))
+
+    response = TestClient(server.app).get("/api/rides/history", params={"user_id": "user-1"})
+
+    assert response.status_code == 200
+    page = server.RideComparisonPage.model_validate(response.json())
+    assert page.items[0].providers[0].eta_max_mins == 7.0
+    assert "_id" not in response.json()["items"][0]
@@ -0,0 +1,80 @@
+"""Job queue workers and the API/worker split."""
+import asyncio
+from datetime import datetime, timedelta
+
+from mongomock_motor import AsyncMongoMockClient
+
+from db_indexes import INDEX_SPECS
+from jobs import JobQueue, JobWorkerPool, OffPeakScheduler, job_workers_from_env, warn_if_unclaimed
+from tests.conftest import seed_comparison
+
+
+def test_api_processes_run_no_job_workers_by_default(monkeypatch):
+    monkeypatch.delenv('JOB_WORKER_CONCURRENCY', raising=False)
+    assert job_workers_from_env(JobQueue(None)).concurrency == 0
+    monkeypatch.setenv('JOB_WORKER_CONCURRENCY', '3')
+    assert job_workers_from_env(JobQueue(None)).concurrency == 3
+
+
+def test_offpeak_schedule_runs_once_per_day():
+    db = AsyncMongoMockClient()["comparify_test"]
+    seed_comparison(db, user_id="user-1")
+    scheduled = []
+
+    async def enqueue_for_user(user_id):
+        scheduled.append(user_id)
+        return 1
+
+    async def run():
+        # Two API processes' schedulers ticking in the same window
+        first, second = (OffPeakScheduler(db, JobQueue(db), enqueue_for_user) for _ in range(2))
+        return await first.schedule_once_today(), await second.schedule_once_today()
+
+    assert asyncio.run(run()) == (1, 0)
+    assert scheduled == ["user-1"]
+    marker = asyncio.run(db.job_schedule.find_one({}))
+    assert marker["_id"] == f"offpeak:{datetime.utcnow():%Y-%m-%d}"
+    # created_at is what the job_schedule TTL index expires markers on
+    assert datetime.utcnow() - marker["created_at"] < timedelta(minutes=1)
+
+
+def test_stale_queued_jobs_are_reported_when_no_worker_claims_them(caplog):
+    async def run():
+        db = AsyncMongoMockClient()["comparify_test"]
+        queue = JobQueue(db)
+        await queue.enqueue("smart_alerts", {"user_id": "user-1"}, dedup_key="user-1")
+        await warn_if_unclaimed(queue)
+        assert "without a worker claiming them" not in caplog.text
+        await queue.enqueue("smart_alerts", {"user_id": "user-2"}, dedup_key="user-2",
+                            run_at=datetime.utcnow() - timedelta(hours=1))
+        await warn_if_unclaimed(queue)
+
+    asyncio.run(run())
+    assert "1 jobs have waited" in caplog.text
+
+
+def test_worker_pool_runs_queued_jobs_once():
+    async def run():
+        db = AsyncMongoMockClient()["comparify_test"]
+        for keys, options in INDEX_SPECS["jobs"]:
+            await db.jobs.create_index(keys, **options)
+        queue = JobQueue(db)
+        seen = []
+
+        async def handler(payload):
+            seen.append(payload["user_id"])
+
+        workers = JobWorkerPool(queue, concurrency=2, poll_interval=0.01)
+        workers.register("smart_alerts", handler)
+        assert await queue.enqueue("smart_alerts", {"user_id": "user-1"}, dedup_key="user-1")
+        assert not await queue.enqueue("smart_alerts", {"user_id": "user-1"}, dedup_key="user-1")
+        await queue.enqueue("smart_alerts", {"user_id": "user-2"}, dedup_key="user-2")
+        workers.start()
+        await asyncio.sleep(0.2)
+        await workers.stop()
+        return seen, workers, await queue.db.jobs.distinct("status")
+
+    seen, workers, statuses = asyncio.run(run())
+    assert sorted(seen) == ["user-1", "user-2"]
+    assert workers.processed == 2 and workers.failed == 0
+    assert statuses == ["done"]
@@ -0,0 +1,109 @@
+"""LlmGateway admission control, dedup and fail-open behaviour over FakeLlmClient."""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from llm_gateway import FakeLlmClient, LlmGateway, LlmOverloaded, LlmRateLimited
+from shared_state import MemoryState
+from tests.conftest import seed_comparison
+
+
+def test_identical_concurrent_calls_share_one_upstream_call():
+    client = FakeLlmClient(latency_ms=20)
+    gateway = LlmGateway(client, user_rate_per_minute=600, user_burst=10)
+
+    async def run():
+        return await asyncio.gather(*[gateway.complete("session-1", "system", "same prompt", user_id="user-1")
+                                      for _ in range(5)])
+
+    results = asyncio.run(run())
+
+    assert results == [client.response] * 5
+    assert client.calls == 1
+    assert gateway.deduplicated == 4
+    assert gateway.completed == 1
+
+
+def test_different_prompts_are_not_deduplicated():
+    client = FakeLlmClient(latency_ms=5)
+    gateway = LlmGateway(client)
+
+    async def run():
+        await asyncio.gather(gateway.complete("session-1", "system", "prompt a"),
+                             gateway.complete("session-1", "system", "prompt b"))
+
+    asyncio.run(run())
+    assert client.calls == 2
+    assert gateway.deduplicated == 0
+
+
+def test_requests_beyond_concurrency_plus_queue_depth_are_shed():
+    client = FakeLlmClient(latency_ms=50)
+    gateway = LlmGateway(client, max_concurrency=2, max_queue_depth=3)
+
+    async def run():
+        return await asyncio.gather(*[gateway.complete(f"session-{number}", "system", "prompt")
+                                      for number in range(8)], return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    refused = [result for result in results if isinstance(result, Exception)]
+    assert len(refused) == 3
+    assert all(isinstance(error, LlmOverloaded) and error.retry_after > 0 for error in refused)
+    assert client.calls == 5
+    assert gateway.shed == 3
+    assert gateway.active == 0 and gateway.queued == 0
+
+
+def test_user_token_bucket_refuses_beyond_the_burst():
+    gateway = LlmGateway(FakeLlmClient(), user_rate_per_minute=6, user_burst=2)
+
+    async def run():
+        await gateway.complete("session-1", "system", "prompt 1", user_id="user-1")
+        await gateway.complete("session-2", "system", "prompt 2", user_id="user-1")
+        with pytest.raises(LlmRateLimited) as refused:
+            await gateway.complete("session-3", "system", "prompt 3", user_id="user-1")
+        # Other users have their own bucket
+        await gateway.complete("session-4", "system", "prompt 4", user_id="user-2")
+        return refused.value
+
+    refused = asyncio.run(run())
+
+    # 6 per minute: the next token is about 10 seconds away
+    assert 9 < refused.retry_after <= 10
+    assert gateway.rate_limited == 1
+    assert gateway.completed == 3
+
+
+def test_rate_limited_analysis_is_a_429_with_retry_after(fake_server, monkeypatch):
+    db, _ = fake_server
+    monkeypatch.setattr(server, "llm_gateway", LlmGateway(FakeLlmClient(), user_rate_per_minute=6, user_burst=1))
+    comparison_id = seed_comparison(db, user_id="user-1")
+    client = TestClient(server.app)
+    params = {"comparison_id": comparison_id, "bypass_cache": "true"}
+
+    assert client.post("/api/ai/analyze-ride-comparison", params=params).status_code == 200
+    response = client.post("/api/ai/analyze-ride-comparison", params=params)
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "10"
+
+
+class UnavailableState(MemoryState):
+    async def take_token(self, key, rate_per_second, capacity):
+        raise ConnectionError("state backend down")
+
+
+def test_admission_fails_open_when_the_state_backend_is_down():
+    client = FakeLlmClient()
+    gateway = LlmGateway(client, user_rate_per_minute=1, user_burst=1, state=UnavailableState())
+
+    async def run():
+        for number in range(3):
+            await gateway.complete(f"session-{number}", "system", "prompt", user_id="user-1")
+
+    asyncio.run(run())
+    assert client.calls == 3
+    assert gateway.rate_limited == 0
@@ -0,0 +1,45 @@
+"""Route keys for compares and alerts, with the offline fixture gazetteer."""
+import pytest
+
+from routes import FIXTURE_GAZETTEER_PATH, Gazetteer, RouteNormalizer
+
+
+@pytest.fixture(scope="module")
+def gazetteer():
+    return Gazetteer.load(FIXTURE_GAZETTEER_PATH)
+
+
+def place_names(gazetteer, count=2):
+    places = [place for place in gazetteer.places.values() if "lat" in place and "lng" in place]
+    return places[:count]
+
+
+def test_spelling_variants_share_a_key(gazetteer):
+    normalizer = RouteNormalizer(gazetteer, geohash_precision=0)
+    pickup, drop = place_names(gazetteer)
+    keys = {
+        normalizer.route_key(pickup["name"], drop["name"]),
+        normalizer.route_key(pickup["name"].upper() + ", Bengaluru 560034", "near " + drop["name"].lower()),
+    }
+    assert keys == {f"place:{pickup['id']}|place:{drop['id']}"}
+
+
+def test_alert_route_matches_a_compare_with_coordinates(gazetteer):
+    normalizer = RouteNormalizer(gazetteer, geohash_precision=6)
+    pickup, drop = place_names(gazetteer)
+    compare_key = normalizer.route_key(pickup["name"], drop["name"], [pickup["lat"], pickup["lng"]],
+                                       [drop["lat"], drop["lng"]])
+    assert compare_key.startswith("cell:")
+    # Text-only alert: the gazetteer supplies the places' coordinates
+    assert normalizer.route_key_from_route(f"{pickup['name']} to {drop['name']}") == compare_key
+
+
+def test_unknown_places_match_when_the_alert_carries_coordinates():
+    normalizer = RouteNormalizer(None, geohash_precision=6)
+    pickup_coordinates, drop_coordinates = [12.9352, 77.6245], [12.9784, 77.6408]
+    compare_key = normalizer.route_key("Flat 4, Some Lane", "Office Park Gate 2", pickup_coordinates,
+                                       drop_coordinates)
+
+    assert normalizer.route_key_from_route("Flat 4, Some Lane -> Office Park Gate 2") != compare_key
+    assert normalizer.route_key_from_route("Flat 4, Some Lane -> Office Park Gate 2", pickup_coordinates,
+                                           drop_coordinates) == compare_key
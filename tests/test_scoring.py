@@ -0,0 +1,27 @@
+"""QuoteTable picks and ranking on quotes with missing values."""
+from quotes import parse_quotes
+from scoring import rank_providers, ride_table
+
+
+def rides(*quotes):
+    return ride_table(parse_quotes("ride", [
+        {"provider": provider, "vehicle_type": "car", "estimated_fare": fare, "estimated_time": eta}
+        for provider, fare, eta in quotes
+    ]))
+
+
+def test_best_picks_the_lowest_value_and_the_earliest_tie():
+    table = rides(("uber", 180.0, "9 mins"), ("ola", 150.0, "4-6 mins"), ("rapido", 150.0, "4 mins"))
+    assert table.best("price") == 1
+    assert table.best("eta_min") == 1
+
+
+def test_best_skips_rows_without_a_value():
+    table = rides(("uber", 180.0, "soon"), ("ola", 150.0, "8 mins"), ("rapido", 120.0, ""))
+    assert table.best("eta_min") == 1
+
+
+def test_best_falls_back_to_the_cheapest_row_when_no_row_has_a_value():
+    table = rides(("uber", 180.0, "soon"), ("ola", 150.0, "unknown"), ("rapido", 165.0, ""))
+    assert table.best("eta_min") == 1
+    assert rank_providers(table, "ride", None) == [1, 2, 0]
@@ -0,0 +1,101 @@
+"""RedisState against fakeredis, and QuoteCache single-flight across worker-like instances."""
+import asyncio
+import hashlib
+import json
+
+import fakeredis.aioredis
+
+from quote_cache import QuoteCache
+from shared_state import MemoryState, RedisState
+
+
+def redis_state(server=None) -> RedisState:
+    return RedisState(fakeredis.aioredis.FakeRedis(server=server), prefix="test:")
+
+
+def test_token_bucket_allows_the_burst_then_denies():
+    async def run():
+        state = redis_state()
+        results = [await state.take_token("llm-rate:user-1", 1 / 60, 2) for _ in range(3)]
+        other_user = await state.take_token("llm-rate:user-2", 1 / 60, 2)
+        return results, other_user
+
+    results, other_user = asyncio.run(run())
+
+    assert [allowed for allowed, _ in results] == [True, True, False]
+    # One token per minute: the next one is up to a minute away
+    assert 0 < results[2][1] <= 60
+    assert other_user == (True, 0.0)
+
+
+def test_token_bucket_is_shared_by_clients_of_one_server():
+    server = fakeredis.FakeServer()
+
+    async def run():
+        first, second = redis_state(server), redis_state(server)
+        return [await state.take_token("llm-rate:user-1", 1 / 60, 1) for state in (first, second)]
+
+    assert [allowed for allowed, _ in asyncio.run(run())] == [True, False]
+
+
+def test_delete_if_only_releases_the_owners_lock():
+    async def run():
+        state = redis_state()
+        await state.add("lock", b"owner-1", 5)
+        assert not await state.delete_if("lock", b"owner-2")
+        assert await state.get("lock") == b"owner-1"
+        assert await state.delete_if("lock", b"owner-1")
+        assert await state.get("lock") is None
+
+    asyncio.run(run())
+
+
+def shared_cache(state) -> QuoteCache:
+    cache = QuoteCache({"ride": 30})
+    cache.use_shared(state, lambda quotes: json.dumps(quotes).encode(),
+                     lambda comparison_type, encoded: json.loads(encoded), lock_seconds=2)
+    return cache
+
+
+def test_two_caches_sharing_redis_fetch_once():
+    server = fakeredis.FakeServer()
+    fetches = 0
+
+    async def fetch():
+        nonlocal fetches
+        fetches += 1
+        await asyncio.sleep(0.2)
+        return [{"provider": "uber", "estimated_fare": 180.0}]
+
+    async def run():
+        # Two worker processes: separate caches and Redis connections, one Redis server
+        first, second = shared_cache(redis_state(server)), shared_cache(redis_state(server))
+        results = await asyncio.gather(first.get_or_fetch("ride", ("route-1", 6.5), fetch),
+                                       second.get_or_fetch("ride", ("route-1", 6.5), fetch))
+        return first, second, results
+
+    first, second, results = asyncio.run(run())
+
+    assert fetches == 1
+    assert results[0] == results[1] == [{"provider": "uber", "estimated_fare": 180.0}]
+    assert first.shared_waits + second.shared_waits == 1
+    assert first.shared_errors == second.shared_errors == 0
+
+
+def test_fetch_that_outlives_its_lock_keeps_the_new_owners_lock():
+    state = MemoryState()
+    lock_key = "quotes-lock:" + hashlib.sha1(repr(("ride", ("route-1", 6.5))).encode()).hexdigest()
+
+    async def slow_fetch():
+        await asyncio.sleep(0.1)
+        # This worker's lock has expired; another worker takes it
+        assert await state.add(lock_key, b"other-worker", 5)
+        return []
+
+    async def run():
+        cache = shared_cache(state)
+        cache.lock_seconds = 0.05
+        await cache.get_or_fetch("ride", ("route-1", 6.5), slow_fetch)
+        return await state.get(lock_key)
+
+    assert asyncio.run(run()) == b"other-worker"
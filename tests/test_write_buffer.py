@@ -0,0 +1,69 @@
+"""WriteBehindBuffer: flush hooks see exactly the documents that were inserted."""
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import NetworkTimeout
+
+from write_buffer import WriteBehindBuffer
+
+
+def savings(count: int):
+    return [{"id": f"s{number}", "user_id": "user-1", "savings": 10.0} for number in range(count)]
+
+
+def recording_buffer(db) -> tuple:
+    buffer = WriteBehindBuffer(db, flush_interval=0.01)
+    hooked = []
+
+    async def hook(records):
+        hooked.extend(record["id"] for record in records)
+
+    buffer.on_flushed("savings_records", hook)
+    return buffer, hooked
+
+
+def test_retry_after_a_timeout_counts_rows_the_first_attempt_wrote(monkeypatch):
+    collection_type = type(AsyncMongoMockClient()["comparify_test"].savings_records)
+    insert_many = collection_type.insert_many
+    calls = 0
+
+    async def lands_then_times_out(self, documents, *args, **kwargs):
+        nonlocal calls
+        calls += 1
+        result = await insert_many(self, documents, *args, **kwargs)
+        if calls == 1:
+            raise NetworkTimeout("timed out waiting for the reply")
+        return result
+
+    monkeypatch.setattr(collection_type, "insert_many", lands_then_times_out)
+
+    async def run():
+        db = AsyncMongoMockClient()["comparify_test"]
+        buffer, hooked = recording_buffer(db)
+        buffer.start()
+        for record in savings(3):
+            await buffer.write("savings_records", record)
+        await buffer.stop()
+        return db, buffer, hooked
+
+    db, buffer, hooked = asyncio.run(run())
+
+    assert calls == 2
+    assert sorted(hooked) == ["s0", "s1", "s2"]
+    assert buffer.flushed_documents == 3 and buffer.failed_writes == 0
+    assert asyncio.run(db.savings_records.count_documents({})) == 3
+
+
+def test_partial_direct_write_runs_the_hook_for_inserted_rows():
+    async def run():
+        db = AsyncMongoMockClient()["comparify_test"]
+        await db.savings_records.create_index("id", unique=True)
+        await db.savings_records.insert_one({"id": "s1", "user_id": "user-1", "savings": 10.0})
+        buffer, hooked = recording_buffer(db)
+        await buffer.write_many("savings_records", savings(3))
+        return buffer, hooked
+
+    buffer, hooked = asyncio.run(run())
+
+    assert hooked == ["s0", "s2"]
+    assert buffer.failed_writes == 1